@@ -1,21 +1,37 @@
+import hashlib
 import json
+import multiprocessing
 import os
 import uuid
 from datetime import datetime, timedelta
 from functools import wraps
 
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+from flask import (Flask, Response, render_template, request, redirect, url_for, session, jsonify, flash, g,
+                   has_request_context, make_response, send_file, send_from_directory, stream_with_context)
 from werkzeug.utils import secure_filename
 
 load_dotenv()
 
-from utils.auth import register_user, login_user, get_user_by_id
+from utils import auth
+from utils.auth import register_user, login_user, get_user_by_id, get_users_by_ids
+from utils.compression import GZIP_ETAG_SUFFIX, gzip_response
+from utils.csv_export import in_date_range, parse_date_range, stream_csv
 from utils.database import Database
-from utils.exam_parser import ExamParseError, parse_docx_exam
-from utils.gemini_api import chat_with_gemini
+from utils.progress_matrix import STALLED_DAYS
+from utils.static_assets import StaticAssets
+from utils.deferred_tasks import DeferredTaskRunner
+from utils.document_index import DOC_TYPES as DOCUMENT_TYPES, GRADES as DOCUMENT_GRADES
+from utils.grading import grade_exercise, normalize_answer_token, normalize_correct_answers
+from utils.import_jobs import ImportJobManager
+from utils.joins import join_related
+from utils.unit_of_work import UnitOfWork
+from utils.concurrency import FileTokenBucketLimiter
+from utils.gemini_api import chat_with_gemini, gemini_limiter, inflight_calls, inflight_locks, response_cache
 
 app = Flask(__name__)
+# False trong tiến trình con của multiprocessing (xem phần khởi động Database bên dưới)
+SERVER_PROCESS = multiprocessing.parent_process() is None
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-me')
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=2)
 app.config['SESSION_COOKIE_SECURE'] = os.getenv('SESSION_COOKIE_SECURE', 'false').lower() == 'true'
@@ -25,9 +41,171 @@ app.config['SESSION_COOKIE_SAMESITE'] = os.getenv('SESSION_COOKIE_SAMESITE', 'La
 FORUM_UPLOAD_FOLDER = os.getenv('FORUM_UPLOAD_FOLDER', 'static/uploads/forum')
 EXAM_UPLOAD_FOLDER = os.getenv('EXAM_UPLOAD_FOLDER', 'static/uploads/exams')
 ALLOWED_EXAM_EXTENSIONS = {'docx'}
+ALLOWED_EXAM_ARCHIVE_EXTENSIONS = {'zip'}
+
+# Response HTML/JSON từ COMPRESS_MIN_SIZE byte trở lên được nén gzip (xem compress_response)
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))
+# File tĩnh có mã băm trong URL được trình duyệt lưu một năm (nội dung đổi thì URL đổi)
+STATIC_MAX_AGE = 365 * 24 * 3600
+static_assets = StaticAssets(app.static_folder, os.getenv('STATIC_GZIP_DIR', 'data/cache/static_gzip'))
+if SERVER_PROCESS:
+    static_assets.build()
+
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    # url_for('static', filename='css/style.css') -> /static/css/style.<mã băm>.css
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = static_assets.url(values['filename'])
+
+
+def serve_static(filename):
+    """Thay view 'static' của Flask: tên có mã băm thì trả file thật (bản gzip nếu được) và cho lưu lâu"""
+    asset = static_assets.resolve(filename)
+    if asset is None:
+        # File tải lên (static/uploads) hoặc URL không có mã băm
+        return app.send_static_file(filename)
+    
+    # Mã băm cũ (trang lưu từ bản trước): vẫn trả file hiện tại nhưng không cho lưu lâu
+    max_age = STATIC_MAX_AGE if asset['current'] else None
+    if asset['gzip'] and request.accept_encodings['gzip'] > 0:
+        response = send_file(asset['gzip'], mimetype=asset['mimetype'], max_age=max_age)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_from_directory(app.static_folder, asset['filename'],
+                                       mimetype=asset['mimetype'], max_age=max_age)
+    if asset['gzip']:
+        response.vary.add('Accept-Encoding')
+    if asset['current']:
+        response.cache_control.immutable = True
+    return response
+
+
+app.view_functions['static'] = serve_static
+
+# Mỗi học sinh được gửi tối đa CHAT_RATE_BURST câu liên tiếp, sau đó hồi
+# CHAT_RATE_PER_MINUTE câu mỗi phút
+# (bucket lưu ở CHAT_RATE_DIR, dùng chung cho mọi worker)
+chat_rate_limiter = FileTokenBucketLimiter(
+    os.getenv('CHAT_RATE_DIR', 'data/cache/chat_rate'),
+    rate=float(os.getenv('CHAT_RATE_PER_MINUTE', '6')) / 60,
+    capacity=float(os.getenv('CHAT_RATE_BURST', '5'))
+)
+
+
+# Tiến trình con parse đề (spawn, xem ImportJobManager._run_bulk) chạy lại app.py dưới tên
+# __mp_main__ khi server được chạy bằng `python app.py`. Chúng chỉ gọi parse_exam_file của
+# utils.import_jobs nên bỏ qua các việc khởi động: Database, job import (luồng heartbeat,
+# khôi phục job dở), việc nền đã ghi tràn và bản gzip file tĩnh
+if SERVER_PROCESS:
+    db = Database()
+    # Mỗi request đọc mỗi file JSON tối đa một lần và ghi các file đã đổi một lần ở cuối request
+    db.unit_of_work_provider = lambda: g.get('unit_of_work') if has_request_context() else None
+    auth.unit_of_work_provider = db.unit_of_work_provider
+    # Import đề thi .docx chạy nền; trạng thái job lưu trên đĩa để worker nào cũng đọc được
+    import_jobs = ImportJobManager(
+        db,
+        os.getenv('IMPORT_JOBS_DIR', 'data/cache/import_jobs'),
+        max_workers=int(os.getenv('IMPORT_JOB_WORKERS', '2')),
+        process_workers=int(os.getenv('IMPORT_PROCESS_WORKERS', '0')) or None
+    )
+    # Các việc ghi không quan trọng (lượt xem, tiến độ) chạy nền sau khi trả response;
+    # việc chưa chạy khi tắt server được ghi ra DEFERRED_TASKS_DIR và chạy tiếp lần khởi động sau
+    # (kết quả thi nay ghi trong request; 'save_exam_result' giữ lại cho việc đã ghi tràn từ bản cũ)
+    deferred_tasks = DeferredTaskRunner(
+        os.getenv('DEFERRED_TASKS_DIR', 'data/cache/deferred_tasks'),
+        max_workers=int(os.getenv('DEFERRED_TASK_WORKERS', '2')),
+        max_queue=int(os.getenv('DEFERRED_TASK_QUEUE', '256')),
+        drain_timeout=float(os.getenv('DEFERRED_TASK_DRAIN_SECONDS', '10'))
+    )
+    deferred_tasks.register('save_exam_result', db.add_exam_result)
+    deferred_tasks.register('increment_post_views', db.increment_post_views)
+    deferred_tasks.register('update_progress', db.update_progress)
+    deferred_tasks.register('update_progress_batch', db.update_progress_batch)
+    deferred_tasks.register('regrade_submissions', db.regrade_submissions)
+    deferred_tasks.start()
+
+
+def defer_task(name, key=None, **kwargs):
+    """Hẹn việc chạy nền sau khi request ghi xong (xem commit_unit_of_work)"""
+    g.setdefault('deferred_tasks', []).append((name, key, kwargs))
+
+
+# Các block của template trang được lưu trong db.render_cache (xem render_cached)
+CACHED_BLOCKS = ('title', 'content', 'scripts')
+
+
+def render_cached(template_name, depends_on, build):
+    """
+    Render template với các block lấy từ db.render_cache theo (route, tham số query, vai trò).
+    build() trả về context của template và chỉ được gọi khi cache chưa có; depends_on là các
+    loại dữ liệu trang dùng, cache bị xóa khi Database ghi các file đó.
+    Khung trang (base.html: tên người dùng, thông báo flash) vẫn render theo từng request.
+    """
+    key = (request.endpoint, tuple(sorted(request.args.items(multi=True))), session.get('role'))
+    
+    def render():
+        template = app.jinja_env.get_template(template_name)
+        context = build()
+        app.update_template_context(context)
+        template_context = template.new_context(context)
+        return {name: ''.join(block(template_context))
+                for name, block in template.blocks.items() if name in CACHED_BLOCKS}
+    
+    return render_template('cached_page.html', fragments=db.render_cache.get_or_render(key, depends_on, render))
+
 
+def _release_token():
+    """Đổi khi app.py hoặc template đổi (bản triển khai mới), để ETag của bản cũ không còn khớp"""
+    template_dir = os.path.join(app.root_path, app.template_folder)
+    paths = [os.path.abspath(__file__)] + [os.path.join(root, name)
+                                          for root, _, names in os.walk(template_dir) for name in names]
+    return str(max((os.stat(path).st_mtime_ns for path in paths if os.path.exists(path)), default=0))
 
-db = Database()
+
+ETAG_RELEASE = os.getenv('ETAG_RELEASE') or _release_token()
+
+
+def conditional_get(*collections):
+    """
+    ETag mạnh cho GET, tạo từ phiên bản các tập dữ liệu trang dùng (db.data_versions) cùng
+    route, tham số và người dùng, không phải từ nội dung đã render. If-None-Match khớp thì
+    trả 304 ngay, không đọc dữ liệu, không render template hay tạo JSON.
+    Đặt sau login_required; trang còn thông báo flash chưa hiện thì bỏ qua.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET' or '_flashes' in session:
+                return f(*args, **kwargs)
+            
+            etag = hashlib.sha1(json.dumps([
+                ETAG_RELEASE,
+                request.endpoint,
+                sorted(request.view_args.items()),
+                sorted(request.args.items(multi=True)),
+                session.get('user_id'),
+                session.get('role'),
+                db.data_versions.token(collections)
+            ]).encode('utf-8')).hexdigest()
+            
+            # Bản nén gzip mang ETag có hậu tố (xem gzip_response)
+            matched = next((candidate for candidate in (etag, etag + GZIP_ETAG_SUFFIX)
+                            if request.if_none_match.contains(candidate)), None)
+            if matched is not None:
+                etag = matched
+                response = app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Trang có thông tin riêng của người dùng: chỉ trình duyệt lưu, luôn hỏi lại server
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
 
 
 def login_required(f):
@@ -70,6 +248,36 @@ def student_required(f):
     return decorated_function
 
 
+@app.before_request
+def begin_unit_of_work():
+    g.unit_of_work = UnitOfWork()
+
+
+@app.after_request
+def commit_unit_of_work(response):
+    # Ghi ở after_request (không phải teardown) để lỗi ghi file trả về 500 thay vì bị nuốt mất
+    unit_of_work = g.pop('unit_of_work', None)
+    if unit_of_work is not None:
+        db.commit_unit_of_work(unit_of_work)
+    # Việc nền chỉ được hẹn khi request không lỗi, sau khi các file của request đã ghi xong
+    for name, key, kwargs in g.pop('deferred_tasks', []):
+        deferred_tasks.schedule(name, key=key, **kwargs)
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    return gzip_response(response, request.accept_encodings, min_size=COMPRESS_MIN_SIZE, level=COMPRESS_LEVEL)
+
+
+@app.teardown_request
+def discard_unit_of_work(error=None):
+    # Còn lại ở đây nghĩa là request lỗi trước khi after_request chạy
+    unit_of_work = g.pop('unit_of_work', None)
+    if unit_of_work is not None:
+        db.discard_unit_of_work(unit_of_work)
+
+
 @app.route('/')
 def index():
     if 'user_id' in session:
@@ -78,12 +286,13 @@ def index():
         else:
             return redirect(url_for('student_dashboard'))
     
-    total_courses = len(db.get_all_courses())
-    total_documents = len(db.get_all_documents())
+    def build():
+        return {
+            'total_courses': len(db.get_all_courses()),
+            'total_documents': db.count_documents()
+        }
     
-    return render_template('index.html', 
-                         total_courses=total_courses,
-                         total_documents=total_documents)
+    return render_cached('index.html', ('courses', 'documents'), build)
 
 
 @app.route('/register', methods=['GET', 'POST'])
@@ -161,8 +370,8 @@ def student_dashboard():
     my_progress = db.get_student_progress(session['user_id'])
     
     enrolled_courses = []
-    for progress in my_progress:
-        course = db.get_course_by_id(progress['course_id'])
+    for progress, related in join_related(my_progress, {'course': ('course_id', db.get_courses_by_ids)}):
+        course = related['course']
         if course:
             total_lessons = len(course.get('lessons', []))
             completed_lessons = len(progress.get('completed_lessons', []))
@@ -186,14 +395,13 @@ def student_dashboard():
 def teacher_dashboard():
     my_courses = db.get_courses_by_teacher(session['user_id'])
     
+    enrollment = db.get_enrollment_counts([course['id'] for course in my_courses])
+    
     course_stats = []
     for course in my_courses:
-        all_progress = db._load_json(db.progress_file)
-        students_enrolled = len([p for p in all_progress if p['course_id'] == course['id']])
-        
         course_stats.append({
             'course': course,
-            'students_enrolled': students_enrolled,
+            'students_enrolled': enrollment[course['id']],
             'total_lessons': len(course.get('lessons', []))
         })
     
@@ -205,21 +413,21 @@ def teacher_dashboard():
 @app.route('/courses')
 @login_required
 def courses():
-    all_courses = db.get_all_courses()
-    
-    courses_with_teacher = []
-    for course in all_courses:
-        teacher = get_user_by_id(course['teacher_id'])
-        course['teacher_name'] = teacher['username'] if teacher else 'Unknown'
-        courses_with_teacher.append(course)
+    def build():
+        courses_with_teacher = []
+        for course, related in join_related(db.get_all_courses(), {'teacher': ('teacher_id', get_users_by_ids)}):
+            teacher = related['teacher']
+            course['teacher_name'] = teacher['username'] if teacher else 'Unknown'
+            courses_with_teacher.append(course)
+        return {'courses': courses_with_teacher}
     
-    return render_template('courses.html', courses=courses_with_teacher)
+    return render_cached('courses.html', ('courses', 'users'), build)
 
 
 @app.route('/course/<course_id>')
 @login_required
 def course_detail(course_id):
-    course = db.get_course_by_id(course_id)
+    course = db.get_course_with_lessons(course_id)
     
     if not course:
         flash('Khóa học không tồn tại', 'danger')
@@ -228,8 +436,10 @@ def course_detail(course_id):
     teacher = get_user_by_id(course['teacher_id'])
     course['teacher_name'] = teacher['username'] if teacher else 'Unknown'
     
+    # Tiến độ vừa đánh dấu có thể còn đang được ghi nền, kể cả ở worker khác
+    deferred_tasks.wait_for(f"progress:{session['user_id']}")
     progress = db.get_course_progress(session['user_id'], course_id)
-    completed_lessons = progress['completed_lessons'] if progress else []
+    completed_lessons = set(progress['completed_lessons']) if progress else set()
     
     is_teacher = session.get('role') == 'teacher' and course['teacher_id'] == session['user_id']
     
@@ -266,7 +476,7 @@ def create_course():
 @app.route('/teacher/edit_course/<course_id>', methods=['GET', 'POST'])
 @teacher_required
 def edit_course(course_id):
-    course = db.get_course_by_id(course_id)
+    course = db.get_course_with_lessons(course_id)
     
     if not course:
         flash('Khóa học không tồn tại', 'danger')
@@ -282,6 +492,9 @@ def edit_course(course_id):
             success = db.update_course(course_id, data)
             
             if success:
+                if 'lessons' in data:
+                    # Đáp án có thể đã đổi: chấm lại nền các bài nộp theo đáp án cũ
+                    defer_task('regrade_submissions', course_id=course_id)
                 return jsonify({'success': True, 'message': 'Cập nhật khóa học thành công'})
             else:
                 return jsonify({'success': False, 'message': 'Cập nhật thất bại'})
@@ -303,9 +516,7 @@ def delete_course(course_id):
     if course['teacher_id'] != session['user_id']:
         return jsonify({'success': False, 'message': 'Bạn không có quyền xóa khóa học này'})
     
-    courses = db.get_all_courses()
-    courses = [c for c in courses if c['id'] != course_id]
-    db._save_json(db.courses_file, courses)
+    db.delete_course(course_id)
     
     return jsonify({'success': True, 'message': 'Xóa khóa học thành công'})
 
@@ -313,27 +524,21 @@ def delete_course(course_id):
 @app.route('/exercises')
 @login_required
 def exercises():
-    all_courses = db.get_all_courses()
-    
-    exercises_list = []
-    for course in all_courses:
-        for lesson in course.get('lessons', []):
-            questions = lesson.get('questions', [])
-            if questions:
-                exercises_list.append({
-                    'course_id': course['id'],
-                    'course_title': course['title'],
-                    'lesson_id': lesson['id'],
-                    'lesson_title': lesson['title'],
-                    'questions': questions
-                })
-    
-    try:
-        all_submissions = db._load_json(db.submissions_file) if hasattr(db, 'submissions_file') else []
-    except:
-        all_submissions = []
-    
-    my_submissions = [s for s in all_submissions if s.get('user_id') == session['user_id']]
+    exercises_list = db.get_exercises()
+    latest = db.get_latest_submissions_by_user(session['user_id'])
+    latest_by_lesson = {(sub.get('course_id'), sub.get('exercise_id')): sub for sub in latest}
+    
+    exercises_list = [dict(ex, latest=latest_by_lesson.get((ex['course_id'], ex['lesson_id'])))
+                      for ex in exercises_list]
+    titles = {(ex['course_id'], ex['lesson_id']): ex for ex in exercises_list}
+    my_submissions = []
+    for sub in latest:
+        exercise = titles.get((sub.get('course_id'), sub.get('exercise_id')))
+        my_submissions.append(dict(
+            sub,
+            course_title=exercise['course_title'] if exercise else sub.get('course_id'),
+            lesson_title=exercise['lesson_title'] if exercise else sub.get('exercise_id')
+        ))
     
     return render_template('exercises.html', 
                          exercises=exercises_list,
@@ -356,34 +561,22 @@ def submit_exercise():
             'submitted_at': datetime.now().isoformat()
         }
         
+        # Chấm trước khi lưu để bài nộp được lưu kèm điểm và phiên bản đáp án đã dùng
+        lesson = db.get_lesson(data['course_id'], data['lesson_id'])
+        if lesson:
+            submission_data.update(grade_exercise(lesson.get('questions', []), data['answers']))
+        
         submission_id = db.save_exercise_submission(session['user_id'], submission_data)
         
-        course = db.get_course_by_id(data['course_id'])
-        if course:
-            lesson = next((l for l in course.get('lessons', []) if l['id'] == data['lesson_id']), None)
-            if lesson:
-                questions = lesson.get('questions', [])
-                correct = 0
-                total = len(questions)
-                
-                for i, q in enumerate(questions):
-                    user_answer_raw = data['answers'].get(str(i), '')
-                    user_choice = normalize_answer_token(user_answer_raw)
-                    correct_answers = normalize_correct_answers(q.get('correct_answer'))
-                    
-                    if user_choice and user_choice in correct_answers:
-                        correct += 1
-                
-                score = round((correct / total * 100) if total > 0 else 0, 1)
-                
-                return jsonify({
-                    'success': True,
-                    'submission_id': submission_id,
-                    'score': score,
-                    'correct': correct,
-                    'total': total,
-                    'message': 'Nộp bài thành công'
-                })
+        if lesson:
+            return jsonify({
+                'success': True,
+                'submission_id': submission_id,
+                'score': submission_data['score'],
+                'correct': submission_data['correct'],
+                'total': submission_data['total'],
+                'message': 'Nộp bài thành công'
+            })
         
         return jsonify({'success': True, 'submission_id': submission_id, 'message': 'Nộp bài thành công'})
     
@@ -391,30 +584,43 @@ def submit_exercise():
         return jsonify({'success': False, 'message': f'Lỗi: {str(e)}'})
 
 
+# Số tài liệu mỗi trang khi lọc theo lớp, và mỗi phần lớp khi xem tất cả lớp
+DOCUMENTS_PER_PAGE = 24
+DOCUMENTS_PER_SECTION = 6
+
+
 @app.route('/documents')
 @login_required
+@conditional_get('documents')
 def documents():
     # Lấy các tham số lọc từ query string
     grade_filter = request.args.get('grade', 'all')  # 10, 11, 12, hoặc all
     type_filter = request.args.get('type', 'all')    # document, lecture, exam, hoặc all
+    page = request.args.get('page', 1, type=int)
+    
+    if grade_filter not in DOCUMENT_GRADES:
+        grade_filter = 'all'
+    if type_filter not in DOCUMENT_TYPES:
+        type_filter = 'all'
+    
+    def build():
+        if grade_filter == 'all':
+            # Mỗi lớp một phần, chỉ lấy trang đầu; xem thêm thì chuyển sang bộ lọc theo lớp
+            docs_by_grade = {
+                grade: db.get_documents_page(grade, type_filter, per_page=DOCUMENTS_PER_SECTION)
+                for grade in DOCUMENT_GRADES
+            }
+        else:
+            docs_by_grade = {
+                grade_filter: db.get_documents_page(grade_filter, type_filter, page=page, per_page=DOCUMENTS_PER_PAGE)
+            }
+        return {
+            'docs_by_grade': docs_by_grade,
+            'current_grade': grade_filter,
+            'current_type': type_filter
+        }
     
-    docs = db.get_all_documents()
-    
-    if grade_filter != 'all':
-        docs = [d for d in docs if d.get('grade') == grade_filter]
-    if type_filter != 'all':
-        docs = [d for d in docs if d.get('doc_type') == type_filter]
-    
-    docs_by_grade = {
-        '10': [d for d in docs if d.get('grade') == '10'],
-        '11': [d for d in docs if d.get('grade') == '11'],
-        '12': [d for d in docs if d.get('grade') == '12']
-    }
-    
-    return render_template('documents.html',
-                         docs_by_grade=docs_by_grade,
-                         current_grade=grade_filter,
-                         current_type=type_filter)
+    return render_cached('documents.html', ('documents',), build)
 
 
 
@@ -429,10 +635,10 @@ def add_document():
                 return jsonify({'success': False, 'message': 'Vui lòng nhập đầy đủ thông tin'})
             
             # Thêm trường grade và doc_type vào dữ liệu
-            if not data.get('grade'):
+            if str(data.get('grade', '')) not in DOCUMENT_GRADES:
                 return jsonify({'success': False, 'message': 'Vui lòng chọn lớp học'})
             
-            if not data.get('doc_type'):
+            if data.get('doc_type') not in DOCUMENT_TYPES:
                 return jsonify({'success': False, 'message': 'Vui lòng chọn loại tài liệu'})
             
             if 'youtube.com' in data['url'] or 'youtu.be' in data['url']:
@@ -508,86 +714,78 @@ def import_exam():
         temp_path = os.path.join(EXAM_UPLOAD_FOLDER, temp_filename)
         exam_file.save(temp_path)
 
-        try:
-            parsed_questions = parse_docx_exam(temp_path, allow_multiple_answers=allow_multiple)
-        except ExamParseError as exc:
-            flash(f'Lỗi khi đọc file đề: {exc}', 'danger')
-            os.remove(temp_path)
-            return render_template('import_exam.html', form_data=form_data)
-        except Exception as exc:
-            flash(f'Lỗi không xác định khi xử lý file: {exc}', 'danger')
-            os.remove(temp_path)
-            return render_template('import_exam.html', form_data=form_data)
-        finally:
-            try:
-                os.remove(temp_path)
-            except OSError:
-                pass
+        job = import_jobs.submit(temp_path, {
+            'file_name': exam_file.filename,
+            'grade': grade,
+            'title': title,
+            'description': description,
+            'time_limit': time_limit,
+            'allow_multiple': allow_multiple
+        }, created_by=session['username'])
 
-        if not parsed_questions:
-            flash('Không tìm thấy câu hỏi trắc nghiệm nào trong file.', 'danger')
-            return render_template('import_exam.html', form_data=form_data)
+        flash(f'Đã nhận file "{exam_file.filename}", hệ thống đang xử lý đề thi.', 'info')
+        return redirect(url_for('import_exam', job_id=job['id']))
 
-        questions = []
-        for idx, item in enumerate(parsed_questions, start=1):
-            options = item.get('options', {})
-            correct_answer = item.get('correct_answer')
+    job = import_jobs.get(request.args.get('job_id', ''), created_by=session['username'])
+    return render_template('import_exam.html', form_data=form_data, job=job,
+                           recent_jobs=import_jobs.list_jobs(session['username'], limit=5))
 
-            if not options or len(options) < 2:
-                flash(f'Câu {item.get("number", idx)} không có đủ lựa chọn.', 'danger')
-                return render_template('import_exam.html', form_data=form_data)
 
-            normalized_correct = None
-            if allow_multiple:
-                if isinstance(correct_answer, list):
-                    valid_answers = [ans for ans in correct_answer if ans in options]
-                else:
-                    valid_answers = [correct_answer] if correct_answer in options else []
-                if not valid_answers:
-                    flash(f'Không xác định được đáp án đúng cho câu {item.get("number", idx)}.', 'danger')
-                    return render_template('import_exam.html', form_data=form_data)
-                normalized_correct = valid_answers if len(valid_answers) > 1 else valid_answers[0]
-            else:
-                if isinstance(correct_answer, list):
-                    # Ưu tiên lấy đáp án đầu tiên nếu parser trả về list
-                    correct_value = correct_answer[0] if correct_answer else None
-                else:
-                    correct_value = correct_answer
-                if not correct_value or correct_value not in options:
-                    flash(f'Không xác định được đáp án đúng cho câu {item.get("number", idx)}.', 'danger')
-                    return render_template('import_exam.html', form_data=form_data)
-                normalized_correct = correct_value
-
-            questions.append({
-                'id': item.get('number', idx),
-                'number': item.get('number', idx),
-                'question': item.get('question', '').strip(),
-                'options': options,
-                'correct_answer': normalized_correct,
-                'explanation': item.get('explanation', '').strip()
-            })
+@app.route('/teacher/import_exam/bulk', methods=['POST'])
+@teacher_required
+def import_exam_bulk():
+    grade = request.form.get('grade', '').strip()
+    title_prefix = request.form.get('title', '').strip()
+    description = request.form.get('description', '').strip()
+    allow_multiple = bool(request.form.get('allow_multiple'))
+    archive = request.files.get('exam_archive')
 
-        exam_id = f"exam_{grade}_{uuid.uuid4().hex[:6]}"
-        exam_record = {
-            'id': exam_id,
-            'title': title,
-            'description': description,
-            'time_limit': time_limit,
-            'questions': questions,
-            'allow_multiple_answers': allow_multiple,
-            'created_at': datetime.now().isoformat()
-        }
+    errors = []
+    if grade not in {'10', '11', '12'}:
+        errors.append('Vui lòng chọn khối lớp hợp lệ (10, 11 hoặc 12).')
 
-        try:
-            db.add_exam(grade, exam_record)
-        except Exception as exc:
-            flash(f'Không thể lưu đề thi: {exc}', 'danger')
-            return render_template('import_exam.html', form_data=form_data)
+    try:
+        time_limit = int(request.form.get('time_limit', '').strip() or '15')
+        if time_limit <= 0:
+            raise ValueError
+    except ValueError:
+        errors.append('Thời gian làm bài phải là số nguyên dương (phút).')
+
+    if not archive or not archive.filename:
+        errors.append('Vui lòng chọn file .zip chứa các đề cần import.')
+    elif not allowed_exam_archive(archive.filename):
+        errors.append('Chỉ hỗ trợ file nén định dạng .zip.')
+
+    if errors:
+        for message in errors:
+            flash(message, 'danger')
+        return redirect(url_for('import_exam'))
 
-        flash(f'Đã tạo đề thi "{title}" với {len(questions)} câu hỏi cho khối {grade}.', 'success')
-        return redirect(url_for('tracnghiem'))
+    ensure_directory(EXAM_UPLOAD_FOLDER)
+    temp_path = os.path.join(EXAM_UPLOAD_FOLDER, f"{uuid.uuid4().hex}_{secure_filename(archive.filename)}")
+    archive.save(temp_path)
+
+    job = import_jobs.submit_bulk(temp_path, {
+        'file_name': archive.filename,
+        'grade': grade,
+        'title': title_prefix,
+        'description': description,
+        'time_limit': time_limit,
+        'allow_multiple': allow_multiple
+    }, created_by=session['username'])
+
+    flash(f'Đã nhận file "{archive.filename}", hệ thống đang xử lý các đề thi.', 'info')
+    return redirect(url_for('import_exam', job_id=job['id']))
 
-    return render_template('import_exam.html', form_data=form_data)
+
+@app.route('/teacher/import_exam/jobs/<job_id>')
+@teacher_required
+def import_exam_job_status(job_id):
+    # Chỉ giáo viên đã tải file lên mới xem được job (danh sách lỗi, đề trùng của họ)
+    job = import_jobs.get(job_id, created_by=session['username'])
+    if not job:
+        return jsonify({'success': False, 'message': 'Không tìm thấy tiến trình import'}), 404
+    return jsonify({'success': True, 'job': job})
 
 
 @app.route('/chatbot')
@@ -606,6 +804,16 @@ def chat():
         if not message:
             return jsonify({'success': False, 'response': 'Vui lòng nhập tin nhắn'})
         
+        allowed, retry_after = chat_rate_limiter.allow(session['user_id'])
+        if not allowed:
+            wait_seconds = max(1, int(retry_after + 0.999))
+            response = jsonify({
+                'success': False,
+                'response': f'Bạn gửi câu hỏi quá nhanh. Vui lòng thử lại sau {wait_seconds} giây.'
+            })
+            response.headers['Retry-After'] = str(wait_seconds)
+            return response, 429
+        
         response = chat_with_gemini(message)
         
         return jsonify({'success': True, 'response': response})
@@ -614,6 +822,29 @@ def chat():
         return jsonify({'success': False, 'response': f'Xin lỗi, có lỗi xảy ra: {str(e)}'})
 
 
+@app.route('/api/chat/cache_stats')
+@teacher_required
+def chat_cache_stats():
+    return jsonify({
+        'success': True,
+        'stats': response_cache.stats(),
+        'limiter': gemini_limiter.stats(),
+        'inflight': dict(inflight_calls.stats(), waited_on_other_workers=inflight_locks.waited)
+    })
+
+
+@app.route('/api/cache/render_stats')
+@teacher_required
+def render_cache_stats():
+    return jsonify({'success': True, 'stats': db.render_cache.stats()})
+
+
+@app.route('/api/tasks/stats')
+@teacher_required
+def deferred_task_stats():
+    return jsonify({'success': True, 'stats': deferred_tasks.stats()})
+
+
 @app.route('/update_progress', methods=['POST'])
 @login_required
 def update_progress():
@@ -623,11 +854,13 @@ def update_progress():
         if not data.get('course_id') or not data.get('lesson_id'):
             return jsonify({'success': False, 'message': 'Dữ liệu không đầy đủ'})
         
-        db.update_progress(
-            session['user_id'],
-            data['course_id'],
-            data['lesson_id'],
-            data.get('completed', True),
+        defer_task(
+            'update_progress',
+            key=f"progress:{session['user_id']}",
+            user_id=session['user_id'],
+            course_id=data['course_id'],
+            lesson_id=data['lesson_id'],
+            completed=data.get('completed', True),
             timestamp=datetime.now().isoformat()
         )
         
@@ -637,43 +870,98 @@ def update_progress():
         return jsonify({'success': False, 'message': f'Lỗi: {str(e)}'})
 
 
+# Số cập nhật tối đa trong một lần gửi /api/progress/batch
+MAX_PROGRESS_BATCH = 500
+
+
+@app.route('/api/progress/batch', methods=['POST'])
+@login_required
+def update_progress_batch():
+    """
+    Nhận nhiều cập nhật tiến độ trong một request (main.js gom các lần đánh dấu lại rồi gửi
+    một lần): {'updates': [{'course_id', 'lesson_id', 'completed'}]}, ghi một lần progress.json.
+    """
+    # sendBeacon khi rời trang gửi kèm Content-Type của Blob, force để không phụ thuộc header
+    data = request.get_json(force=True, silent=True) or {}
+    updates = data.get('updates')
+    
+    if not isinstance(updates, list) or not updates:
+        return jsonify({'success': False, 'message': 'Dữ liệu không đầy đủ'}), 400
+    if len(updates) > MAX_PROGRESS_BATCH:
+        return jsonify({'success': False, 'message': f'Tối đa {MAX_PROGRESS_BATCH} cập nhật mỗi lần'}), 400
+    
+    cleaned = []
+    for update in updates:
+        if not isinstance(update, dict) or not update.get('course_id') or not update.get('lesson_id'):
+            return jsonify({'success': False, 'message': 'Dữ liệu không đầy đủ'}), 400
+        cleaned.append({
+            'course_id': str(update['course_id']),
+            'lesson_id': str(update['lesson_id']),
+            'completed': bool(update.get('completed', True))
+        })
+    
+    defer_task(
+        'update_progress_batch',
+        key=f"progress:{session['user_id']}",
+        user_id=session['user_id'],
+        updates=cleaned,
+        timestamp=datetime.now().isoformat()
+    )
+    
+    return jsonify({'success': True, 'accepted': len(cleaned), 'message': 'Cập nhật tiến độ thành công'})
+
+
 @app.route('/teacher/students_progress')
 @teacher_required
 def students_progress():
     teacher_courses = db.get_courses_by_teacher(session['user_id'])
-    teacher_course_ids = [c['id'] for c in teacher_courses]
-    
-    all_progress = db._load_json(db.progress_file)
-    filtered_progress = [p for p in all_progress if p['course_id'] in teacher_course_ids]
+    reports = [(course, db.get_course_progress_report(course['id'])) for course in teacher_courses]
+    reports = [(course, report) for course, report in reports if report and report['enrolled']]
+    users = get_users_by_ids({user_id for _, report in reports for user_id in report['student_ids']})
     
     progress_with_details = []
-    for prog in filtered_progress:
-        student = get_user_by_id(prog['user_id'])
-        course = db.get_course_by_id(prog['course_id'])
-        
-        if student and course:
-            total_lessons = len(course.get('lessons', []))
-            completed = len(prog.get('completed_lessons', []))
-            percentage = round((completed / total_lessons * 100) if total_lessons > 0 else 0, 1)
-            
+    course_reports = []
+    for course, report in reports:
+        for row, user_id in enumerate(report['student_ids']):
+            student = users.get(user_id)
+            if not student:
+                continue
             progress_with_details.append({
                 'student_name': student['username'],
                 'student_email': student.get('email', ''),
                 'course_title': course['title'],
-                'completed': completed,
-                'total': total_lessons,
-                'percentage': percentage,
-                'last_updated': prog.get('last_updated', 'Chưa cập nhật')
+                'completed': report['counts'][row],
+                'total': report['total_lessons'],
+                'percentage': report['percentages'][row],
+                'last_updated': report['last_updated'][row] or 'Chưa cập nhật'
             })
+        
+        lesson_titles = {lesson['id']: lesson.get('title', '') for lesson in course.get('lessons', [])}
+        course_reports.append({
+            'course_title': course['title'],
+            'enrolled': report['enrolled'],
+            'completed': report['completed'],
+            'average_percentage': report['average_percentage'],
+            'lessons': [{
+                'title': lesson_titles.get(lesson_id, ''),
+                'completions': report['lesson_completions'][i],
+                'funnel': report['funnel'][i]
+            } for i, lesson_id in enumerate(report['lesson_ids'])],
+            'stalled': [users[report['student_ids'][row]]['username'] for row in report['stalled']
+                        if report['student_ids'][row] in users]
+        })
     
-    return render_template('student_progress.html', progress=progress_with_details)
+    return render_template('student_progress.html',
+                         progress=progress_with_details,
+                         course_reports=course_reports,
+                         stalled_days=STALLED_DAYS)
 
 
 @app.route('/teacher/view_submissions')
 @teacher_required
 def view_submissions():
     teacher_courses = db.get_courses_by_teacher(session['user_id'])
-    teacher_course_ids = [c['id'] for c in teacher_courses]
+    teacher_course_ids = {c['id'] for c in teacher_courses}
     
     try:
         all_submissions = db._load_json(db.submissions_file) if hasattr(db, 'submissions_file') else []
@@ -683,9 +971,12 @@ def view_submissions():
     filtered_submissions = [s for s in all_submissions if s.get('course_id') in teacher_course_ids]
     
     submissions_with_details = []
-    for sub in filtered_submissions:
-        student = get_user_by_id(sub['user_id'])
-        course = db.get_course_by_id(sub.get('course_id'))
+    for sub, related in join_related(filtered_submissions, {
+        'student': ('user_id', get_users_by_ids),
+        'course': ('course_id', db.get_courses_by_ids)
+    }):
+        student = related['student']
+        course = related['course']
         
         if student and course:
             submissions_with_details.append({
@@ -693,21 +984,161 @@ def view_submissions():
                 'course_title': course['title'],
                 'exercise_id': sub.get('exercise_id'),
                 'answers': sub.get('answers', {}),
-                'submitted_at': sub.get('submitted_at', 'Không rõ')
+                'submitted_at': sub.get('submitted_at', 'Không rõ'),
+                'score': sub.get('score'),
+                'correct': sub.get('correct'),
+                'total': sub.get('total')
             })
     
     return render_template('view_submissions.html', submissions=submissions_with_details)
 
 
+def _submission_rows(course_titles, users, start_at, end_before):
+    for sub in db.iter_records(db.submissions_file):
+        if sub.get('course_id') not in course_titles or not in_date_range(sub.get('submitted_at'), start_at, end_before):
+            continue
+        student = users.get(sub.get('user_id'), {})
+        yield [
+            sub.get('id', ''),
+            student.get('username', ''),
+            student.get('email', ''),
+            course_titles[sub['course_id']],
+            sub.get('exercise_id', ''),
+            json.dumps(sub.get('answers', {}), ensure_ascii=False),
+            sub.get('score', ''),
+            sub.get('correct', ''),
+            sub.get('total', ''),
+            sub.get('submitted_at', '')
+        ]
+
+
+def _exam_result_rows(users, start_at, end_before):
+    for result in db.iter_records(db.exam_results_file):
+        if not in_date_range(result.get('submitted_at'), start_at, end_before):
+            continue
+        student = users.get(result.get('user_id'), {})
+        yield [
+            result.get('username') or student.get('username', ''),
+            student.get('email', ''),
+            result.get('grade', ''),
+            result.get('exam_id', ''),
+            result.get('exam_title', ''),
+            result.get('score', ''),
+            result.get('correct_count', ''),
+            result.get('total_questions', ''),
+            result.get('time_spent_seconds', ''),
+            result.get('submitted_at', '')
+        ]
+
+
+def _progress_rows(courses, users, start_at, end_before):
+    for progress in db.iter_records(db.progress_file):
+        course = courses.get(progress.get('course_id'))
+        if course is None or not in_date_range(progress.get('last_updated'), start_at, end_before):
+            continue
+        student = users.get(progress.get('user_id'), {})
+        lesson_ids = {lesson['id'] for lesson in course.get('lessons', [])}
+        completed = len(lesson_ids.intersection(progress.get('completed_lessons', [])))
+        total = len(lesson_ids)
+        yield [
+            student.get('username', ''),
+            student.get('email', ''),
+            course['title'],
+            completed,
+            total,
+            round(completed / total * 100, 1) if total else 0,
+            progress.get('last_updated', '')
+        ]
+
+
+# Các loại dữ liệu xuất CSV: tên file và dòng tiêu đề
+CSV_EXPORTS = {
+    'submissions': ('bai_nop', ['Mã bài nộp', 'Học sinh', 'Email', 'Khóa học', 'Bài tập', 'Câu trả lời', 'Điểm (%)', 'Số câu đúng', 'Số câu', 'Thời gian nộp']),
+    'exam_results': ('ket_qua_thi', ['Học sinh', 'Email', 'Khối', 'Mã đề', 'Tên đề', 'Điểm', 'Số câu đúng',
+                                     'Tổng số câu', 'Thời gian làm (giây)', 'Thời gian nộp']),
+    'progress': ('tien_do', ['Học sinh', 'Email', 'Khóa học', 'Bài đã học', 'Tổng số bài', 'Phần trăm',
+                             'Cập nhật lần cuối'])
+}
+
+
+@app.route('/teacher/export/<kind>.csv')
+@teacher_required
+def export_csv(kind):
+    """
+    Xuất CSV bài nộp / kết quả thi / tiến độ trong các khóa học của giáo viên, lọc theo
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD. Bản ghi được đọc và gửi dần nên bộ nhớ không tăng theo
+    số dòng và trình duyệt nhận được dữ liệu ngay.
+    """
+    if kind not in CSV_EXPORTS:
+        flash('Loại dữ liệu xuất không hợp lệ', 'danger')
+        return redirect(url_for('teacher_dashboard'))
+    
+    try:
+        start_at, end_before = parse_date_range(request.args.get('from'), request.args.get('to'))
+    except ValueError:
+        flash('Ngày không hợp lệ, định dạng đúng là YYYY-MM-DD', 'danger')
+        return redirect(url_for('teacher_dashboard'))
+    
+    # Khóa học và người dùng nhỏ so với số dòng xuất: nạp một lần trước khi gửi
+    courses = {course['id']: course for course in db.get_courses_by_teacher(session['user_id'])}
+    users = {user['id']: user for user in auth.load_users()}
+    
+    if kind == 'submissions':
+        course_titles = {course_id: course['title'] for course_id, course in courses.items()}
+        rows = _submission_rows(course_titles, users, start_at, end_before)
+    elif kind == 'exam_results':
+        rows = _exam_result_rows(users, start_at, end_before)
+    else:
+        rows = _progress_rows(courses, users, start_at, end_before)
+    
+    filename, header = CSV_EXPORTS[kind]
+    period = '_'.join(value for value in (request.args.get('from'), request.args.get('to')) if value)
+    if period:
+        filename = f'{filename}_{period}'
+    
+    return Response(
+        stream_with_context(stream_csv(header, rows)),
+        mimetype='text/csv',
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}.csv',
+            # Không để proxy gom cả file rồi mới gửi
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
 @app.route('/api/course/<course_id>')
 @login_required
+@conditional_get('courses')
 def api_get_course(course_id):
-    course = db.get_course_by_id(course_id)
+    course = db.get_course_with_lessons(course_id)
     if course:
         return jsonify({'success': True, 'course': course})
     return jsonify({'success': False, 'error': 'Course not found'}), 404
 
 
+@app.route('/search')
+@login_required
+def search():
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    filters = {name: request.args.get(name, '').strip() for name in ('type', 'grade', 'doc_type', 'tags')}
+    filters = {name: value for name, value in filters.items() if value}
+    results = db.search_site(query, filters=filters, page=page) if query else None
+
+    return render_template('search.html',
+                         query=query,
+                         filters=filters,
+                         results=results)
+
+
+@app.route('/api/search/suggest')
+@login_required
+def search_suggest():
+    prefix = request.args.get('q', '')[:100]
+    return jsonify({'success': True, 'suggestions': db.site_index.suggest(prefix)})
+
+
 @app.errorhandler(404)
 def not_found(error):
     return render_template('404.html'), 404
@@ -946,7 +1377,7 @@ def tracnghiem():
     print(f"Username: {session.get('username')}")
     print("====================================")
     
-    try:
+    def build():
         all_exams = []
         
         # Đọc đề thi từ 3 khối lớp
@@ -982,9 +1413,11 @@ def tracnghiem():
         print(f"Grade 11: {len(exams_by_grade['11'])}")
         print(f"Grade 12: {len(exams_by_grade['12'])}")
         
-        return render_template('tracnghiem.html', 
-                             exams_by_grade=exams_by_grade,
-                             username=session.get('username'))
+        return {'exams_by_grade': exams_by_grade}
+    
+    try:
+        # Danh sách đề chỉ đọc lại khi file đề thi đổi (xem render_cached)
+        return render_cached('tracnghiem.html', ('exams',), build)
     
     except Exception as e:
         print(f"ERROR in tracnghiem route: {str(e)}")
@@ -1109,25 +1542,9 @@ def nop_bai_tracnghiem():
                 'time_spent_seconds': int(elapsed_seconds)  # 
             }
             
-            try:
-                results_file = 'data/exam_results.json'
-                os.makedirs('data', exist_ok=True)
-                
-                try:
-                    with open(results_file, 'r', encoding='utf-8') as f:
-                        all_results = json.load(f)
-                except FileNotFoundError:
-                    all_results = []
-                
-                all_results.append(result_data)
-                
-                with open(results_file, 'w', encoding='utf-8') as f:
-                    json.dump(all_results, f, ensure_ascii=False, indent=2)
-                
-                print(f"✅ Saved result: User {session['user_id']}, Score: {score}")
-            
-            except Exception as e:
-                print(f"❌ Error saving result: {e}")
+            # Điểm thi của học sinh phải có ngay ở trang kết quả/lịch sử (có thể do worker khác
+            # phục vụ): ghi trong request, không để chạy nền
+            db.add_exam_result(result_data)
             
             return jsonify({
                 'success': True,
@@ -1168,19 +1585,7 @@ def lich_su_tracnghiem():
     """
     try:
         user_id = session.get('user_id')
-        results_file = 'data/exam_results.json'
-        
-        try:
-            with open(results_file, 'r', encoding='utf-8') as f:
-                all_results = json.load(f)
-        except FileNotFoundError:
-            all_results = []
-        except json.JSONDecodeError:
-            print("ERROR: exam_results.json bị lỗi định dạng")
-            all_results = []
-        
-
-        user_results = [r for r in all_results if r.get('user_id') == user_id]
+        user_results = db.get_exam_results_by_user(user_id)
         user_results.sort(key=lambda x: x.get('submitted_at', ''), reverse=True)
         
         print(f"User {user_id} có {len(user_results)} bài đã làm")
@@ -1223,22 +1628,10 @@ def ket_qua_tracnghiem(grade, exam_id):
     """
     try:
         user_id = session.get('user_id')
-        
-
-        results_file = 'data/exam_results.json'
-        
-        try:
-            with open(results_file, 'r', encoding='utf-8') as f:
-                all_results = json.load(f)
-        except FileNotFoundError:
-            flash('Không tìm thấy kết quả bài làm', 'warning')
-            return redirect(url_for('tracnghiem'))
-        
 
         matching_results = [
-            r for r in all_results 
-            if r.get('user_id') == user_id 
-            and r.get('grade') == grade 
+            r for r in db.get_exam_results_by_user(user_id)
+            if r.get('grade') == grade 
             and r.get('exam_id') == exam_id
         ]
         
@@ -1270,25 +1663,12 @@ def allowed_file(filename):
 def allowed_exam_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXAM_EXTENSIONS
 
+def allowed_exam_archive(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXAM_ARCHIVE_EXTENSIONS
+
 def ensure_directory(path):
     os.makedirs(path, exist_ok=True)
 
-def normalize_answer_token(value):
-    if value is None:
-        return ''
-    token = str(value).strip()
-    if not token:
-        return ''
-    token = token.split('.')[0]
-    return token.strip().upper()
-
-def normalize_correct_answers(value):
-    if isinstance(value, list):
-        tokens = {normalize_answer_token(v) for v in value}
-        return {t for t in tokens if t}
-    token = normalize_answer_token(value)
-    return {token} if token else set()
-
 def format_correct_answer(value):
     if isinstance(value, list):
         return ', '.join(str(v).strip() for v in value if str(v).strip())
@@ -1296,16 +1676,29 @@ def format_correct_answer(value):
 
 @app.route('/forum')
 @login_required
+@conditional_get('forum')
 def forum():
     search_query = request.args.get('search', '').strip()
     filter_type = request.args.get('filter', 'all')
+    tag = request.args.get('tag', '').strip()
+    page = request.args.get('page', 1, type=int)
+    pagination = None
+    cursor = None
     
     if search_query:
-        posts = db.search_forum_posts(search_query)
-    elif filter_type == 'my_posts':
-        posts = db.get_forum_posts_by_user(session['user_id'])
+        results = db.search_forum_posts(search_query, page=page)
+        posts = results['posts']
+        pagination = {'page': results['page'], 'pages': results['pages'], 'total': results['total']}
     else:
-        posts = db.get_all_forum_posts()
+        # Danh sách phân trang theo con trỏ, chỉ lấy bản rút gọn của các bài viết trong trang
+        listing = db.get_forum_posts_page(
+            tag=tag or None,
+            author_id=session['user_id'] if filter_type == 'my_posts' and not tag else None,
+            before=request.args.get('before'),
+            after=request.args.get('after')
+        )
+        posts = listing['posts']
+        cursor = {'older': listing['older'], 'newer': listing['newer']}
     
     for post in posts:
         post['created_at_formatted'] = format_datetime(post['created_at'])
@@ -1314,8 +1707,12 @@ def forum():
     
     return render_template('forum.html', 
                          posts=posts,
+                         pagination=pagination,
+                         cursor=cursor,
                          search_query=search_query,
                          filter_type=filter_type,
+                         current_tag=tag,
+                         tag_cloud=db.get_forum_tag_cloud(),
                          username=session.get('username'))
 
 
@@ -1328,7 +1725,9 @@ def forum_post_detail(post_id):
         flash('Bài viết không tồn tại', 'danger')
         return redirect(url_for('forum'))
     
-    db.increment_post_views(post_id)
+    # Tăng lượt xem chạy nền; trang này hiển thị luôn số lượt xem đã tính lần xem hiện tại
+    defer_task('increment_post_views', post_id=post_id)
+    post['views'] = post.get('views', 0) + 1
     
     comments = db.get_comments_by_post(post_id)
     
@@ -1638,6 +2037,7 @@ def send_chat_message():
 
 @app.route('/api/chat/messages')
 @login_required
+@conditional_get('chat')
 def get_chat_messages():
     try:
         last_id = request.args.get('last_id', '')
@@ -1673,6 +2073,21 @@ def delete_chat_message(message_id):
     
     except Exception as e:
         return jsonify({'success': False, 'message': f'Lỗi: {str(e)}'})
+
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index():
+    """Dựng lại chỉ mục tìm kiếm chung (flask rebuild-search-index)"""
+    stats = db.site_index.rebuild()
+    print(f"Đã đánh chỉ mục {stats['documents']} mục, {stats['terms']} từ: {stats['by_type']}")
+
+
+@app.cli.command('regrade-submissions')
+def regrade_submissions():
+    """Chấm lại các bài nộp chưa có điểm hoặc theo đáp án cũ (flask regrade-submissions)"""
+    print(f'Đã chấm lại {db.regrade_submissions()} bài nộp')
+
+
 ################
 if __name__ == '__main__':
     ensure_directory('data')
@@ -0,0 +1,210 @@
+"""
+Benchmark tải cho chatbot (/api/chat) chạy hoàn toàn offline.
+
+Chuẩn bị:
+    python scripts/fake_gemini_server.py --latency lognormal:0.8,0.5 &
+    GEMINI_BACKEND=http gunicorn app:app -w 8 -b 127.0.0.1:5000 &
+
+Chạy:
+    python scripts/bench_chatbot.py --base-url http://127.0.0.1:5000 --users 40 --requests 3 \\
+        --register --teacher giaovien:matkhau --fake-url http://127.0.0.1:8765
+
+Kết quả gồm: độ trễ /api/chat, số request bị giới hạn (429), số câu trả lời "quá tải",
+số timeout, độ trễ của một trang thường được thăm dò song song (đo mức bão hòa worker),
+thống kê cache/limiter của website và số lời gọi thực sự tới model server.
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Trùng với utils.gemini_api.BUSY_MESSAGE (không import để tránh khởi tạo backend)
+BUSY_MARKER = 'đang quá tải'
+
+POPULAR_QUESTIONS = [
+    'Độ phức tạp bubble sort là gì?',
+    'độ phức tạp của bubble sort là gì ạ',
+    'Quick sort hoạt động thế nào?',
+    'Cách khai báo biến trong Python?',
+    'Vòng lặp for và while khác nhau thế nào?',
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def format_latency(values):
+    if not values:
+        return 'n/a'
+    return (f'p50={percentile(values, 50) * 1000:.0f}ms p90={percentile(values, 90) * 1000:.0f}ms '
+            f'p99={percentile(values, 99) * 1000:.0f}ms max={max(values) * 1000:.0f}ms '
+            f'mean={statistics.mean(values) * 1000:.0f}ms')
+
+
+def login(base_url, username, password, register=False, timeout=10):
+    session = requests.Session()
+    if register:
+        session.post(f'{base_url}/register', timeout=timeout, allow_redirects=False, data={
+            'username': username, 'password': password, 'email': f'{username}@bench.local'
+        })
+    response = session.post(f'{base_url}/login', timeout=timeout, allow_redirects=False,
+                            data={'username': username, 'password': password})
+    if response.status_code != 302 or '/login' in response.headers.get('Location', ''):
+        raise RuntimeError(f'Không đăng nhập được tài khoản {username}')
+    return session
+
+
+def fetch_json(session, url, timeout=10):
+    try:
+        response = session.get(url, timeout=timeout)
+        return response.json() if response.status_code == 200 else None
+    except (requests.RequestException, ValueError):
+        return None
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.counts = {'ok': 0, 'rate_limited': 0, 'busy': 0, 'app_error': 0, 'http_error': 0, 'timeout': 0}
+        self.probe_latencies = []
+        self.probe_failures = 0
+
+    def record(self, kind, latency=None):
+        with self.lock:
+            self.counts[kind] += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+
+def run_user(session, args, results, rng):
+    for _ in range(args.requests):
+        if rng.random() < args.repeat_ratio:
+            question = rng.choice(POPULAR_QUESTIONS)
+        else:
+            question = f'Câu hỏi riêng số {rng.randint(1, 10 ** 9)} về thuật toán'
+
+        started = time.perf_counter()
+        try:
+            response = session.post(f'{args.base_url}/api/chat', json={'message': question}, timeout=args.timeout)
+        except requests.Timeout:
+            results.record('timeout')
+            continue
+        except requests.RequestException:
+            results.record('http_error')
+            continue
+        latency = time.perf_counter() - started
+
+        if response.status_code == 429:
+            results.record('rate_limited', latency)
+        elif response.status_code != 200:
+            results.record('http_error', latency)
+        else:
+            data = response.json()
+            if BUSY_MARKER in str(data.get('response', '')):
+                results.record('busy', latency)
+            elif data.get('success') and not str(data.get('response', '')).startswith('Xin lỗi'):
+                results.record('ok', latency)
+            else:
+                results.record('app_error', latency)
+
+        if args.think_time:
+            time.sleep(rng.uniform(0, args.think_time))
+
+
+def run_probe(args, results, stop_event):
+    """Liên tục gọi một trang nhẹ để xem website còn phản hồi khi chatbot bị dồn tải"""
+    session = requests.Session()
+    while not stop_event.is_set():
+        started = time.perf_counter()
+        try:
+            response = session.get(f'{args.base_url}{args.probe_path}', timeout=args.timeout)
+            ok = response.status_code < 500
+        except requests.RequestException:
+            ok = False
+        with results.lock:
+            if ok:
+                results.probe_latencies.append(time.perf_counter() - started)
+            else:
+                results.probe_failures += 1
+        stop_event.wait(args.probe_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark tải chatbot với fake Gemini server')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--users', type=int, default=20, help='Số học sinh mô phỏng (mỗi người một session)')
+    parser.add_argument('--requests', type=int, default=3, help='Số câu hỏi mỗi học sinh gửi')
+    parser.add_argument('--repeat-ratio', type=float, default=0.8, help='Tỉ lệ câu hỏi lặp lại từ danh sách phổ biến')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Thời gian nghỉ ngẫu nhiên tối đa giữa 2 câu (giây)')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--user-prefix', default='bench_student')
+    parser.add_argument('--password', default='bench123')
+    parser.add_argument('--register', action='store_true', help='Tự đăng ký tài khoản học sinh nếu chưa có')
+    parser.add_argument('--teacher', help='USER:PASS của giáo viên để đọc /api/chat/cache_stats')
+    parser.add_argument('--fake-url', help='URL fake Gemini server để đọc số lời gọi upstream')
+    parser.add_argument('--probe-path', default='/login', help='Trang nhẹ dùng để đo mức bão hòa worker')
+    parser.add_argument('--probe-interval', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    args.base_url = args.base_url.rstrip('/')
+
+    teacher_session = None
+    if args.teacher:
+        username, _, password = args.teacher.partition(':')
+        teacher_session = login(args.base_url, username, password)
+    stats_url = f'{args.base_url}/api/chat/cache_stats'
+    fake_before = fetch_json(requests.Session(), f'{args.fake_url}/stats') if args.fake_url else None
+
+    sessions = [login(args.base_url, f'{args.user_prefix}_{i}', args.password, register=args.register)
+                for i in range(args.users)]
+
+    results = Results()
+    stop_event = threading.Event()
+    probe_thread = threading.Thread(target=run_probe, args=(args, results, stop_event), daemon=True)
+    probe_thread.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        futures = [pool.submit(run_user, session, args, results, random.Random(args.seed + i))
+                   for i, session in enumerate(sessions)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+    stop_event.set()
+    probe_thread.join()
+
+    total = sum(results.counts.values())
+    print(f'== /api/chat: {total} request trong {elapsed:.2f}s ({total / elapsed:.1f} req/s)')
+    print('   ' + ', '.join(f'{k}={v}' for k, v in results.counts.items()))
+    print(f'   độ trễ: {format_latency(results.latencies)}')
+    print(f'== Trang thăm dò {args.probe_path}: {len(results.probe_latencies)} ok, {results.probe_failures} lỗi')
+    print(f'   độ trễ: {format_latency(results.probe_latencies)}')
+
+    if teacher_session:
+        stats = fetch_json(teacher_session, stats_url)
+        if stats:
+            cache = stats['stats']
+            print(f"== Cache: hit_rate={cache['hit_rate']} hits={cache['hits']} misses={cache['misses']} "
+                  f"entries={cache['entries']}")
+            print(f"   Limiter: {stats.get('limiter')}  In-flight: {stats.get('inflight')}")
+
+    if args.fake_url:
+        fake_after = fetch_json(requests.Session(), f'{args.fake_url}/stats')
+        if fake_before and fake_after:
+            upstream = fake_after['requests'] - fake_before['requests']
+            print(f"== Model server: {upstream} lời gọi upstream cho {total} câu hỏi, "
+                  f"lỗi={fake_after['errors'] - fake_before['errors']}, max_in_flight={fake_after['max_in_flight']}")
+
+
+if __name__ == '__main__':
+    main()
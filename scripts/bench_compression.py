@@ -0,0 +1,126 @@
+"""
+Đo dung lượng và độ trễ ước tính của phòng chat và trang thi trắc nghiệm khi có/không nén gzip,
+và khi file tĩnh có/không có mã băm trong URL (lưu lâu dài ở trình duyệt).
+Chạy trong tiến trình bằng Flask test client, với dữ liệu trong data/ (chỉ gửi GET).
+
+Độ trễ ước tính theo từng loại mạng = thời gian server + RTT + dung lượng / băng thông
+(bỏ qua TCP slow start):
+- lần đầu: trang + các file tĩnh (mỗi file thêm một RTT, tải song song 2 file một lúc)
+- lần sau, trước đây: file tĩnh không có mã băm (no-cache) phải hỏi lại server, thêm một
+  RTT cho các yêu cầu 304
+- lần sau, bây giờ: file tĩnh có mã băm được lưu immutable, không cần yêu cầu nào
+- thăm dò chat: ETag khớp thì chỉ còn 304 không body
+
+Chạy (từ thư mục gốc của dự án):
+    python scripts/bench_compression.py --repeat 20
+"""
+import argparse
+import json
+import math
+import os
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# (tên, băng thông kbit/s, RTT ms)
+NETWORKS = [('3G chậm', 400, 400), ('3G', 1600, 150), ('4G', 9000, 60)]
+STATIC_PATTERN = re.compile(r'(?:src|href)="(/static/[^"]+)"')
+
+
+def fetch(client, url, repeat, headers=None):
+    """Trả về (response cuối cùng, thời gian server trung vị giây)"""
+    timings = []
+    response = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers or {})
+        response.get_data()
+        timings.append(time.perf_counter() - started)
+        response.close()
+    return response, statistics.median(timings)
+
+
+def transfer_ms(size, kbps, rtt_ms):
+    return rtt_ms + size * 8 / kbps
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark nén gzip và file tĩnh có mã băm')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    from app import app, db  # noqa: E402  (app đọc data/ theo đường dẫn tương đối)
+
+    users = json.load(open('data/users.json', encoding='utf-8'))
+    student = next(user for user in users if user.get('role') == 'student')
+    exams = db.load_exam_bank('10').get('exams', [])
+    messages = db.get_all_chat_messages()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=student['id'], username=student['username'], role='student')
+
+    pages = [('Phòng chat', '/chat'), ('Danh sách đề', '/tracnghiem')]
+    if exams:
+        pages.append(('Làm bài thi', f"/tracnghiem/lam-bai/10/{exams[0]['id']}"))
+    poll_url = f"/api/chat/messages?last_id={messages[-1]['id'] if messages else ''}"
+
+    gzip_headers = {'Accept-Encoding': 'gzip'}
+    print(f'{"trang":<14} | {"thô (B)":>8} | {"gzip (B)":>8} | {"tỉ lệ":>6} | '
+          f'{"server thô (ms)":>15} | {"server gzip (ms)":>16}')
+    results = []
+    for name, url in pages:
+        plain, plain_time = fetch(client, url, args.repeat)
+        compressed, gzip_time = fetch(client, url, args.repeat, gzip_headers)
+        if plain.status_code != 200:
+            print(f'{name:<14} | bỏ qua: HTTP {plain.status_code}')
+            continue
+        plain_size, gzip_size = len(plain.get_data()), len(compressed.get_data())
+        print(f'{name:<14} | {plain_size:>8} | {gzip_size:>8} | {gzip_size / plain_size:>6.1%} | '
+              f'{plain_time * 1000:>15.2f} | {gzip_time * 1000:>16.2f}')
+        results.append((name, plain.get_data(as_text=True), plain_size, gzip_size, plain_time, gzip_time))
+
+    # File tĩnh của trang: thô và bản gzip dựng sẵn
+    static_urls = sorted({url for result in results for url in STATIC_PATTERN.findall(result[1])})
+    static_plain = static_gzip = 0
+    for url in static_urls:
+        plain, _ = fetch(client, url, 1)
+        compressed, _ = fetch(client, url, 1, gzip_headers)
+        static_plain += len(plain.get_data())
+        static_gzip += len(compressed.get_data())
+        print(f'  {url}: {len(plain.get_data())} B -> {len(compressed.get_data())} B, '
+              f'Cache-Control: {compressed.headers.get("Cache-Control")}')
+    static_rounds = math.ceil(len(static_urls) / 2)
+
+    print()
+    print(f'{"trang":<14} | {"mạng":<8} | {"lần đầu trước (ms)":>18} | {"lần đầu nay (ms)":>16} | '
+          f'{"lần sau trước (ms)":>18} | {"lần sau nay (ms)":>16}')
+    for name, _, plain_size, gzip_size, plain_time, gzip_time in results:
+        for network, kbps, rtt in NETWORKS:
+            first_before = (plain_time * 1000 + transfer_ms(plain_size, kbps, rtt)
+                            + static_rounds * rtt + static_plain * 8 / kbps)
+            first_after = (gzip_time * 1000 + transfer_ms(gzip_size, kbps, rtt)
+                           + static_rounds * rtt + static_gzip * 8 / kbps)
+            repeat_before = plain_time * 1000 + transfer_ms(plain_size, kbps, rtt) + static_rounds * rtt
+            repeat_after = gzip_time * 1000 + transfer_ms(gzip_size, kbps, rtt)
+            print(f'{name:<14} | {network:<8} | {first_before:>18.0f} | {first_after:>16.0f} | '
+                  f'{repeat_before:>18.0f} | {repeat_after:>16.0f}')
+
+    # Thăm dò tin nhắn mới của phòng chat (3 giây một lần): không có gì mới thì 304
+    full, full_time = fetch(client, poll_url, args.repeat, gzip_headers)
+    etag = full.headers.get('ETag')
+    revalidated, revalidate_time = fetch(client, poll_url, args.repeat, dict(gzip_headers, **{'If-None-Match': etag or ''}))
+    print()
+    print(f'Thăm dò chat {poll_url}: 200 = {len(full.get_data())} B / {full_time * 1000:.2f} ms, '
+          f'If-None-Match -> {revalidated.status_code} = {len(revalidated.get_data())} B / '
+          f'{revalidate_time * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+So sánh parse_docx_exam (python-docx) với parse_docx_exam_streaming (đọc XML tăng dần):
+- Kiểm tra vi sai: hai parser phải trả về kết quả giống hệt nhau
+- Đo thời gian trên đề sinh ngẫu nhiên với số câu hỏi khác nhau
+
+Chạy:
+    python scripts/bench_exam_parser.py --questions 50,500,2000
+    python scripts/bench_exam_parser.py --files de_thi_1.docx de_thi_2.docx   # so sánh trên file thật
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from docx import Document  # noqa: E402
+
+from utils.exam_parser import ExamParseError, parse_docx_exam, parse_docx_exam_streaming  # noqa: E402
+
+
+def build_exam_docx(path, question_count, allow_multiple=False, seed=0):
+    """Sinh file đề với đủ các cách đánh dấu đáp án mà parser hỗ trợ"""
+    rng = random.Random(seed)
+    document = Document()
+    document.add_paragraph('ĐỀ KIỂM TRA TIN HỌC')
+    table = document.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = 'Câu 999: đoạn trong bảng phải bị bỏ qua'
+
+    for number in range(1, question_count + 1):
+        question = document.add_paragraph(f'Câu {number}: Nội dung câu hỏi số {number} về thuật toán')
+        if rng.random() < 0.2:
+            question.add_run().add_break()
+            question.add_run('dòng tiếp theo\tcó tab')
+        if rng.random() < 0.1:
+            document.add_paragraph('Đoạn mô tả bổ sung cho câu hỏi')
+
+        mode = rng.choice(['underline', 'marker', 'answer_line'])
+        correct = rng.sample('ABCD', 2 if allow_multiple and rng.random() < 0.3 else 1)
+        for letter in 'ABCD':
+            paragraph = document.add_paragraph()
+            letter_run = paragraph.add_run(f'{letter}.')
+            if mode == 'underline' and letter in correct:
+                letter_run.underline = True
+            elif rng.random() < 0.1:
+                letter_run.underline = False
+            text = f' Lựa chọn {letter} với biến snake_case_{number}'
+            if mode == 'marker' and letter in correct:
+                text += rng.choice([' (ĐÚNG)', ' (đáp án đúng)', ' [Đúng]', ' (Correct)'])
+            paragraph.add_run(text)
+        if mode == 'answer_line':
+            for letter in correct:
+                document.add_paragraph(f'Đáp án: {letter}')
+        if rng.random() < 0.5:
+            document.add_paragraph(f'Giải thích: vì lựa chọn {correct[0]} đúng')
+
+    document.save(path)
+
+
+def run_parser(parser, path, allow_multiple):
+    started = time.perf_counter()
+    try:
+        result = parser(path, allow_multiple_answers=allow_multiple)
+    except ExamParseError as exc:
+        result = ('error', str(exc))
+    return result, time.perf_counter() - started
+
+
+def compare(path, allow_multiple, repeat=3):
+    reference, _ = run_parser(parse_docx_exam, path, allow_multiple)
+    streamed, _ = run_parser(parse_docx_exam_streaming, path, allow_multiple)
+    if reference != streamed:
+        raise SystemExit(f'KHÁC NHAU: {path} (allow_multiple={allow_multiple})')
+
+    docx_time = min(run_parser(parse_docx_exam, path, allow_multiple)[1] for _ in range(repeat))
+    stream_time = min(run_parser(parse_docx_exam_streaming, path, allow_multiple)[1] for _ in range(repeat))
+    count = len(reference) if isinstance(reference, list) else reference[1]
+    return count, docx_time, stream_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark và kiểm tra vi sai parser đề thi .docx')
+    parser.add_argument('--questions', default='50,500,2000', help='Số câu hỏi của các đề sinh ngẫu nhiên')
+    parser.add_argument('--files', nargs='*', default=[], help='Các file .docx thật cần so sánh')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seeds', type=int, default=5, help='Số đề ngẫu nhiên nhỏ dùng cho kiểm tra vi sai')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Kiểm tra vi sai trên nhiều đề nhỏ, cả hai chế độ một/nhiều đáp án
+        for seed in range(args.seeds):
+            for allow_multiple in (False, True):
+                path = os.path.join(tmp, f'diff_{seed}_{allow_multiple}.docx')
+                build_exam_docx(path, 30, allow_multiple=allow_multiple, seed=seed)
+                compare(path, allow_multiple, repeat=1)
+        print(f'Kiểm tra vi sai: {args.seeds * 2} đề sinh ngẫu nhiên cho kết quả giống nhau')
+
+        print(f'{"câu hỏi":>8} | {"python-docx (ms)":>16} | {"streaming (ms)":>14} | speedup')
+        for size in [int(s) for s in args.questions.split(',') if s.strip()]:
+            path = os.path.join(tmp, f'bench_{size}.docx')
+            build_exam_docx(path, size, allow_multiple=True, seed=size)
+            count, docx_time, stream_time = compare(path, True, args.repeat)
+            print(f'{size:>8} | {docx_time * 1000:>16.1f} | {stream_time * 1000:>14.1f} | {docx_time / stream_time:.1f}x')
+
+    for file_path in args.files:
+        for allow_multiple in (False, True):
+            result, docx_time, stream_time = compare(file_path, allow_multiple, args.repeat)
+            print(f'{file_path} (allow_multiple={allow_multiple}): giống nhau, {result} câu, '
+                  f'{docx_time * 1000:.1f}ms -> {stream_time * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
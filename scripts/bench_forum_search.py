@@ -0,0 +1,103 @@
+"""
+So sánh tìm kiếm diễn đàn bằng chỉ mục ngược (utils.forum_search) với cách cũ
+quét chuỗi con trên mọi bài viết, trên dữ liệu sinh ngẫu nhiên.
+
+Chạy:
+    python scripts/bench_forum_search.py --posts 1000,10000,100000
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.forum_search import ForumSearchIndex  # noqa: E402
+
+WORDS = ('thuật toán sắp xếp mảng danh sách biến vòng lặp hàm điều kiện chương trình python '
+         'dữ liệu số nguyên chuỗi ký tự tệp mạng máy tính bộ nhớ đệ quy cây đồ thị tìm kiếm '
+         'nhị phân kiểu lệnh in nhập xuất giá trị phần tử chỉ số độ phức tạp thời gian bài tập '
+         'em hỏi cách làm lỗi sai đúng kết quả ví dụ giải thích').split()
+QUERIES = ['thuật toán', 'thuat toan sap xep', '"vòng lặp"', 'đệ quy cây nhị phân', 'python lỗi']
+# Từ vựng theo phân phối Zipf: vài từ rất phổ biến, phần lớn từ hiếm như văn bản thật.
+# Các từ tiếng Việt ở trên nằm rải rác từ hạng 20 tới khoảng 1000.
+VOCABULARY = [f'tu{i}' for i in range(20000)]
+for rank, word in enumerate(WORDS):
+    VOCABULARY[20 + rank * 15] = word
+ZIPF_CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+
+
+def legacy_search(posts, keyword):
+    keyword_lower = keyword.lower()
+    return [p for p in posts if keyword_lower in p['title'].lower() or keyword_lower in p['content'].lower()]
+
+
+def random_text(rng, length):
+    return ' '.join(rng.choices(VOCABULARY, cum_weights=ZIPF_CUM_WEIGHTS, k=length))
+
+
+def build_posts(rng, count):
+    posts = []
+    for i in range(count):
+        posts.append({
+            'id': f'post_{i:06d}',
+            'title': random_text(rng, rng.randint(4, 10)),
+            'content': random_text(rng, rng.randint(30, 120)),
+            'tags': rng.sample(['python', 'thuật toán', 'mạng', 'c++', 'bài tập'], 2),
+            'created_at': f'2025-01-01T00:00:{i:06d}'
+        })
+    return posts
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark tìm kiếm diễn đàn')
+    parser.add_argument('--posts', default='1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        # File giả chỉ dùng để chỉ mục theo dõi thay đổi
+        posts_file = os.path.join(tmp, 'posts.json')
+        comments_file = os.path.join(tmp, 'comments.json')
+        for path in (posts_file, comments_file):
+            open(path, 'w').close()
+
+        print(f'{"bài viết":>9} | {"dựng (s)":>8} | {"truy vấn":<20} | {"cũ (ms)":>8} | '
+              f'{"chỉ mục (ms)":>12} | {"trang 2 (ms)":>12} | kết quả')
+        for size in [int(s) for s in args.posts.split(',') if s.strip()]:
+            posts = build_posts(rng, size)
+            index = ForumSearchIndex(posts_file, comments_file, lambda: posts, lambda: [])
+            started = time.perf_counter()
+            index.search('khởi động')
+            build_time = time.perf_counter() - started
+
+            for query in QUERIES:
+                _, legacy_time = timed(lambda: legacy_search(posts, query), args.repeat)
+
+                def cold_search():
+                    # Bỏ kết quả đã xếp hạng để đo lần tìm kiếm đầu tiên
+                    index._ranked_cache.clear()
+                    return index.search(query, page=1, per_page=20)
+                result, index_time = timed(cold_search, args.repeat)
+                _, next_page_time = timed(lambda: index.search(query, page=2, per_page=20), args.repeat)
+                print(f'{size:>9} | {build_time:>8.2f} | {query:<20} | {legacy_time * 1000:>8.2f} | '
+                      f'{index_time * 1000:>12.3f} | {next_page_time * 1000:>12.3f} | {result["total"]}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Microbenchmark: bộ lọc Markdown một lần quét (utils.markdown_stripper)
+so với cách cũ chạy 8 lần re.sub liên tiếp.
+
+Chạy:
+    python scripts/bench_markdown.py --sizes 2000,20000,200000 --repeat 20
+"""
+import argparse
+import re
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.markdown_stripper import MarkdownStripper, strip_markdown  # noqa: E402
+
+
+def legacy_remove_markdown_formatting(text):
+    """Bản cũ của utils.gemini_api.remove_markdown_formatting (để so sánh)"""
+    text = re.sub(r'#+\s*', '', text)
+    text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)
+    text = re.sub(r'\*(.+?)\*', r'\1', text)
+    text = re.sub(r'__(.+?)__', r'\1', text)
+    text = re.sub(r'_(.+?)_', r'\1', text)
+    text = re.sub(r'```[\w]*\n?', '', text)
+    text = re.sub(r'```', '', text)
+    text = re.sub(r'`(.+?)`', r'\1', text)
+    return text.strip()
+
+
+SAMPLE_BLOCK = (
+    '## Sắp xếp nổi bọt\n'
+    'Thuật toán **bubble sort** so sánh từng cặp phần tử kề nhau, độ phức tạp *O(n^2)*.\n'
+    'Biến `so_luong` và hàm tinh_tong_mang được đặt theo kiểu snake_case.\n'
+    'Các bước thực hiện như sau, hãy đọc kỹ trước khi làm bài tập về nhà nhé.\n'
+    '```python\n'
+    'def sap_xep_noi_bot(a):\n'
+    '    for i in range(len(a)):\n'
+    '        for j in range(len(a) - i - 1):\n'
+    '            if a[j] > a[j + 1]:\n'
+    '                a[j], a[j + 1] = a[j + 1], a[j]\n'
+    '```\n'
+    '__Lưu ý__: _không_ dùng bubble sort cho mảng lớn, hãy dùng quick sort hoặc merge sort.\n\n'
+)
+
+
+def build_reply(size):
+    repeats = size // len(SAMPLE_BLOCK) + 1
+    return (SAMPLE_BLOCK * repeats)[:size]
+
+
+def stream_strip(text, chunk_size=40):
+    stripper = MarkdownStripper()
+    parts = [stripper.feed(text[i:i + chunk_size]) for i in range(0, len(text), chunk_size)]
+    parts.append(stripper.flush())
+    return ''.join(parts).strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='So sánh tốc độ bộ lọc Markdown')
+    parser.add_argument('--sizes', default='2000,20000,200000', help='Độ dài câu trả lời (ký tự)')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"size":>8} | {"legacy (ms)":>12} | {"single-pass (ms)":>16} | {"stream (ms)":>11} | speedup')
+    for size in [int(s) for s in args.sizes.split(',') if s.strip()]:
+        text = build_reply(size)
+        assert stream_strip(text) == strip_markdown(text), 'Kết quả stream khác kết quả xử lý cả đoạn'
+
+        legacy = min(timeit.repeat(lambda: legacy_remove_markdown_formatting(text), number=1, repeat=args.repeat))
+        single = min(timeit.repeat(lambda: strip_markdown(text), number=1, repeat=args.repeat))
+        stream = min(timeit.repeat(lambda: stream_strip(text), number=1, repeat=args.repeat))
+        print(f'{size:>8} | {legacy * 1000:>12.3f} | {single * 1000:>16.3f} | {stream * 1000:>11.3f} | '
+              f'{legacy / single:.1f}x')
+
+    sample = 'Biến so_luong_hoc_sinh và `tinh_tong` trong **Python**'
+    print('\nVí dụ snake_case:')
+    print(f'  legacy      : {legacy_remove_markdown_formatting(sample)}')
+    print(f'  single-pass : {strip_markdown(sample)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Đo tốc độ và độ chính xác của chỉ mục câu hỏi gần trùng (utils.question_dedup)
+trên ngân hàng đề sinh ngẫu nhiên, so với cách quét từng cặp.
+
+Chạy:
+    python scripts/bench_question_dedup.py --bank 100000 --queries 50
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.question_dedup import QuestionDedupIndex, question_shingles  # noqa: E402
+
+WORDS = ('thuật toán sắp xếp mảng danh sách biến vòng lặp hàm điều kiện chương trình python '
+         'dữ liệu số nguyên chuỗi ký tự tệp mạng máy tính bộ nhớ đệ quy cây đồ thị tìm kiếm '
+         'nhị phân kiểu lệnh in nhập xuất giá trị phần tử chỉ số độ phức tạp thời gian').split()
+
+
+def random_question(rng, number):
+    question = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 18)))
+    options = {letter: ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))) for letter in 'ABCD'}
+    return {'number': number, 'question': f'{question} {number}?', 'options': options, 'correct_answer': 'A'}
+
+
+def reword(rng, question):
+    """Sửa nhẹ câu hỏi: bỏ dấu một phần, đổi hoa thường, thay một từ"""
+    words = question['question'].split()
+    words[rng.randrange(len(words) - 1)] = rng.choice(WORDS)
+    text = ' '.join(words)
+    if rng.random() < 0.5:
+        text = text.upper()
+    return dict(question, question=text)
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark chỉ mục MinHash/LSH câu hỏi gần trùng')
+    parser.add_argument('--bank', type=int, default=20000, help='Số câu hỏi trong ngân hàng')
+    parser.add_argument('--queries', type=int, default=50, help='Số câu của đề mới (một nửa là câu sửa nhẹ)')
+    parser.add_argument('--exam-size', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bank = [random_question(rng, i) for i in range(1, args.bank + 1)]
+    exams = [{'id': f'exam_{i}', 'title': f'Đề {i}', 'questions': bank[i:i + args.exam_size]}
+             for i in range(0, len(bank), args.exam_size)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bank_path = os.path.join(tmp, 'lop10.json')
+        with open(bank_path, 'w', encoding='utf-8') as f:
+            json.dump({'exams': exams}, f, ensure_ascii=False)
+
+        def load_bank(grade):
+            with open(bank_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        index = QuestionDedupIndex(os.path.join(tmp, 'index.jsonl'), load_bank, lambda grade: bank_path,
+                                   grades=['10'])
+        started = time.perf_counter()
+        index.rebuild()
+        print(f'Dựng chỉ mục {args.bank} câu: {time.perf_counter() - started:.1f}s')
+
+        started = time.perf_counter()
+        index = QuestionDedupIndex(index.index_file, load_bank, lambda grade: bank_path, grades=['10'])
+        index.stats()
+        print(f'Nạp chỉ mục từ file: {time.perf_counter() - started:.2f}s')
+
+        reworded = [reword(rng, q) for q in rng.sample(bank, args.queries // 2)]
+        fresh = [random_question(rng, args.bank + i) for i in range(args.queries - len(reworded))]
+        queries = reworded + fresh
+
+        started = time.perf_counter()
+        flagged = index.find_duplicates(queries)
+        lsh_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        bank_shingles = [question_shingles(q) for q in bank]
+        truth = set()
+        for idx, query in enumerate(queries, start=1):
+            shingles = question_shingles(query)
+            if any(jaccard(shingles, other) >= index.threshold for other in bank_shingles):
+                truth.add(query['number'])
+        brute_time = time.perf_counter() - started
+
+        found = {item['number'] for item in flagged}
+        print(f'Đề mới {len(queries)} câu: LSH {lsh_time * 1000:.1f}ms, quét từng cặp {brute_time * 1000:.0f}ms')
+        print(f'Gần trùng thật (Jaccard >= {index.threshold}): {len(truth)}, LSH tìm thấy {len(found & truth)}, '
+              f'báo nhầm {len(found - truth)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Đo tốc độ tìm kiếm chung (utils.site_search) trên dữ liệu sinh ngẫu nhiên:
+dựng chỉ mục, nạp lại từ file, truy vấn có/không lọc, gợi ý tự động và cập nhật một bản ghi.
+Mỗi tài liệu diễn đàn/tài liệu có 2-3 trường được đánh chỉ mục (tiêu đề, thẻ, nội dung).
+
+Chạy:
+    python scripts/bench_site_search.py --fields 100000,1000000
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.site_search import SearchSource, SiteSearchIndex, document_entries, post_entries  # noqa: E402
+
+WORDS = ('thuật toán sắp xếp mảng danh sách biến vòng lặp hàm điều kiện chương trình python '
+         'dữ liệu số nguyên chuỗi ký tự tệp mạng máy tính bộ nhớ đệ quy cây đồ thị tìm kiếm '
+         'nhị phân kiểu lệnh in nhập xuất giá trị phần tử chỉ số độ phức tạp thời gian bài tập').split()
+QUERIES = ['thuật toán', 'thuat toan sap xep', '"vòng lặp"', 'đệ quy cây nhị phân', 'python lỗi']
+PREFIXES = ['th', 'thuat to', 'de q', 'p']
+# Từ vựng theo phân phối Zipf như văn bản thật, các từ tiếng Việt ở hạng 20 tới khoảng 1000
+VOCABULARY = [f'tu{i}' for i in range(20000)]
+for rank, word in enumerate(WORDS):
+    VOCABULARY[20 + rank * 15] = word
+ZIPF_CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+TAGS = ['python', 'thuật toán', 'mạng', 'c++', 'bài tập']
+
+
+def random_text(rng, length):
+    return ' '.join(rng.choices(VOCABULARY, cum_weights=ZIPF_CUM_WEIGHTS, k=length))
+
+
+def build_data(rng, fields):
+    """Một nửa số trường là bài viết (3 trường), nửa còn lại là tài liệu (2 trường)"""
+    posts = [{
+        'id': f'post_{i}',
+        'title': random_text(rng, rng.randint(4, 10)),
+        'content': random_text(rng, rng.randint(20, 60)),
+        'tags': rng.sample(TAGS, 2),
+        'created_at': f'2025-01-01T{i:09d}'
+    } for i in range(fields // 6)]
+    documents = [{
+        'id': f'doc_{i}',
+        'title': random_text(rng, rng.randint(4, 10)),
+        'description': random_text(rng, rng.randint(10, 30)),
+        'url': f'https://example.com/{i}',
+        'grade': rng.choice(['10', '11', '12']),
+        'doc_type': rng.choice(['document', 'lecture', 'exam']),
+        'created_at': f'2025-01-01T{i:09d}'
+    } for i in range(fields // 4)]
+    return posts, documents
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark tìm kiếm chung')
+    parser.add_argument('--fields', default='100000', help='Tổng số trường được đánh chỉ mục, ví dụ 100000,1000000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for size in [int(s) for s in args.fields.split(',') if s.strip()]:
+        posts, documents = build_data(rng, size)
+        with tempfile.TemporaryDirectory() as tmp:
+            # File giả chỉ dùng để chỉ mục theo dõi thay đổi
+            posts_file = os.path.join(tmp, 'posts.json')
+            documents_file = os.path.join(tmp, 'documents.json')
+            for path in (posts_file, documents_file):
+                open(path, 'w').close()
+            sources = [SearchSource(posts_file, lambda: posts, post_entries),
+                       SearchSource(documents_file, lambda: documents, document_entries)]
+            index_file = os.path.join(tmp, 'site_index.pickle')
+
+            index = SiteSearchIndex(index_file, sources)
+            started = time.perf_counter()
+            stats = index.rebuild()
+            build_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            index = SiteSearchIndex(index_file, sources)
+            index.search('khởi động')
+            load_time = time.perf_counter() - started
+            print(f'\n{size} trường ({stats["documents"]} mục, {stats["terms"]} từ): '
+                  f'dựng {build_time:.1f}s, nạp lại từ file {load_time:.1f}s')
+
+            print(f'{"truy vấn":<22} | {"lần đầu (ms)":>12} | {"lặp lại (ms)":>12} | {"lọc lớp 10 (ms)":>15} | kết quả')
+            for query in QUERIES:
+                def cold_search():
+                    # Bỏ kết quả đã xếp hạng để đo lần tìm kiếm đầu tiên
+                    index._ranked_cache.clear()
+                    return index.search(query)
+                result, cold_time = timed(cold_search, args.repeat)
+                _, warm_time = timed(lambda: index.search(query, page=2), args.repeat)
+                _, filtered_time = timed(lambda: index.search(query, filters={'type': 'document', 'grade': '10'}),
+                                         args.repeat)
+                print(f'{query:<22} | {cold_time * 1000:>12.2f} | {warm_time * 1000:>12.2f} | '
+                      f'{filtered_time * 1000:>15.2f} | {result["total"]}')
+
+            for prefix in PREFIXES:
+                index.trie.root.top = None
+                suggestions, suggest_time = timed(lambda: index.suggest(prefix), args.repeat)
+                print(f'gợi ý "{prefix}": {suggest_time * 1000:.2f}ms -> {[s["text"] for s in suggestions[:3]]}')
+
+            # Sửa một bài viết: chỉ bài đó được tách từ lại ở lần tìm kiếm kế tiếp
+            posts[0] = dict(posts[0], title='bài viết vừa sửa zzzvuasua')
+            with open(posts_file, 'w') as f:
+                f.write('x')
+            index.file_saved(posts_file, posts)
+            started = time.perf_counter()
+            result = index.search('zzzvuasua')
+            print(f'Tìm kiếm ngay sau khi sửa một bài viết: {(time.perf_counter() - started) * 1000:.0f}ms '
+                  f'(so sánh {len(posts)} bản ghi), kết quả {result["total"]}')
+
+
+if __name__ == '__main__':
+    main()
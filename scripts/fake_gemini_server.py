@@ -0,0 +1,257 @@
+"""
+Server giả lập Gemini để kiểm thử tải chatbot mà không cần mạng/API key.
+
+Chạy:
+    python scripts/fake_gemini_server.py --port 8765 --latency lognormal:0.8,0.5 --error-rate 0.02
+Sau đó khởi động website với:
+    GEMINI_BACKEND=http GEMINI_BACKEND_URL=http://127.0.0.1:8765 python app.py
+
+Endpoint (tương thích utils.model_backends.HttpModelBackend):
+    POST /generate  {"prompt": "..."}  -> {"text": "..."}
+    POST /stream    {"prompt": "..."}  -> văn bản trả về theo từng chunk (chunked)
+    POST /chat      {"message", "history": [{"role", "content"}], "system_instruction", "temperature"}
+                                       -> {"text": "..."}; tin nhắn không có từ khóa thì lấy chủ đề
+                                          từ các lượt hỏi trước trong history
+    GET  /stats                        -> số request, lỗi, số request đang xử lý
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.text_utils import fold_diacritics  # noqa: E402
+
+DEFAULT_ANSWERS = {
+    'bubble': (
+        '## Sắp xếp nổi bọt\n'
+        'Thuật toán **bubble sort** so sánh từng cặp phần tử kề nhau và đổi chỗ nếu sai thứ tự.\n'
+        'Độ phức tạp trong trường hợp xấu nhất là *O(n^2)*, tốt nhất là O(n) khi mảng đã sắp xếp.\n'
+        '```python\nfor i in range(n):\n    for j in range(n - i - 1):\n        if a[j] > a[j + 1]:\n'
+        '            a[j], a[j + 1] = a[j + 1], a[j]\n```\n'
+    ),
+    'quick': (
+        'Quick sort chọn một phần tử làm **chốt** (pivot), chia mảng thành hai phần rồi sắp xếp đệ quy.\n'
+        'Độ phức tạp trung bình O(n log n), xấu nhất O(n^2).'
+    ),
+    'bien': (
+        'Trong Python, biến được tạo khi gán giá trị, ví dụ `so_luong = 10`.\n'
+        'Tên biến nên đặt theo kiểu snake_case như `diem_trung_binh`.'
+    ),
+    'vong lap': (
+        '### Vòng lặp\n'
+        '- `for` dùng khi biết trước số lần lặp\n'
+        '- `while` dùng khi lặp theo điều kiện\n'
+    )
+}
+FALLBACK_ANSWER = (
+    'Đây là câu trả lời giả lập từ **fake Gemini server**. '
+    'Câu hỏi của bạn đã được ghi nhận để phục vụ kiểm thử tải.'
+)
+
+
+def parse_latency(spec):
+    """
+    Phân tích cấu hình độ trễ (giây):
+    fixed:0.5 | uniform:0.2,1.5 | normal:0.8,0.2 | lognormal:0.8,0.5 (trung vị, sigma)
+    """
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v.strip()] if params else []
+    kind = kind.strip().lower()
+
+    if kind == 'fixed':
+        value = values[0] if values else 0.5
+        return lambda: value
+    if kind == 'uniform':
+        low, high = (values + [0.2, 1.5][len(values):])[:2]
+        return lambda: random.uniform(low, high)
+    if kind == 'normal':
+        mean, stddev = (values + [0.8, 0.2][len(values):])[:2]
+        return lambda: max(0.0, random.gauss(mean, stddev))
+    if kind == 'lognormal':
+        median, sigma = (values + [0.8, 0.5][len(values):])[:2]
+        mu = math.log(max(median, 1e-6))
+        return lambda: random.lognormvariate(mu, sigma)
+    raise ValueError(f'Kiểu độ trễ không hỗ trợ: {spec}')
+
+
+class FakeModel:
+    def __init__(self, answers, latency, error_rate, error_status, chunk_size, chunk_delay):
+        self.answers = {fold_diacritics(k): v for k, v in answers.items()}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'in_flight': 0, 'max_in_flight': 0,
+                      'chat_requests': 0, 'history_messages': 0, 'with_system_instruction': 0}
+
+    def _match(self, text):
+        question = fold_diacritics(text)
+        for keyword, answer in self.answers.items():
+            if keyword in question:
+                return answer
+        return None
+
+    def answer_for(self, prompt):
+        # Chỉ xét phần câu hỏi, bỏ qua system prompt phía trước
+        return self._match(prompt.rsplit('Câu hỏi của học sinh:', 1)[-1]) or FALLBACK_ANSWER
+
+    def chat_answer(self, message, history, system_instruction):
+        """Trả lời tin nhắn trong hội thoại: câu hỏi nối tiếp ("còn cách khác?") dùng chủ đề của lượt trước"""
+        with self._lock:
+            self.stats['chat_requests'] += 1
+            self.stats['history_messages'] += len(history)
+            self.stats['with_system_instruction'] += 1 if system_instruction else 0
+        turns = [message] + [msg['content'] for msg in reversed(history) if msg['role'] == 'user']
+        for text in turns:
+            answer = self._match(text)
+            if answer:
+                return answer
+        return FALLBACK_ANSWER
+
+    def begin(self):
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['in_flight'] += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+
+    def end(self, failed=False):
+        with self._lock:
+            self.stats['in_flight'] -= 1
+            if failed:
+                self.stats['errors'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+
+def make_handler(model):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_payload(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            return payload if isinstance(payload, dict) else {}
+
+        @staticmethod
+        def _valid_chat(payload):
+            history = payload.get('history', [])
+            return (isinstance(payload.get('message', ''), str)
+                    and isinstance(payload.get('system_instruction', ''), str)
+                    and isinstance(history, list)
+                    and all(isinstance(msg, dict) and isinstance(msg.get('role'), str)
+                            and isinstance(msg.get('content'), str) for msg in history))
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._send_json(200, model.snapshot())
+            else:
+                self._send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path not in ('/generate', '/stream', '/chat'):
+                self._send_json(404, {'error': 'not found'})
+                return
+
+            payload = self._read_payload()
+            if self.path == '/chat' and not self._valid_chat(payload):
+                self._send_json(400, {'error': 'message/history/system_instruction không hợp lệ'})
+                return
+            model.begin()
+            failed = False
+            try:
+                time.sleep(model.latency())
+                if model.should_fail():
+                    failed = True
+                    self._send_json(model.error_status, {'error': 'Lỗi giả lập từ fake server'})
+                    return
+
+                if self.path == '/chat':
+                    text = model.chat_answer(payload.get('message', ''), payload.get('history', []),
+                                             payload.get('system_instruction', ''))
+                else:
+                    text = model.answer_for(payload.get('prompt', ''))
+                if self.path in ('/generate', '/chat'):
+                    self._send_json(200, {'text': text})
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; charset=utf-8')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for start in range(0, len(text), model.chunk_size):
+                    data = text[start:start + model.chunk_size].encode('utf-8')
+                    self.wfile.write(f'{len(data):X}\r\n'.encode('ascii') + data + b'\r\n')
+                    self.wfile.flush()
+                    time.sleep(model.chunk_delay)
+                self.wfile.write(b'0\r\n\r\n')
+            except (BrokenPipeError, ConnectionResetError):
+                failed = True
+            finally:
+                model.end(failed)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Server giả lập Gemini cho kiểm thử tải offline')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='lognormal:0.8,0.5',
+                        help='fixed:S | uniform:MIN,MAX | normal:MEAN,STD | lognormal:MEDIAN,SIGMA')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Tỉ lệ request trả lỗi (0..1)')
+    parser.add_argument('--error-status', type=int, default=500, help='Mã HTTP khi trả lỗi (500, 429, 503...)')
+    parser.add_argument('--answers', help='File JSON {"từ khóa": "câu trả lời"} thay cho câu trả lời mặc định')
+    parser.add_argument('--chunk-size', type=int, default=40, help='Số ký tự mỗi chunk khi stream')
+    parser.add_argument('--chunk-delay', type=float, default=0.05, help='Độ trễ giữa các chunk (giây)')
+    parser.add_argument('--seed', type=int, help='Seed ngẫu nhiên để lặp lại kết quả')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    answers = DEFAULT_ANSWERS
+    if args.answers:
+        with open(args.answers, 'r', encoding='utf-8') as f:
+            answers = json.load(f)
+
+    model = FakeModel(answers, parse_latency(args.latency), args.error_rate,
+                      args.error_status, max(1, args.chunk_size), args.chunk_delay)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(model))
+    server.daemon_threads = True
+    print(f'Fake Gemini server đang chạy tại http://{args.host}:{args.port} (latency={args.latency}, '
+          f'error_rate={args.error_rate})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
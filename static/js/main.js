@@ -1,31 +1,84 @@
 // Main JavaScript
 
-// Đánh dấu bài học đã hoàn thành
-function markLessonComplete(courseId, lessonId) {
-    fetch('/update_progress', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({
+// Hàng đợi cập nhật tiến độ: gom các lần đánh dấu trong PROGRESS_FLUSH_DELAY ms rồi gửi
+// một request /api/progress/batch; khi rời trang thì gửi nốt bằng sendBeacon
+const PROGRESS_FLUSH_DELAY = 800;
+const progressQueue = {
+    updates: new Map(),
+    timer: null,
+
+    add(courseId, lessonId, completed = true) {
+        // Cùng một bài học chỉ giữ lần đánh dấu cuối
+        this.updates.set(`${courseId}|${lessonId}`, {
             course_id: courseId,
             lesson_id: lessonId,
-            completed: true
+            completed: completed
+        });
+        clearTimeout(this.timer);
+        this.timer = setTimeout(() => this.flush(), PROGRESS_FLUSH_DELAY);
+    },
+
+    take() {
+        clearTimeout(this.timer);
+        this.timer = null;
+        const updates = Array.from(this.updates.values());
+        this.updates.clear();
+        return updates;
+    },
+
+    flush() {
+        const updates = this.take();
+        if (updates.length === 0) {
+            return Promise.resolve();
+        }
+        return fetch('/api/progress/batch', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({updates: updates})
         })
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            // Cập nhật UI
-            const lessonEl = document.getElementById(`lesson-${lessonId}`);
-            if (lessonEl) {
-                lessonEl.classList.add('completed');
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                console.error('Lỗi cập nhật tiến độ:', data.message);
             }
-            alert('Đã đánh dấu hoàn thành!');
-            location.reload();
+        })
+        .catch(error => {
+            // Gửi lỗi (mất mạng): đưa lại vào hàng đợi, trừ các bài đã được đánh dấu lại sau đó
+            updates.forEach(update => {
+                const key = `${update.course_id}|${update.lesson_id}`;
+                if (!this.updates.has(key)) {
+                    this.updates.set(key, update);
+                }
+            });
+            console.error('Error:', error);
+        });
+    },
+
+    flushOnExit() {
+        const updates = this.take();
+        if (updates.length > 0) {
+            const body = new Blob([JSON.stringify({updates: updates})], {type: 'application/json'});
+            navigator.sendBeacon('/api/progress/batch', body);
         }
-    })
-    .catch(error => console.error('Error:', error));
+    }
+};
+
+window.addEventListener('pagehide', () => progressQueue.flushOnExit());
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') {
+        progressQueue.flushOnExit();
+    }
+});
+
+// Đánh dấu bài học đã hoàn thành
+function markLessonComplete(courseId, lessonId) {
+    progressQueue.add(courseId, lessonId, true);
+    const lessonEl = document.getElementById(`lesson-${lessonId}`);
+    if (lessonEl) {
+        lessonEl.classList.add('completed');
+    }
 }
 
 // Tạo khóa học mới (giáo viên)
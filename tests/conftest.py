@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Thư mục làm việc tạm có data/ rỗng: Database và utils.auth đọc/ghi theo đường dẫn tương đối"""
+    (tmp_path / 'data' / 'lessons').mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
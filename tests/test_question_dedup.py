@@ -0,0 +1,54 @@
+import json
+import os
+
+from utils.question_dedup import QuestionDedupIndex
+
+
+def _exam(exam_id, start, count=5):
+    return {'id': exam_id, 'title': f'Đề {exam_id}', 'questions': [
+        {'number': i, 'question': f'Câu {n}: giá trị của biến x sau vòng lặp thứ {n} là bao nhiêu',
+         'options': {'A': f'{n}', 'B': f'{n + 1}', 'C': 'lỗi', 'D': 'không in'}}
+        for i, n in enumerate(range(start, start + count), start=1)]}
+
+
+def _write(path, exams):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'exams': exams}, f, ensure_ascii=False)
+    # Đảm bảo mtime đổi cả trên hệ thống file có độ phân giải thấp
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_external_edit_updates_index_from_diff(tmp_path):
+    bank_path = str(tmp_path / 'lop10.json')
+    exams = [_exam('a', 0), _exam('b', 100)]
+    _write(bank_path, exams)
+
+    def load_bank(grade):
+        with open(bank_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def make_index():
+        return QuestionDedupIndex(str(tmp_path / 'index.jsonl'), load_bank, lambda grade: bank_path, grades=['10'])
+
+    index = make_index()
+    assert index.stats()['questions'] == 10
+
+    # Sửa ngoài ứng dụng: bỏ đề 'a', thêm đề 'c'; chỉ các câu mới phải tính MinHash
+    exams = [exams[1], _exam('c', 200, count=3)]
+    _write(bank_path, exams)
+    signed = []
+    original = index.hasher.signature
+    index.hasher.signature = lambda shingles: signed.append(1) or original(shingles)
+    assert index.stats()['questions'] == 8
+    assert len(signed) == 3
+
+    matches = index.find_duplicates([exams[1]['questions'][0], _exam('a', 0)['questions'][0]])
+    assert [item['matches'][0]['exam_id'] for item in matches] == ['c']
+
+    # Tiến trình khác nạp file chỉ mục (gồm dòng thay đổi) mà không phải dựng lại
+    signed.clear()
+    other = make_index()
+    other.hasher.signature = lambda shingles: signed.append(1) or original(shingles)
+    assert other.stats()['questions'] == 8
+    assert not signed
@@ -0,0 +1,31 @@
+import pytest
+
+from utils.text_utils import normalize_question
+
+
+@pytest.mark.parametrize('first, second', [
+    ('2 > 3 đúng không', '2 < 3 đúng không'),
+    ('hệ cơ số là gì', 'hệ số là gì'),
+    ('x % 2 bằng bao nhiêu', 'x / 2 bằng bao nhiêu'),
+    ('1.5 + 2 bằng mấy', '1 5 2 bằng mấy'),
+    ('a != b nghĩa là gì', 'a == b nghĩa là gì'),
+    ('Mảng có phải là kiểu dữ liệu không', 'Mảng có phải là kiểu dữ liệu'),
+    ('chứng minh thuật toán đúng', 'thuật toán đúng'),
+    ('hồi quy tuyến tính', 'tuyến tính'),
+    ('toán rời rạc', 'toán'),
+    ('bản ghi là gì', 'ghi là gì'),
+    ('nút lá trong cây', 'nút trong cây'),
+    ('tối ưu thuật toán', 'thuật toán'),
+])
+def test_different_questions_get_different_keys(first, second):
+    assert normalize_question(first) != normalize_question(second)
+
+
+@pytest.mark.parametrize('first, second', [
+    ('Thuật toán sắp xếp là gì?', 'thuat toan sap xep la gi'),
+    ('Giúp em   vòng lặp FOR với', 'vòng lặp for'),
+    ('c++ khác c# thế nào', 'C++ khác C# thế nào?'),
+    ('1.5 + 2 = ?', '1.5+2='),
+])
+def test_same_question_gets_same_key(first, second):
+    assert normalize_question(first) == normalize_question(second)
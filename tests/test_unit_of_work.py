@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from utils.database import Database
+from utils.unit_of_work import MergeConflict, UnitOfWork, merge_records
+
+
+def _post(author):
+    return {'title': f'Bài của {author}', 'content': 'Nội dung', 'author_id': author, 'author_name': author}
+
+
+def test_overlapping_creates_keep_both_posts(data_dir):
+    db = Database()
+    current = {}
+    db.unit_of_work_provider = lambda: current.get('unit_of_work')
+
+    # Hai request cùng đọc forum_posts.json rồi mới lần lượt ghi
+    first, second = UnitOfWork(), UnitOfWork()
+    current['unit_of_work'] = first
+    first_id = db.create_forum_post(_post('A'))
+    current['unit_of_work'] = second
+    second_id = db.create_forum_post(_post('B'))
+
+    db.commit_unit_of_work(first)
+    db.commit_unit_of_work(second)
+    current.clear()
+
+    assert first_id != second_id
+    with open(db.forum_posts_file, encoding='utf-8') as f:
+        posts = json.load(f)
+    assert sorted(post['id'] for post in posts) == sorted([first_id, second_id])
+    assert sorted(post['author_id'] for post in posts) == ['A', 'B']
+
+
+def test_merge_keeps_their_edits_and_our_additions():
+    base = [{'id': 1, 'score': None}, {'id': 2, 'score': None}]
+    theirs = [{'id': 1, 'score': 8}, {'id': 2, 'score': None}]
+    ours = [{'id': 1, 'score': None}, {'id': 2, 'score': None}, {'id': 3, 'score': None}]
+    assert merge_records(base, ours, theirs) == [{'id': 1, 'score': 8}, {'id': 2, 'score': None},
+                                                  {'id': 3, 'score': None}]
+
+
+def test_merge_rejects_same_new_key_from_both_sides():
+    base = [{'id': 'post_0001'}]
+    theirs = base + [{'id': 'post_0002', 'title': 'A'}]
+    ours = base + [{'id': 'post_0002', 'title': 'B'}]
+    with pytest.raises(MergeConflict):
+        merge_records(base, ours, theirs)
@@ -3,19 +3,38 @@ import json
 import os
 from datetime import datetime
 
+from utils.file_lock import atomic_write_json, file_locks
+from utils.id_sequence import max_id_number, next_id_number
+
 USERS_FILE = 'data/users.json'
 
-def load_users():
-    """Load users từ file JSON"""
-    if not os.path.exists(USERS_FILE):
+# Hàm trả về UnitOfWork của request hiện tại (app.py gán), None -> đọc/ghi file trực tiếp
+unit_of_work_provider = None
+
+def _unit_of_work():
+    return unit_of_work_provider() if unit_of_work_provider else None
+
+def _read_users(filename=USERS_FILE):
+    if not os.path.exists(filename):
         return []
-    with open(USERS_FILE, 'r', encoding='utf-8') as f:
+    with open(filename, 'r', encoding='utf-8') as f:
         return json.load(f)
 
+def load_users():
+    """Load users từ file JSON (mỗi request chỉ đọc một lần)"""
+    unit_of_work = _unit_of_work()
+    if unit_of_work is not None:
+        return unit_of_work.load(USERS_FILE, _read_users)
+    return _read_users()
+
 def save_users(users):
-    """Lưu users vào file JSON"""
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users, f, ensure_ascii=False, indent=2)
+    """Lưu users vào file JSON (trong request: ghi ở cuối request)"""
+    unit_of_work = _unit_of_work()
+    if unit_of_work is not None:
+        unit_of_work.save(USERS_FILE, users)
+        return
+    with file_locks.hold(USERS_FILE):
+        atomic_write_json(USERS_FILE, users)
 
 def register_user(username, password, email, role='student'):
     """
@@ -33,7 +52,9 @@ def register_user(username, password, email, role='student'):
         return {'success': False, 'message': 'Email đã được sử dụng'}
     
     # Tạo user mới
-    user_id = str(len(users) + 1)
+    # Cấp id dưới khóa dùng chung, không theo len(users): hai lần đăng ký cùng lúc không trùng id
+    user_id = str(next_id_number(os.path.basename(USERS_FILE),
+                                 lambda: max_id_number(u.get('id') for u in _read_users())))
     new_user = {
         'id': user_id,
         'username': username,
@@ -81,6 +102,11 @@ def get_user_by_id(user_id):
     users = load_users()
     return next((u for u in users if u['id'] == user_id), None)
 
+def get_users_by_ids(user_ids):
+    """Lấy nhiều user trong một lượt đọc users.json: {user_id: user}, id không tồn tại thì bỏ qua"""
+    wanted = set(user_ids)
+    return {u['id']: u for u in load_users() if u['id'] in wanted}
+
 def create_teacher_account(username, password, email):
     """Tạo tài khoản giáo viên (admin dùng)"""
     return register_user(username, password, email, role='teacher')
\ No newline at end of file
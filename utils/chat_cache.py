@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from utils.file_lock import file_locks
+from utils.search_index import file_signature
+from utils.text_utils import normalize_question
+
+# Tăng khi đổi cách chuẩn hóa câu hỏi: các mục lưu theo khóa cũ bị bỏ khi nạp
+KEY_VERSION = 3
+
+
+class ChatResponseCache:
+    """
+    Cache câu trả lời của chatbot theo câu hỏi đã chuẩn hóa.
+    - Loại bỏ theo LRU khi vượt quá max_entries
+    - Mỗi mục hết hạn sau ttl_seconds
+    - Lưu xuống đĩa để giữ lại sau khi khởi động lại
+    - Dùng chung giữa các worker: file đổi (worker khác vừa lưu) thì nạp thêm các mục mới trước
+      khi tra cứu; lưu thì gộp với file hiện tại dưới khóa file thay vì ghi đè
+    """
+
+    def __init__(self, cache_file: str, max_entries: int = 1000, ttl_seconds: int = 7 * 24 * 3600):
+        self.cache_file = cache_file
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._signature = None
+        self._load()
+
+    @staticmethod
+    def make_key(question: str) -> str:
+        return normalize_question(question)
+
+    def _load(self):
+        """Nạp/gộp các mục trong file vào bộ nhớ: mục nào trong file mới hơn thì thay"""
+        self._signature = file_signature(self.cache_file)
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return
+
+        now = time.time()
+        # File lưu theo thứ tự từ cũ đến mới (theo lần dùng gần nhất)
+        for item in stored if isinstance(stored, list) else []:
+            if not isinstance(item, dict) or 'key' not in item:
+                continue
+            if item.get('key_version', 1) != KEY_VERSION:
+                continue
+            if now - item.get('created_at', 0) > self.ttl_seconds:
+                continue
+            existing = self._entries.get(item['key'])
+            if existing is not None and existing['created_at'] >= item.get('created_at', now):
+                continue
+            self._entries[item['key']] = {
+                'response': item.get('response', ''),
+                'created_at': item.get('created_at', now),
+                'hits': item.get('hits', 0)
+            }
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _refresh(self):
+        # Gọi khi đang giữ self._lock
+        if file_signature(self.cache_file) != self._signature:
+            self._load()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+        with file_locks.hold(self.cache_file):
+            self._refresh()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            payload = [{'key': key, 'key_version': KEY_VERSION, **entry} for key, entry in self._entries.items()]
+            temp_file = f'{self.cache_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(temp_file, self.cache_file)
+            self._signature = file_signature(self.cache_file)
+
+    def get(self, question: str) -> Optional[str]:
+        key = self.make_key(question)
+        if not key:
+            return None
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.time() - entry['created_at'] > self.ttl_seconds:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry['hits'] += 1
+            self.hits += 1
+            return entry['response']
+
+    def set(self, question: str, response: str):
+        key = self.make_key(question)
+        if not key or not response:
+            return
+        with self._lock:
+            self._entries[key] = {'response': response, 'created_at': time.time(), 'hits': 0}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            try:
+                self._save()
+            except OSError as exc:
+                print(f"Không thể lưu chat cache: {exc}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            try:
+                self._save()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            top = sorted(self._entries.items(), key=lambda kv: kv[1]['hits'], reverse=True)[:10]
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'top_questions': [{'key': key, 'hits': entry['hits']} for key, entry in top]
+            }
@@ -0,0 +1,36 @@
+import gzip
+
+# Kiểu nội dung dạng văn bản, nén được nhiều
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml'
+}
+# Hậu tố ETag của bản nén: ETag mạnh phải khác nhau giữa các bản mã hóa khác nhau
+GZIP_ETAG_SUFFIX = '-gzip'
+
+
+def gzip_response(response, accept_encodings, min_size: int = 1024, level: int = 6):
+    """
+    Nén gzip body của response HTML/JSON/văn bản trong bộ nhớ nếu trình duyệt nhận gzip
+    (accept_encodings: request.accept_encodings). Bỏ qua response stream (xuất CSV), file
+    tĩnh (send_file), response đã nén, khác 200 hoặc nhỏ hơn min_size byte.
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    if accept_encodings['gzip'] <= 0:
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    compressed = gzip.compress(data, compresslevel=level)
+    if len(compressed) >= len(data):
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = 'gzip'
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(etag + GZIP_ETAG_SUFFIX, weak=weak)
+    return response
@@ -0,0 +1,274 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ giới hạn được trong từng tiến trình
+    fcntl = None
+
+
+class BusyError(Exception):
+    """Ngoại lệ khi không lấy được lượt gọi trong thời gian chờ cho phép."""
+
+
+class _InflightCall:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Gộp các lời gọi trùng khóa đang chạy đồng thời:
+    luồng đầu tiên thực thi, các luồng sau chờ và dùng chung kết quả.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _InflightCall] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable, timeout: Optional[float] = None):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InflightCall()
+                self._calls[key] = call
+                self.leaders += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if not is_leader:
+            if not call.event.wait(timeout):
+                raise BusyError('Hết thời gian chờ kết quả từ yêu cầu đang xử lý.')
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'shared': self.shared
+            }
+
+
+class KeyedFileLock:
+    """
+    Khóa theo khóa chuỗi dùng chung cho mọi tiến trình trên máy (fcntl.flock trên
+    lock_dir/<sha1(khóa)>.lock). Dùng để gộp lời gọi trùng giữa các worker gunicorn đồng bộ:
+    worker đầu tiên giữ khóa và gọi, các worker sau chờ khóa rồi đọc lại cache.
+    Không có fcntl (Windows) thì không khóa gì.
+    """
+
+    def __init__(self, lock_dir: str, poll_interval: float = 0.05):
+        self.lock_dir = lock_dir
+        self.poll_interval = poll_interval
+        self.waited = 0
+
+    def acquire(self, key: str, timeout: float):
+        """Trả về handle để release(); BusyError nếu hết thời gian chờ"""
+        if fcntl is None:
+            return None
+        os.makedirs(self.lock_dir, exist_ok=True)
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        handle = open(os.path.join(self.lock_dir, f'{name}.lock'), 'a')
+        deadline = time.monotonic() + timeout
+        waited = False
+        while True:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    handle.close()
+                    raise BusyError('Hết thời gian chờ kết quả từ yêu cầu đang xử lý.')
+                time.sleep(min(self.poll_interval, remaining))
+        if waited:
+            self.waited += 1
+        return handle
+
+    @staticmethod
+    def release(handle):
+        if handle is not None:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+
+
+class ConcurrencyLimiter:
+    """
+    Semaphore giới hạn số lời gọi đồng thời, có thời gian chờ tối đa.
+    slot_dir: giới hạn chung cho mọi tiến trình trên máy (các worker gunicorn đồng bộ, mỗi
+    worker một request): mỗi lượt gọi giữ fcntl.flock trên một trong max_concurrency file
+    slot; tiến trình chết thì hệ điều hành tự nhả khóa.
+    """
+
+    def __init__(self, max_concurrency: int, wait_timeout: float, slot_dir: Optional[str] = None,
+                 poll_interval: float = 0.05):
+        self.max_concurrency = max(1, max_concurrency)
+        self.wait_timeout = wait_timeout
+        self.slot_dir = slot_dir if fcntl is not None else None
+        self.poll_interval = poll_interval
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        # File slot đang giữ của từng luồng
+        self._local = threading.local()
+        self.active = 0
+        self.rejected = 0
+
+    def _acquire_slot(self, deadline: float):
+        os.makedirs(self.slot_dir, exist_ok=True)
+        while True:
+            for index in range(self.max_concurrency):
+                handle = open(os.path.join(self.slot_dir, f'slot-{index}.lock'), 'a')
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return handle
+                except OSError:
+                    handle.close()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self.poll_interval, remaining))
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.wait_timeout
+        if not self._semaphore.acquire(timeout=self.wait_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise BusyError('Quá nhiều yêu cầu đang được xử lý.')
+        if self.slot_dir is not None:
+            handle = self._acquire_slot(deadline)
+            if handle is None:
+                self._semaphore.release()
+                with self._lock:
+                    self.rejected += 1
+                raise BusyError('Quá nhiều yêu cầu đang được xử lý.')
+            self._local.slot = handle
+        with self._lock:
+            self.active += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        handle = getattr(self._local, 'slot', None)
+        if handle is not None:
+            self._local.slot = None
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+        with self._lock:
+            self.active -= 1
+        self._semaphore.release()
+        return False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'active': self.active,
+                'max_concurrency': self.max_concurrency,
+                'shared_across_processes': self.slot_dir is not None,
+                'wait_timeout': self.wait_timeout,
+                'rejected': self.rejected
+            }
+
+
+class TokenBucketLimiter:
+    """
+    Giới hạn tần suất theo từng người dùng bằng token bucket:
+    mỗi người có tối đa `capacity` token, hồi `rate` token mỗi giây.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+    def _take(self, tokens: float, updated: float, now: float, cost: float) -> Tuple[float, bool, float]:
+        """(số token còn lại, được phép, số giây cần chờ) sau khi hồi token tới `now` và lấy `cost`"""
+        tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+        if tokens >= cost:
+            return tokens - cost, True, 0.0
+        retry_after = (cost - tokens) / self.rate if self.rate > 0 else float('inf')
+        return tokens, False, retry_after
+
+    def allow(self, key: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """Trả về (được phép, số giây cần chờ nếu bị từ chối)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.capacity, now))
+            tokens, allowed, retry_after = self._take(tokens, updated, now, cost)
+            self._buckets[key] = (tokens, now)
+            self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now: float):
+        # Bucket đã đầy lại thì tương đương chưa từng dùng -> xóa để tiết kiệm bộ nhớ
+        if now - self._last_prune < 60 or self.rate <= 0:
+            return
+        self._last_prune = now
+        refill_time = self.capacity / self.rate
+        stale = [k for k, (_, updated) in self._buckets.items() if now - updated > refill_time]
+        for key in stale:
+            del self._buckets[key]
+
+
+class FileTokenBucketLimiter(TokenBucketLimiter):
+    """
+    TokenBucketLimiter dùng chung cho mọi worker trên máy: bucket của mỗi người là một file
+    nhỏ trong state_dir ("<token> <thời điểm>"), đọc-sửa-ghi dưới fcntl.flock, thời gian
+    theo time.time() vì time.monotonic() khác nhau giữa các tiến trình. Bucket trong bộ nhớ
+    của từng tiến trình thì giới hạn bị nhân lên theo số worker.
+    Không có fcntl (Windows) thì giới hạn trong từng tiến trình như TokenBucketLimiter.
+    """
+
+    def __init__(self, state_dir: str, rate: float, capacity: float):
+        super().__init__(rate, capacity)
+        self.state_dir = state_dir
+
+    def allow(self, key: str, cost: float = 1.0) -> Tuple[bool, float]:
+        if fcntl is None:
+            return super().allow(key, cost)
+        os.makedirs(self.state_dir, exist_ok=True)
+        name = hashlib.sha1(str(key).encode('utf-8')).hexdigest()
+        with open(os.path.join(self.state_dir, f'{name}.bucket'), 'a+', encoding='utf-8') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                handle.seek(0)
+                now = time.time()
+                try:
+                    tokens, updated = (float(value) for value in handle.read().split())
+                except ValueError:
+                    tokens, updated = self.capacity, now
+                tokens, allowed, retry_after = self._take(tokens, updated, now, cost)
+                handle.seek(0)
+                handle.truncate()
+                handle.write(f'{tokens} {now}')
+                handle.flush()
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+        return allowed, retry_after
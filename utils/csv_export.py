@@ -0,0 +1,80 @@
+import csv
+import io
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Excel chỉ nhận đúng tiếng Việt trong file CSV UTF-8 khi có BOM ở đầu
+CSV_BOM = '\ufeff'
+# Số dòng gom lại trước mỗi lần gửi; dòng tiêu đề luôn được gửi ngay
+ROWS_PER_CHUNK = 200
+# Ô bắt đầu bằng các ký tự này bị Excel/LibreOffice hiểu là công thức (CSV injection):
+# tên, tiêu đề bài viết... do người dùng nhập nên phải thêm dấu ' phía trước
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# Các định dạng thời gian đang có trong dữ liệu: ISO (submissions, progress) và
+# '%d/%m/%Y %H:%M:%S' (exam_results)
+_TIME_FORMATS = ('%d/%m/%Y %H:%M:%S', '%d/%m/%Y')
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        pass
+    for time_format in _TIME_FORMATS:
+        try:
+            return datetime.strptime(value, time_format)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_date_range(start: Optional[str], end: Optional[str]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Khoảng ngày dạng YYYY-MM-DD (ô input type=date), tính cả ngày cuối.
+    Trả về (từ, trước) với `trước` là 0 giờ ngày sau ngày cuối; ValueError nếu sai định dạng.
+    """
+    start_at = datetime.strptime(start, '%Y-%m-%d') if start else None
+    end_before = datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1) if end else None
+    return start_at, end_before
+
+
+def in_date_range(value, start_at: Optional[datetime], end_before: Optional[datetime]) -> bool:
+    """Bản ghi không có thời gian hợp lệ chỉ được xuất khi không lọc theo ngày"""
+    if start_at is None and end_before is None:
+        return True
+    timestamp = parse_timestamp(value)
+    if timestamp is None:
+        return False
+    return (start_at is None or timestamp >= start_at) and (end_before is None or timestamp < end_before)
+
+
+def escape_formula(value):
+    """Thêm ' trước chuỗi có thể bị bảng tính chạy như công thức; số giữ nguyên"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(header: List[str], rows: Iterable[List]) -> Iterator[str]:
+    """Sinh nội dung CSV theo từng đoạn để trả về bằng response dạng generator"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield CSV_BOM + buffer.getvalue()
+
+    buffer.seek(0)
+    buffer.truncate()
+    pending = 0
+    for row in rows:
+        writer.writerow([escape_formula(value) for value in row])
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
@@ -0,0 +1,79 @@
+import os
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from utils.file_lock import atomic_write_json, file_locks
+from utils.search_index import file_signature
+
+
+class DataVersions:
+    """
+    Số phiên bản của từng tập dữ liệu ('courses', 'documents', 'forum', ...), mỗi tập ứng với
+    một số file JSON (collections).
+    - Database gọi file_saved(path) mỗi lần ghi file: số thế hệ của các tập chứa file đó tăng 1
+    - version() gồm số thế hệ và chữ ký file (file_signature), nên cũng đổi khi file bị tiến
+      trình khác ghi; số thế hệ giữ cho hai lần ghi cùng kích thước trong cùng một tích tắc
+      đồng hồ vẫn khác phiên bản. Dùng cho RenderCache (cache trong bộ nhớ của tiến trình)
+    - token() cho ETag phải giống nhau ở mọi worker nên không dùng số thế hệ (riêng từng tiến
+      trình) mà dùng chữ ký file và bộ đếm số lần ghi lưu trong counter_dir, tăng dưới khóa file
+    """
+
+    def __init__(self, collections: Dict[str, Callable[[], List[str]]], counter_dir: str = 'data/cache/versions'):
+        self.collections = collections
+        self.counter_dir = counter_dir
+        self._lock = threading.Lock()
+        self._generations = Counter()
+
+    def files(self, name: str) -> List[str]:
+        if name not in self.collections:
+            raise KeyError(f'Không có loại dữ liệu {name}')
+        return self.collections[name]()
+
+    def file_saved(self, path: str) -> List[str]:
+        """Tăng phiên bản các tập chứa path; trả về tên các tập đó"""
+        names = [name for name in self.collections if path in self.files(name)]
+        with self._lock:
+            for name in names:
+                self._generations[name] += 1
+        if names:
+            self._bump_counter(path)
+        return names
+
+    def _counter_path(self, path: str) -> str:
+        name = os.path.normpath(path).replace(os.sep, '_').replace(':', '_')
+        return os.path.join(self.counter_dir, f'{name}.ver')
+
+    def _read_counter(self, path: str) -> int:
+        try:
+            with open(self._counter_path(path), 'r', encoding='utf-8') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return 0
+
+    def _bump_counter(self, path: str):
+        counter_path = self._counter_path(path)
+        with file_locks.hold(counter_path):
+            current = self._read_counter(path) + 1
+            os.makedirs(self.counter_dir, exist_ok=True)
+            atomic_write_json(counter_path, None, text=str(current))
+
+    def generations(self, names: Iterable[str]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._generations[name] for name in names)
+
+    def version(self, names: Iterable[str]) -> Tuple:
+        """(số thế hệ, chữ ký file) của các tập; chụp trước khi đọc dữ liệu"""
+        names = tuple(names)
+        signatures = tuple(file_signature(path) for name in names for path in self.files(name))
+        return self.generations(names), signatures
+
+    def token(self, names: Iterable[str]) -> str:
+        """Phiên bản dùng chung mọi tiến trình (chữ ký file + bộ đếm số lần ghi) dạng chuỗi, để tạo ETag"""
+        parts = []
+        for name in names:
+            for path in self.files(name):
+                signature = file_signature(path)
+                parts.append(f'{self._read_counter(path)}.'
+                             + ('-' if signature is None else f'{signature[0]}.{signature[1]}'))
+        return ':'.join(parts)
@@ -1,10 +1,50 @@
+import functools
 import json
 import os
+import re
+from contextlib import contextmanager
 from datetime import datetime
 
+from utils.auth import USERS_FILE
+from utils.data_versions import DataVersions
+from utils.document_index import DocumentIndex
+from utils.exercise_catalog import ExerciseCatalog
+from utils.file_lock import atomic_write_json, file_locks
+from utils.forum_listing import ForumListingIndex
+from utils.forum_search import ForumSearchIndex
+from utils.grading import answer_key_version, grade_exercise
+from utils.id_sequence import max_id_number, next_id_number
+from utils.json_stream import iter_json_array
+from utils.progress_matrix import ProgressMatrixIndex
+from utils.question_dedup import QuestionDedupIndex
+from utils.render_cache import RenderCache
+from utils.search_index import file_signature
+from utils.submission_index import SubmissionIndex
+from utils.unit_of_work import MergeConflict, merge_records
+from utils.site_search import (SearchSource, SiteSearchIndex, course_entries, document_entries,
+                               exam_entries, post_entries)
+
+
+def _serialized(*file_attributes):
+    """
+    Khóa các file (tên thuộc tính của Database, ví dụ 'progress_file') trong suốt lần
+    đọc-sửa-ghi của phương thức, xem Database._locked
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self._locked(*(getattr(self, name) for name in file_attributes)):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
 class Database:
     def __init__(self):
+        # Danh mục khóa học: thông tin khóa học + dàn ý bài học (id, tiêu đề);
+        # nội dung và câu hỏi của bài học nằm ở lessons_dir/<course_id>.json
         self.courses_file = 'data/courses.json'
+        self.lessons_dir = 'data/lessons'
         self.exercises_file = 'data/exercises.json'
         self.progress_file = 'data/progress.json'
         self.documents_file = 'data/documents.json'
@@ -12,7 +52,67 @@ class Database:
         self.forum_posts_file = 'data/forum_posts.json'
         self.forum_comments_file = 'data/forum_comments.json'
         self.chat_messages_file = 'data/chat_messages.json'
+        self.exam_results_file = 'data/exam_results.json'
+        # Khóa theo file: tác vụ nền, job import và các request ghi cùng file lần lượt từng người
+        self.file_locks = file_locks
+        # Khóa của bản ghi khi gộp ghi đồng thời (commit_unit_of_work); mặc định là 'id'
+        self._record_keys = {
+            self.progress_file: lambda record: (record['user_id'], record['course_id'])
+        }
         self._init_files()
+        # Hàm trả về UnitOfWork của request hiện tại (app.py gắn vào flask.g), None nếu
+        # không ở trong request (ví dụ job import chạy nền) -> đọc/ghi file trực tiếp
+        self.unit_of_work_provider = None
+        # Chỉ mục MinHash phát hiện câu hỏi gần trùng, nạp khi dùng lần đầu
+        self.question_index = QuestionDedupIndex(
+            'data/cache/question_index.jsonl', self.load_exam_bank, self._get_exam_file
+        )
+        # Chỉ mục tìm kiếm diễn đàn (bỏ dấu, BM25), dựng ở lần tìm kiếm đầu tiên
+        self.forum_index = ForumSearchIndex(
+            self.forum_posts_file, self.forum_comments_file,
+            lambda: self._load_json(self.forum_posts_file),
+            lambda: self._load_json(self.forum_comments_file)
+        )
+        # Chỉ mục liệt kê bài viết theo thời gian / thẻ / tác giả, dựng ở lần dùng đầu tiên
+        self.forum_listing = ForumListingIndex(
+            self.forum_posts_file, lambda: self._load_json(self.forum_posts_file)
+        )
+        # Ma trận tiến độ học sinh x bài học của từng khóa học cho báo cáo của giáo viên
+        self.progress_matrix = ProgressMatrixIndex(
+            self.progress_file, self.courses_file,
+            lambda: self._load_json(self.progress_file),
+            lambda: self._load_json(self.courses_file)
+        )
+        # Danh sách bài tập dựng sẵn và lần nộp mới nhất của từng học sinh cho trang /exercises
+        self.exercise_catalog = ExerciseCatalog(
+            self.courses_file, lambda: self._load_json(self.courses_file), self.get_lessons
+        )
+        self.submission_index = SubmissionIndex(
+            self.submissions_file, lambda: self._load_json(self.submissions_file)
+        )
+        # Kho tài liệu chia nhóm theo (lớp, loại) cho trang /documents
+        self.document_index = DocumentIndex(
+            self.documents_file, lambda: self._load_json(self.documents_file)
+        )
+        # Phiên bản của từng tập dữ liệu, tăng mỗi lần ghi file (cho render_cache và ETag)
+        self.data_versions = DataVersions({
+            # Sửa bài học luôn ghi lại cả courses.json (dàn ý bài học)
+            'courses': lambda: [self.courses_file],
+            'documents': lambda: [self.documents_file],
+            'exams': lambda: [self._get_exam_file(grade) for grade in ('10', '11', '12')],
+            'forum': lambda: [self.forum_posts_file, self.forum_comments_file],
+            'chat': lambda: [self.chat_messages_file],
+            # users.json do utils.auth ghi trực tiếp: chỉ phát hiện qua chữ ký file
+            'users': lambda: [USERS_FILE]
+        })
+        # HTML đã render của các trang ít đổi (/, /courses, /documents, /tracnghiem), xóa khi file dữ liệu được ghi
+        self.render_cache = RenderCache(
+            self.data_versions,
+            max_bytes=int(os.getenv('RENDER_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+        )
+        # Chỉ mục tìm kiếm chung (/search), lưu ở data/cache và cập nhật sau mỗi lần ghi file
+        self.site_index = SiteSearchIndex('data/cache/site_index.pickle', self._site_search_sources())
+        self._split_course_lessons()
     
     def _init_files(self):
         files = [
@@ -30,17 +130,138 @@ class Database:
                 with open(file, 'w', encoding='utf-8') as f:
                     json.dump([], f)
     
-    def _load_json(self, filename):
+    def _unit_of_work(self):
+        return self.unit_of_work_provider() if self.unit_of_work_provider else None
+
+    def _read_json(self, filename):
+        return self._read_json_with_text(filename)[0]
+
+    def _read_json_with_text(self, filename):
         try:
             with open(filename, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                text = f.read()
+            return json.loads(text), text
         except (json.JSONDecodeError, FileNotFoundError):
-            return []
+            return [], None
+
+    def _write_json(self, filename, data, text=None):
+        # Ghi qua file tạm + os.replace: luồng khác đọc cùng lúc không gặp file ghi dở
+        # (_read_json sẽ coi là file rỗng và lần ghi sau xóa mất dữ liệu)
+        with self.file_locks.hold(filename):
+            atomic_write_json(filename, data, text)
+        self.site_index.file_saved(filename, data)
+        self.render_cache.invalidate(*self.data_versions.file_saved(filename))
+
+    @contextmanager
+    def _locked(self, *filenames):
+        """
+        Giữ khóa các file trong một lần đọc-sửa-ghi ngoài request (tác vụ nền, job import) để
+        hai luồng không cùng đọc bản cũ rồi ghi đè lên nhau. Trong request các file chỉ được
+        ghi ở commit_unit_of_work, nơi đã giữ khóa từng file.
+        """
+        if self._unit_of_work() is not None:
+            yield
+            return
+        with self.file_locks.hold(*filenames):
+            yield
+
+    def _next_id(self, filename, prefix, width=0):
+        """
+        Id mới không trùng cho bản ghi của filename (xem next_id_number); không dùng len()
+        của danh sách request đã đọc vì request khác có thể đã thêm bản ghi cùng số
+        """
+        number = next_id_number(os.path.basename(filename), lambda: max_id_number(
+            (record.get('id') for record in self._read_json(filename) if isinstance(record, dict)), prefix
+        ))
+        return f'{prefix}{number:0{width}d}'
+
+    def _load_json(self, filename):
+        unit_of_work = self._unit_of_work()
+        if unit_of_work is not None:
+            return unit_of_work.load_with_base(filename, self._read_json_with_text)
+        return self._read_json(filename)
     
     def _save_json(self, filename, data):
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    
+        unit_of_work = self._unit_of_work()
+        if unit_of_work is not None:
+            unit_of_work.save(filename, data)
+            return
+        self._write_json(filename, data)
+
+    def commit_unit_of_work(self, unit_of_work):
+        """
+        Ghi các file đã thay đổi trong request, mỗi file một lần. Giữ khóa mọi file cần ghi và
+        gộp xong hết trước khi ghi file đầu tiên: gặp MergeConflict thì không file nào bị ghi.
+        """
+        dirty = list(unit_of_work.dirty())
+        with self.file_locks.hold(*(filename for filename, _, _ in dirty)):
+            writes = []
+            try:
+                for filename, data, text in dirty:
+                    before = file_signature(filename)
+                    base = unit_of_work.base(filename)
+                    if base is not None and base[0] != before:
+                        # File bị tác vụ nền/tiến trình khác ghi sau khi request đọc: gộp theo bản ghi
+                        # thay vì ghi đè mất thay đổi của họ; chỉ mục không còn khớp -> dựng lại
+                        data, text = self._merge_unit_of_work_file(filename, base[1], data, text)
+                        before = None
+                    writes.append((filename, data, text, before))
+            except MergeConflict:
+                self.discard_unit_of_work(unit_of_work)
+                raise
+            for filename, data, text, before in writes:
+                self._write_json(filename, data, text)
+                # Các chỉ mục đã cập nhật theo dữ liệu mới lúc _save_json, chỉ cần nhận chữ ký file mới
+                after = file_signature(filename)
+                self.forum_index.file_written(filename, before, after)
+                self.forum_listing.file_written(filename, before, after)
+                self.progress_matrix.file_written(filename, before, after)
+                self.submission_index.file_written(filename, before, after)
+                self.document_index.file_written(filename, before, after)
+        unit_of_work.clear()
+
+    def _merge_unit_of_work_file(self, filename, base_text, data, text):
+        try:
+            base = json.loads(base_text) if base_text is not None else []
+        except json.JSONDecodeError:
+            base = []
+        key = self._record_keys.get(filename, lambda record: record['id'])
+        merged = merge_records(base, data, self._read_json(filename), key=key)
+        if merged is None:
+            print(f'Không gộp được thay đổi đồng thời của {filename}, ghi đè bằng dữ liệu của request')
+            return data, text
+        return merged, None
+
+    def discard_unit_of_work(self, unit_of_work):
+        """Bỏ các thay đổi chưa ghi (request lỗi); chỉ mục đã lỡ cập nhật theo chúng sẽ dựng lại"""
+        for filename in unit_of_work.dirty_files():
+            self.forum_index.file_written(filename, None, None)
+            self.forum_listing.file_written(filename, None, None)
+            self.progress_matrix.file_written(filename, None, None)
+            self.submission_index.file_written(filename, None, None)
+            self.document_index.file_written(filename, None, None)
+        unit_of_work.clear()
+
+    def _site_search_sources(self):
+        sources = [
+            SearchSource(self.courses_file, lambda: self._load_json(self.courses_file),
+                         lambda course: course_entries(self._with_lessons(course))),
+            SearchSource(self.documents_file, lambda: self._load_json(self.documents_file), document_entries),
+            SearchSource(self.forum_posts_file, lambda: self._load_json(self.forum_posts_file), post_entries)
+        ]
+        for grade in ('10', '11', '12'):
+            sources.append(SearchSource(
+                self._get_exam_file(grade),
+                lambda grade=grade: self.load_exam_bank(grade),
+                exam_entries(grade),
+                records=lambda data: data.get('exams', []) if isinstance(data, dict) else data
+            ))
+        return sources
+
+    def search_site(self, query, filters=None, page=1, per_page=20):
+        """Tìm kiếm chung trên khóa học, bài học, tài liệu, đề thi và diễn đàn"""
+        return self.site_index.search(query, filters=filters, page=page, per_page=per_page)
+
     def _get_exam_file(self, grade):
         grade_str = str(grade)
         return f'data/lop{grade_str}.json'
@@ -49,18 +270,14 @@ class Database:
         filename = self._get_exam_file(grade)
         if not os.path.exists(filename):
             return {'exams': []}
-        try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, dict):
-                    data.setdefault('exams', [])
-                    return data
-                if isinstance(data, list):
-                    # Hỗ trợ định dạng cũ (danh sách thuần các câu hỏi)
-                    return {'exams': data}
-                return {'exams': []}
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {'exams': []}
+        data = self._load_json(filename)
+        if isinstance(data, dict):
+            data.setdefault('exams', [])
+            return data
+        if isinstance(data, list):
+            # Hỗ trợ định dạng cũ (danh sách thuần các câu hỏi)
+            return {'exams': data}
+        return {'exams': []}
 
     def save_exam_bank(self, grade, data):
         filename = self._get_exam_file(grade)
@@ -72,67 +289,167 @@ class Database:
         self._save_json(filename, data)
 
     def add_exam(self, grade, exam_data):
-        exams_data = self.load_exam_bank(grade)
-        exams = exams_data.setdefault('exams', [])
-        exams.append(exam_data)
-        self.save_exam_bank(grade, exams_data)
+        with self._locked(self._get_exam_file(grade)):
+            exams_data = self.load_exam_bank(grade)
+            exams = exams_data.setdefault('exams', [])
+            exams.append(exam_data)
+            self.save_exam_bank(grade, exams_data)
+        self.question_index.add_exams(grade, [exam_data])
         return exam_data.get('id')
 
+    def add_exams(self, grade, exams):
+        """Thêm nhiều đề thi vào cùng một khối với một lần ghi file"""
+        with self._locked(self._get_exam_file(grade)):
+            exams_data = self.load_exam_bank(grade)
+            exams_data.setdefault('exams', []).extend(exams)
+            self.save_exam_bank(grade, exams_data)
+        self.question_index.add_exams(grade, exams)
+        return [exam.get('id') for exam in exams]
+
+    # ---- Khóa học: danh mục nhẹ + bài học đầy đủ nạp khi cần ----
+    
+    def _lessons_file(self, course_id):
+        # Thay các ký tự không phải chữ/số để id khóa học không trỏ ra ngoài lessons_dir
+        safe_id = re.sub(r'[^\w-]', '_', str(course_id))
+        return os.path.join(self.lessons_dir, f'{safe_id}.json')
+    
+    @staticmethod
+    def _lesson_outline(lessons):
+        return [{'id': lesson.get('id'), 'title': lesson.get('title', '')} for lesson in lessons]
+    
+    def _split_course_lessons(self):
+        """Chuyển courses.json dạng cũ (nhúng cả nội dung bài học) sang danh mục + file bài học"""
+        courses = self._read_json(self.courses_file)
+        changed = False
+        for course in courses:
+            lessons = course.get('lessons') or []
+            if any(set(lesson) - {'id', 'title'} for lesson in lessons):
+                os.makedirs(self.lessons_dir, exist_ok=True)
+                self._write_json(self._lessons_file(course['id']), lessons)
+                course['lessons'] = self._lesson_outline(lessons)
+                changed = True
+        if changed:
+            self._write_json(self.courses_file, courses)
+    
+    def get_lessons(self, course_id):
+        """Bài học đầy đủ (nội dung, câu hỏi) của một khóa học; None nếu chưa có file bài học"""
+        filename = self._lessons_file(course_id)
+        if not os.path.exists(filename):
+            return None
+        return self._load_json(filename)
+    
+    def _with_lessons(self, course):
+        lessons = self.get_lessons(course['id'])
+        return dict(course, lessons=lessons if lessons is not None else course.get('lessons', []))
+    
+    def _save_lessons(self, course_id, lessons):
+        os.makedirs(self.lessons_dir, exist_ok=True)
+        self._save_json(self._lessons_file(course_id), lessons)
+    
     def get_all_courses(self):
+        """Danh mục khóa học; 'lessons' chỉ là dàn ý (id, title), dùng get_course_with_lessons để lấy nội dung"""
         return self._load_json(self.courses_file)
     
     def get_course_by_id(self, course_id):
         courses = self.get_all_courses()
         return next((c for c in courses if c['id'] == course_id), None)
     
+    def get_course_with_lessons(self, course_id):
+        """Khóa học kèm bài học đầy đủ; chỉ đọc file bài học của đúng khóa học đó"""
+        course = self.get_course_by_id(course_id)
+        return self._with_lessons(course) if course else None
+    
+    def get_lesson(self, course_id, lesson_id):
+        lessons = self.get_lessons(course_id) or []
+        return next((l for l in lessons if l.get('id') == lesson_id), None)
+    
+    def get_courses_by_ids(self, course_ids):
+        """Lấy nhiều khóa học trong một lượt: {course_id: course}, id không tồn tại thì bỏ qua"""
+        wanted = set(course_ids)
+        return {c['id']: c for c in self.get_all_courses() if c['id'] in wanted}
+    
     def get_courses_by_teacher(self, teacher_id):
         courses = self.get_all_courses()
         return [c for c in courses if c['teacher_id'] == teacher_id]
     
     def create_course(self, course_data, teacher_id):
         courses = self.get_all_courses()
-        course_id = f"course_{len(courses) + 1}"
+        course_id = self._next_id(self.courses_file, 'course_')
+        lessons = course_data.get('lessons', [])
         
         new_course = {
             'id': course_id,
             'teacher_id': teacher_id,
             'title': course_data['title'],
             'description': course_data.get('description', ''),
-            'lessons': course_data.get('lessons', []),
+            'lessons': self._lesson_outline(lessons),
             'created_at': datetime.now().isoformat()
         }
         
+        # Ghi bài học trước danh mục để khóa học xuất hiện là đã có nội dung
+        self._save_lessons(course_id, lessons)
         courses.append(new_course)
         self._save_json(self.courses_file, courses)
         return course_id
     
     def update_course(self, course_id, course_data):
         courses = self.get_all_courses()
+        course_data = dict(course_data)
+        lessons = course_data.pop('lessons', None)
         for i, course in enumerate(courses):
             if course['id'] == course_id:
+                if lessons is not None:
+                    self._save_lessons(course_id, lessons)
+                    course_data['lessons'] = self._lesson_outline(lessons)
                 courses[i].update(course_data)
                 courses[i]['updated_at'] = datetime.now().isoformat()
                 self._save_json(self.courses_file, courses)
                 return True
         return False
     
+    def delete_course(self, course_id):
+        courses = self.get_all_courses()
+        remaining = [c for c in courses if c['id'] != course_id]
+        if len(remaining) == len(courses):
+            return False
+        self._save_json(self.courses_file, remaining)
+        try:
+            os.remove(self._lessons_file(course_id))
+        except FileNotFoundError:
+            pass
+        return True
+    
     def get_all_exercises(self):
         return self._load_json(self.exercises_file)
     
+    def get_exercises(self):
+        """Các bài học có câu hỏi (đã bỏ đáp án), xem ExerciseCatalog"""
+        return self.exercise_catalog.exercises()
+    
+    def get_latest_submissions_by_user(self, user_id):
+        """Lần nộp mới nhất của học sinh cho từng bài học, mới nhất trước"""
+        return self.submission_index.latest_by_user(user_id)
+    
     def save_exercise_submission(self, user_id, submission_data):
+        index_snapshot = self.submission_index.snapshot()
         submissions = self._load_json(self.submissions_file)
         
         submission = {
-            'id': f"sub_{len(submissions) + 1}",
+            'id': self._next_id(self.submissions_file, 'sub_'),
             'user_id': user_id,
             'course_id': submission_data.get('course_id'),
             'exercise_id': submission_data['exercise_id'],
             'answers': submission_data['answers'],
             'submitted_at': submission_data.get('submitted_at', datetime.now().isoformat())
         }
+        # Điểm đã chấm lúc nộp (xem grade_exercise), để trang giáo viên đọc thẳng
+        for field in ('score', 'correct', 'total', 'answer_key_version'):
+            if field in submission_data:
+                submission[field] = submission_data[field]
         
         submissions.append(submission)
         self._save_json(self.submissions_file, submissions)
+        self.submission_index.on_submission_saved(submission, index_snapshot)
         return submission['id']
     
     def get_student_progress(self, user_id):
@@ -144,34 +461,92 @@ class Database:
         return next((p for p in progress_list if p['user_id'] == user_id and p['course_id'] == course_id), None)
     
     def update_progress(self, user_id, course_id, lesson_id, completed, **kwargs):
+        return self.update_progress_batch(
+            user_id,
+            [{'course_id': course_id, 'lesson_id': lesson_id, 'completed': completed}],
+            timestamp=kwargs.get('timestamp')
+        )
+    
+    @_serialized('progress_file')
+    def update_progress_batch(self, user_id, updates, timestamp=None):
+        """
+        Ghi nhiều cập nhật tiến độ của một học sinh với một lần đọc và một lần ghi progress.json.
+        updates: [{'course_id', 'lesson_id', 'completed'}]; completed=False bỏ đánh dấu bài học.
+        """
+        timestamp = timestamp or datetime.now().isoformat()
+        matrix_snapshot = self.progress_matrix.snapshot()
         progress_list = self._load_json(self.progress_file)
-        
-        timestamp = kwargs.get('timestamp', datetime.now().isoformat())
-        
-        progress = next((p for p in progress_list if p['user_id'] == user_id and p['course_id'] == course_id), None)
-        
-        if progress:
-            if completed and lesson_id not in progress['completed_lessons']:
-                progress['completed_lessons'].append(lesson_id)
+        by_course = {p['course_id']: p for p in progress_list if p['user_id'] == user_id}
+        # Tập bài đã hoàn thành của từng khóa, dựng khi gặp khóa đó lần đầu trong lô
+        completed_sets = {}
+        
+        for update in updates:
+            course_id = update['course_id']
+            lesson_id = update['lesson_id']
+            progress = by_course.get(course_id)
+            if progress is None:
+                progress = {
+                    'user_id': user_id,
+                    'course_id': course_id,
+                    'completed_lessons': [],
+                    'last_updated': timestamp
+                }
+                progress_list.append(progress)
+                by_course[course_id] = progress
+            lessons = completed_sets.get(course_id)
+            if lessons is None:
+                lessons = completed_sets[course_id] = set(progress['completed_lessons'])
+            
+            if update.get('completed', True):
+                if lesson_id not in lessons:
+                    lessons.add(lesson_id)
+                    progress['completed_lessons'].append(lesson_id)
+            elif lesson_id in lessons:
+                lessons.discard(lesson_id)
+                progress['completed_lessons'].remove(lesson_id)
             progress['last_updated'] = timestamp
-        else:
-            progress = {
-                'user_id': user_id,
-                'course_id': course_id,
-                'completed_lessons': [lesson_id] if completed else [],
-                'last_updated': timestamp
-            }
-            progress_list.append(progress)
         
         self._save_json(self.progress_file, progress_list)
+        self.progress_matrix.on_progress_saved([by_course[course_id] for course_id in completed_sets], matrix_snapshot)
         return True
     
+    def get_enrollment_counts(self, course_ids):
+        """Số học sinh đã có tiến độ ở mỗi khóa học: {course_id: số học sinh}"""
+        return self.progress_matrix.enrollment_counts(course_ids)
+    
+    def get_course_progress_report(self, course_id):
+        """Báo cáo tiến độ của một khóa học, xem ProgressMatrixIndex.course_report"""
+        return self.progress_matrix.course_report(course_id)
+    
+    @_serialized('exam_results_file')
+    def add_exam_result(self, result_data):
+        results = self._load_json(self.exam_results_file)
+        results.append(result_data)
+        self._save_json(self.exam_results_file, results)
+        return True
+    
+    def get_exam_results_by_user(self, user_id):
+        results = self._load_json(self.exam_results_file)
+        return [r for r in results if r.get('user_id') == user_id]
+    
+    def iter_records(self, filename):
+        """Đọc lần lượt từng bản ghi của file mà không nạp cả file (dùng cho xuất dữ liệu lớn)"""
+        return iter_json_array(filename)
+    
     def get_all_documents(self):
         return self._load_json(self.documents_file)
     
+    def count_documents(self, grade='all', doc_type='all'):
+        return self.document_index.count(grade=grade, doc_type=doc_type)
+    
+    def get_documents_page(self, grade='all', doc_type='all', page=1, per_page=24):
+        """Một trang tài liệu mới nhất trước theo lớp/loại, xem DocumentIndex.page"""
+        return self.document_index.page(grade=grade, doc_type=doc_type, page=page, per_page=per_page)
+    
     def add_document(self, doc_data):
+        index_snapshot = self.document_index.snapshot()
         documents = self.get_all_documents()
-        doc_id = f"doc_{len(documents) + 1}"
+        doc_id = self._next_id(self.documents_file, 'doc_')
         
         url = doc_data.get('url') or doc_data.get('link', '')
         
@@ -181,13 +556,50 @@ class Database:
             'type': doc_data.get('type', 'document'),
             'url': url,
             'description': doc_data.get('description', ''),
+            'grade': str(doc_data.get('grade', '')),
+            'doc_type': doc_data.get('doc_type', 'document'),
+            'link_type': doc_data.get('link_type', 'other'),
             'created_at': datetime.now().isoformat()
         }
         
         documents.append(new_doc)
         self._save_json(self.documents_file, documents)
+        self.document_index.on_document_saved(new_doc, index_snapshot)
         return doc_id
     
+    @_serialized('submissions_file')
+    def regrade_submissions(self, course_id=None):
+        """
+        Chấm lại các bài nộp chưa có điểm hoặc được chấm theo đáp án cũ (answer_key_version
+        khác đáp án hiện tại của bài học); bài nộp còn đúng phiên bản thì giữ nguyên.
+        course_id=None: mọi khóa học. Trả về số bài nộp đã chấm lại.
+        """
+        index_snapshot = self.submission_index.snapshot()
+        submissions = self._load_json(self.submissions_file)
+        # course_id -> {lesson_id: (câu hỏi, phiên bản đáp án)}, mỗi file bài học đọc một lần
+        answer_keys = {}
+        regraded = []
+        
+        for submission in submissions:
+            submission_course = submission.get('course_id')
+            if course_id is not None and submission_course != course_id:
+                continue
+            if submission_course not in answer_keys:
+                answer_keys[submission_course] = {
+                    lesson.get('id'): (lesson.get('questions', []), answer_key_version(lesson.get('questions', [])))
+                    for lesson in self.get_lessons(submission_course) or []
+                }
+            answer_key = answer_keys[submission_course].get(submission.get('exercise_id'))
+            if answer_key is None or submission.get('answer_key_version') == answer_key[1]:
+                continue
+            submission.update(grade_exercise(answer_key[0], submission.get('answers') or {}))
+            regraded.append(submission)
+        
+        if regraded:
+            self._save_json(self.submissions_file, submissions)
+            self.submission_index.on_submissions_regraded(regraded, index_snapshot)
+        return len(regraded)
+    
     def get_all_submissions(self):
         return self._load_json(self.submissions_file)
     
@@ -196,21 +608,35 @@ class Database:
         return [s for s in submissions if s.get('course_id') == course_id]
     
     def get_all_forum_posts(self):
-        posts = self._load_json(self.forum_posts_file)
-        posts.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        return posts
+        """Bản rút gọn (không có nội dung đầy đủ) của mọi bài viết, mới nhất trước"""
+        return self.forum_listing.posts()
+
+    def get_forum_posts_page(self, tag=None, author_id=None, before=None, after=None, limit=20):
+        """
+        Một trang bài viết (bản rút gọn) theo con trỏ: {'posts', 'older', 'newer'}.
+        Thời gian không phụ thuộc tổng số bài viết.
+        """
+        return self.forum_listing.page(tag=tag, author_id=author_id, before=before, after=after, limit=limit)
     
     def get_forum_post_by_id(self, post_id):
         posts = self._load_json(self.forum_posts_file)
         return next((p for p in posts if p['id'] == post_id), None)
     
     def get_forum_posts_by_user(self, user_id):
-        posts = self.get_all_forum_posts()
-        return [p for p in posts if p['author_id'] == user_id]
+        return self.forum_listing.posts(author_id=user_id)
+
+    def get_forum_posts_by_tag(self, tag):
+        return self.forum_listing.posts(tag=tag)
+
+    def get_forum_tag_cloud(self, limit=30):
+        """Các thẻ phổ biến nhất kèm số bài viết: [{'tag', 'key', 'count'}]"""
+        return self.forum_listing.tag_cloud(limit)
     
     def create_forum_post(self, post_data):
+        index_snapshot = self.forum_index.snapshot()
+        listing_snapshot = self.forum_listing.snapshot()
         posts = self._load_json(self.forum_posts_file)
-        post_id = f"post_{len(posts) + 1:04d}"
+        post_id = self._next_id(self.forum_posts_file, 'post_', 4)
         
         new_post = {
             'id': post_id,
@@ -229,9 +655,13 @@ class Database:
         
         posts.append(new_post)
         self._save_json(self.forum_posts_file, posts)
+        self.forum_index.on_post_saved(new_post, index_snapshot)
+        self.forum_listing.on_post_saved(new_post, listing_snapshot)
         return post_id
     
     def update_forum_post(self, post_id, post_data):
+        index_snapshot = self.forum_index.snapshot()
+        listing_snapshot = self.forum_listing.snapshot()
         posts = self._load_json(self.forum_posts_file)
         
         for i, post in enumerate(posts):
@@ -247,11 +677,15 @@ class Database:
                 
                 posts[i]['updated_at'] = datetime.now().isoformat()
                 self._save_json(self.forum_posts_file, posts)
+                self.forum_index.on_post_saved(posts[i], index_snapshot)
+                self.forum_listing.on_post_saved(posts[i], listing_snapshot)
                 return True
         
         return False
     
     def delete_forum_post(self, post_id):
+        index_snapshot = self.forum_index.snapshot()
+        listing_snapshot = self.forum_listing.snapshot()
         posts = self._load_json(self.forum_posts_file)
         posts = [p for p in posts if p['id'] != post_id]
         self._save_json(self.forum_posts_file, posts)
@@ -259,29 +693,33 @@ class Database:
         comments = self._load_json(self.forum_comments_file)
         comments = [c for c in comments if c['post_id'] != post_id]
         self._save_json(self.forum_comments_file, comments)
+        self.forum_index.on_post_deleted(post_id, index_snapshot)
+        self.forum_listing.on_post_deleted(post_id, listing_snapshot)
         
         return True
     
+    @_serialized('forum_posts_file')
     def increment_post_views(self, post_id):
+        index_snapshot = self.forum_index.snapshot()
+        listing_snapshot = self.forum_listing.snapshot()
         posts = self._load_json(self.forum_posts_file)
         
         for i, post in enumerate(posts):
             if post['id'] == post_id:
                 posts[i]['views'] = posts[i].get('views', 0) + 1
                 self._save_json(self.forum_posts_file, posts)
+                self.forum_index.on_post_saved(posts[i], index_snapshot)
+                self.forum_listing.on_post_saved(posts[i], listing_snapshot)
                 return True
         
         return False
     
-    def search_forum_posts(self, keyword):
-        posts = self.get_all_forum_posts()
-        keyword_lower = keyword.lower()
-        
-        return [
-            p for p in posts 
-            if keyword_lower in p['title'].lower() 
-            or keyword_lower in p['content'].lower()
-        ]
+    def search_forum_posts(self, keyword, page=1, per_page=20):
+        """
+        Tìm bài viết theo tiêu đề, thẻ, nội dung và bình luận (không phân biệt dấu).
+        Hỗ trợ cụm từ trong ngoặc kép. Trả về {'posts', 'total', 'page', 'pages'}.
+        """
+        return self.forum_index.search(keyword, page=page, per_page=per_page)
     
     def get_comments_by_post(self, post_id):
         comments = self._load_json(self.forum_comments_file)
@@ -290,8 +728,9 @@ class Database:
         return post_comments
     
     def add_comment(self, comment_data):
+        index_snapshot = self.forum_index.snapshot()
         comments = self._load_json(self.forum_comments_file)
-        comment_id = f"comment_{len(comments) + 1:04d}"
+        comment_id = self._next_id(self.forum_comments_file, 'comment_', 4)
         
         new_comment = {
             'id': comment_id,
@@ -306,12 +745,14 @@ class Database:
         
         comments.append(new_comment)
         self._save_json(self.forum_comments_file, comments)
+        self.forum_index.on_comment_added(new_comment, index_snapshot)
         
         self._update_comments_count(comment_data['post_id'])
         
         return comment_id
     
     def delete_comment(self, comment_id):
+        index_snapshot = self.forum_index.snapshot()
         comments = self._load_json(self.forum_comments_file)
         
         comment = next((c for c in comments if c['id'] == comment_id), None)
@@ -322,12 +763,15 @@ class Database:
         
         comments = [c for c in comments if c['id'] != comment_id]
         self._save_json(self.forum_comments_file, comments)
+        self.forum_index.on_comment_deleted(comment, index_snapshot)
         
         self._update_comments_count(post_id)
         
         return True
     
     def _update_comments_count(self, post_id):
+        index_snapshot = self.forum_index.snapshot()
+        listing_snapshot = self.forum_listing.snapshot()
         posts = self._load_json(self.forum_posts_file)
         comments = self.get_comments_by_post(post_id)
         
@@ -335,6 +779,8 @@ class Database:
             if post['id'] == post_id:
                 posts[i]['comments_count'] = len(comments)
                 self._save_json(self.forum_posts_file, posts)
+                self.forum_index.on_post_saved(posts[i], index_snapshot)
+                self.forum_listing.on_post_saved(posts[i], listing_snapshot)
                 break
     
     def get_all_chat_messages(self):
@@ -348,7 +794,7 @@ class Database:
 
     def add_chat_message(self, message_data):
         messages = self._load_json(self.chat_messages_file)
-        message_id = f"msg_{len(messages) + 1:06d}"
+        message_id = self._next_id(self.chat_messages_file, 'msg_', 6)
         
         new_message = {
             'id': message_id,
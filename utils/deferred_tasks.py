@@ -0,0 +1,288 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Callable, Dict, List, Optional
+
+
+def _percentiles(samples) -> Dict:
+    if not samples:
+        return {'avg': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+    ordered = sorted(samples)
+    return {
+        'avg': round(sum(ordered) / len(ordered), 2),
+        'p50': round(ordered[len(ordered) // 2], 2),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        'max': round(ordered[-1], 2)
+    }
+
+
+class DeferredTaskRunner:
+    """
+    Chạy nền các việc ghi không quan trọng (lưu kết quả thi, tăng lượt xem, tiến độ học)
+    sau khi request đã xử lý xong.
+    - Việc là tên handler đã register() + tham số JSON, để ghi được ra đĩa
+    - Hàng đợi trong bộ nhớ có giới hạn; quá giới hạn thì ghi tràn ra spool_dir
+      (mỗi việc một file), các worker đọc lại khi hàng đợi trống
+    - shutdown() (tự gọi khi tiến trình thoát bình thường) chạy nốt hàng đợi trong
+      drain_timeout giây, phần còn lại ghi ra spool_dir để lần khởi động sau chạy tiếp
+    - Việc có `key` (ví dụ 'progress:<user_id>'): wait_for(key) chờ các việc đó xong,
+      dùng trước khi đọc lại dữ liệu vừa được hẹn ghi. Mỗi việc có key đang chờ/chạy để lại
+      một file đánh dấu trong spool_dir/pending, nên wait_for thấy cả việc của worker khác
+      (request đọc thường rơi vào worker khác với request ghi); file đánh dấu cũ hơn
+      marker_ttl giây (tiến trình đã chết) bị bỏ qua
+    """
+
+    def __init__(self, spool_dir: str, max_workers: int = 2, max_queue: int = 256,
+                 drain_timeout: float = 10.0, poll_interval: float = 2.0, latency_window: int = 1000,
+                 marker_ttl: float = 60.0):
+        self.spool_dir = spool_dir
+        self.pending_dir = os.path.join(spool_dir, 'pending')
+        self.marker_ttl = marker_ttl
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max_queue
+        self.drain_timeout = drain_timeout
+        self.poll_interval = poll_interval
+        self._handlers: Dict[str, Callable] = {}
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._pending_keys = Counter()
+        self._keyed = set()
+        self._workers: List[threading.Thread] = []
+        self._running = 0
+        self._closed = False
+        self._counters = Counter()
+        # Độ trễ từ lúc hẹn tới lúc xong, và thời gian chạy của từng việc (ms)
+        self._latencies = deque(maxlen=latency_window)
+        self._run_times = deque(maxlen=latency_window)
+        os.makedirs(self.pending_dir, exist_ok=True)
+        atexit.register(self.shutdown)
+
+    def register(self, name: str, handler: Callable):
+        self._handlers[name] = handler
+
+    def start(self):
+        """Khởi động worker; gọi sau khi đã register() đủ handler vì worker chạy luôn các việc còn trong spool_dir"""
+        with self._cond:
+            if self._workers or self._closed:
+                return
+            for index in range(self.max_workers):
+                worker = threading.Thread(target=self._work, name=f'deferred-task-{index}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    # ---- Hẹn việc ----
+
+    def schedule(self, name: str, key: Optional[str] = None, **kwargs):
+        if name not in self._handlers:
+            raise KeyError(f'Chưa đăng ký tác vụ {name}')
+        task = {
+            'id': uuid.uuid4().hex,
+            'name': name,
+            'key': key,
+            'kwargs': kwargs,
+            'created_at': time.time()
+        }
+        with self._cond:
+            self._counters['scheduled'] += 1
+            if self._closed or len(self._queue) >= self.max_queue:
+                self._spill(task)
+            else:
+                self._track_key(task)
+                self._queue.append(task)
+                self._cond.notify()
+        return task['id']
+
+    def _track_key(self, task: Dict):
+        # Gọi khi đang giữ self._cond; chỉ đếm việc nằm trong hàng đợi bộ nhớ (việc đã ghi tràn
+        # có thể do tiến trình khác nhận và chạy, tiến trình này không bao giờ biết để bỏ đếm)
+        if task.get('key') is not None and task['id'] not in self._keyed:
+            self._keyed.add(task['id'])
+            self._pending_keys[task['key']] += 1
+            try:
+                open(self._marker_path(task), 'w').close()
+            except OSError:
+                pass
+
+    def _release_key(self, task: Dict):
+        if task.get('id') in self._keyed:
+            self._keyed.discard(task['id'])
+            self._pending_keys[task['key']] -= 1
+            if not self._pending_keys[task['key']]:
+                del self._pending_keys[task['key']]
+            try:
+                os.remove(self._marker_path(task))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _key_token(key: str) -> str:
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+    def _marker_path(self, task: Dict) -> str:
+        return os.path.join(self.pending_dir, f"{self._key_token(task['key'])}.{task['id']}")
+
+    def _pending_elsewhere(self, key: str) -> bool:
+        """Còn file đánh dấu (chưa quá marker_ttl) của việc cùng key, ở bất kỳ tiến trình nào"""
+        prefix = self._key_token(key) + '.'
+        try:
+            names = [name for name in os.listdir(self.pending_dir) if name.startswith(prefix)]
+        except FileNotFoundError:
+            return False
+        now = time.time()
+        for name in names:
+            try:
+                if now - os.path.getmtime(os.path.join(self.pending_dir, name)) <= self.marker_ttl:
+                    return True
+            except OSError:
+                continue
+        return False
+
+    def wait_for(self, key: str, timeout: float = 2.0) -> bool:
+        """
+        Chờ các việc cùng key đang ở hàng đợi bộ nhớ của tiến trình này và của các worker khác
+        xong; False nếu hết thời gian. Việc đã ghi tràn ra spool_dir (chưa ai nhận) không được chờ.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending_keys.get(key):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        while self._pending_elsewhere(key):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(0.02, remaining))
+        return True
+
+    # ---- Ghi tràn ra đĩa ----
+
+    def _spill(self, task: Dict):
+        path = os.path.join(self.spool_dir, f"{time.time_ns():020d}-{task['id']}.json")
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(task, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._counters['spilled'] += 1
+
+    def _spooled_files(self) -> List[str]:
+        try:
+            return sorted(name for name in os.listdir(self.spool_dir) if name.endswith('.json'))
+        except FileNotFoundError:
+            return []
+
+    def _claim_spooled(self, limit: int) -> List[Dict]:
+        """Lấy lại các việc đã ghi tràn; đổi tên file trước khi đọc để hai tiến trình không cùng chạy một việc"""
+        tasks = []
+        for name in self._spooled_files()[:limit]:
+            path = os.path.join(self.spool_dir, name)
+            claimed = f'{path}.{os.getpid()}.claimed'
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            try:
+                with open(claimed, 'r', encoding='utf-8') as f:
+                    tasks.append(json.load(f))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f'Bỏ tác vụ hỏng {name}: {e}')
+            finally:
+                try:
+                    os.remove(claimed)
+                except OSError:
+                    pass
+        return tasks
+
+    # ---- Worker ----
+
+    def _next_task(self) -> Optional[Dict]:
+        with self._cond:
+            while True:
+                if self._queue:
+                    self._running += 1
+                    return self._queue.popleft()
+                if self._closed:
+                    return None
+                if not self._cond.wait(self.poll_interval) or not self._queue:
+                    break
+        # Hàng đợi trống: nhận các việc đã ghi tràn (của tiến trình này hoặc lần chạy trước)
+        tasks = self._claim_spooled(max(1, self.max_queue))
+        with self._cond:
+            for task in tasks:
+                self._track_key(task)
+                self._queue.append(task)
+            if tasks:
+                self._counters['replayed'] += len(tasks)
+        return {}
+
+    def _work(self):
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+            if task:
+                self._run(task)
+
+    def _run(self, task: Dict):
+        started = time.time()
+        try:
+            handler = self._handlers.get(task.get('name'))
+            if handler is None:
+                raise KeyError(f"Chưa đăng ký tác vụ {task.get('name')}")
+            handler(**task.get('kwargs', {}))
+            outcome = 'completed'
+        except Exception as e:
+            print(f"Lỗi tác vụ nền {task.get('name')}: {e}")
+            outcome = 'failed'
+        finished = time.time()
+        with self._cond:
+            self._running -= 1
+            self._counters[outcome] += 1
+            self._run_times.append((finished - started) * 1000)
+            self._latencies.append((finished - task.get('created_at', started)) * 1000)
+            self._release_key(task)
+            self._cond.notify_all()
+
+    # ---- Dừng ----
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """Ngừng nhận việc, chạy nốt hàng đợi trong timeout giây rồi ghi phần còn lại ra đĩa"""
+        timeout = self.drain_timeout if timeout is None else timeout
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+        with self._cond:
+            while self._queue:
+                task = self._queue.popleft()
+                self._spill(task)
+                self._release_key(task)
+            self._cond.notify_all()
+
+    # ---- Số liệu ----
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'queue_depth': len(self._queue),
+                'spooled': len(self._spooled_files()),
+                'running': self._running,
+                'workers': len(self._workers),
+                'scheduled': self._counters['scheduled'],
+                'completed': self._counters['completed'],
+                'failed': self._counters['failed'],
+                'spilled': self._counters['spilled'],
+                'replayed': self._counters['replayed'],
+                'latency_ms': _percentiles(self._latencies),
+                'run_ms': _percentiles(self._run_times)
+            }
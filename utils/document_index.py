@@ -0,0 +1,140 @@
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.search_index import file_signature
+
+GRADES = ('10', '11', '12')
+DOC_TYPES = ('document', 'lecture', 'exam')
+ALL = 'all'
+
+# Tài liệu cũ chỉ có 'type' (document/video/pdf, hoặc youtube/drive từ form thêm tài liệu)
+LEGACY_DOC_TYPES = {'video': 'lecture', 'youtube': 'lecture'}
+
+
+def document_grade(doc: Dict) -> str:
+    """Lớp của tài liệu dạng chuỗi ('10'); dữ liệu cũ lưu số (10). Không có lớp thì ''"""
+    grade = doc.get('grade')
+    return str(grade).strip() if grade not in (None, '') else ''
+
+
+def document_type(doc: Dict) -> str:
+    if doc.get('doc_type') in DOC_TYPES:
+        return doc['doc_type']
+    return LEGACY_DOC_TYPES.get(doc.get('type'), 'document')
+
+
+def _doc_key(doc: Dict) -> Tuple[str, str]:
+    return doc.get('created_at') or '', doc['id']
+
+
+def normalize_document(doc: Dict) -> Dict:
+    """Bản sao tài liệu với grade/doc_type đã chuẩn hóa, dùng cho trang kho tài liệu"""
+    return dict(doc, grade=document_grade(doc), doc_type=document_type(doc))
+
+
+class DocumentIndex:
+    """
+    Kho tài liệu chia nhóm theo (lớp, loại tài liệu), mỗi nhóm là danh sách khóa
+    (created_at, id) đã sắp xếp. Ngoài các nhóm (lớp, loại) còn giữ sẵn các nhóm gộp
+    (lớp, 'all'), ('all', loại) và ('all', 'all'), nên mỗi bộ lọc chỉ là một danh sách
+    và một trang chỉ tốn một lần cắt danh sách, không phụ thuộc số tài liệu trong kho.
+    Dựng từ documents.json ở lần dùng đầu tiên; Database gọi on_document_saved sau mỗi
+    lần ghi với `since` là snapshot() chụp trước khi ghi, giống ForumListingIndex.
+    """
+
+    def __init__(self, documents_file: str, load_documents: Callable[[], List[Dict]]):
+        self.documents_file = documents_file
+        self.load_documents = load_documents
+        self._lock = threading.RLock()
+        # doc_id -> tài liệu đã chuẩn hóa
+        self._docs: Dict[str, Dict] = {}
+        self._buckets: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+        self._signature = None
+
+    def snapshot(self):
+        return file_signature(self.documents_file)
+
+    @staticmethod
+    def _bucket_names(doc: Dict) -> List[Tuple[str, str]]:
+        grade, doc_type = doc['grade'], doc['doc_type']
+        return [(grade, doc_type), (grade, ALL), (ALL, doc_type), (ALL, ALL)]
+
+    def _rebuild(self):
+        signature = self.snapshot()
+        self._docs = {}
+        self._buckets = {}
+        for doc in self.load_documents():
+            doc = normalize_document(doc)
+            self._docs[doc['id']] = doc
+            for name in self._bucket_names(doc):
+                self._buckets.setdefault(name, []).append(_doc_key(doc))
+        # Sắp xếp một lần khi dựng, sau đó chỉ chèn đúng vị trí
+        for keys in self._buckets.values():
+            keys.sort()
+        self._signature = signature
+
+    def _ensure_fresh(self):
+        if self._signature is None or self._signature != self.snapshot():
+            self._rebuild()
+
+    def _remove(self, doc_id: str):
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return
+        key = _doc_key(doc)
+        for name in self._bucket_names(doc):
+            keys = self._buckets.get(name, [])
+            index = bisect.bisect_left(keys, key)
+            if index < len(keys) and keys[index] == key:
+                del keys[index]
+
+    def _insert(self, doc: Dict):
+        doc = normalize_document(doc)
+        self._docs[doc['id']] = doc
+        key = _doc_key(doc)
+        for name in self._bucket_names(doc):
+            bisect.insort(self._buckets.setdefault(name, []), key)
+
+    def file_written(self, path: str, before, after):
+        """Ghi trễ cuối request, xem ForumSearchIndex.file_written"""
+        if path != self.documents_file:
+            return
+        with self._lock:
+            if self._signature is None:
+                return
+            self._signature = after if before is not None and self._signature == before else None
+
+    def on_document_saved(self, doc: Dict, since):
+        with self._lock:
+            if self._signature is None:
+                return
+            if since != self._signature:
+                self._signature = None
+                return
+            self._remove(doc['id'])
+            self._insert(doc)
+            self._signature = self.snapshot()
+
+    # ---- Đọc ----
+
+    def count(self, grade: str = ALL, doc_type: str = ALL) -> int:
+        with self._lock:
+            self._ensure_fresh()
+            return len(self._buckets.get((grade, doc_type), []))
+
+    def page(self, grade: str = ALL, doc_type: str = ALL, page: int = 1, per_page: int = 24) -> Dict:
+        """
+        Một trang tài liệu mới nhất trước của nhóm (grade, doc_type); 'all' là không lọc.
+        Trả về {'documents', 'page', 'pages', 'total'}; trang vượt quá thì lấy trang cuối.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            keys = self._buckets.get((grade, doc_type), [])
+            total = len(keys)
+            pages = max(1, (total + per_page - 1) // per_page)
+            page = min(max(1, page), pages)
+            end = total - (page - 1) * per_page
+            start = max(0, end - per_page)
+            documents = [dict(self._docs[doc_id]) for _, doc_id in reversed(keys[start:end])]
+            return {'documents': documents, 'page': page, 'pages': pages, 'total': total}
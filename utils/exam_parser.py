@@ -1,6 +1,8 @@
 import os
 import re
-from typing import Dict, List
+import zipfile
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
 
 from docx import Document
 
@@ -17,7 +19,8 @@ EXPLANATION_PATTERN = re.compile(r'^(giải\s*thích)\s*[:\-]\s*(.+)', re.IGNORE
 CORRECT_MARKERS = [
     '(đúng)', '(đáp án đúng)', '(correct)', '(true)', '[đúng]'
 ]
-CORRECT_MARKERS_LOWER = [marker.lower() for marker in CORRECT_MARKERS]
+# Gộp tất cả nhãn đáp án đúng vào một biểu thức để chỉ quét chuỗi một lần
+CORRECT_MARKER_PATTERN = re.compile('|'.join(re.escape(marker) for marker in CORRECT_MARKERS), re.IGNORECASE)
 
 
 def _normalize_text(text: str) -> str:
@@ -25,10 +28,7 @@ def _normalize_text(text: str) -> str:
 
 
 def _strip_correct_markers(text: str) -> str:
-    cleaned = text
-    for marker in CORRECT_MARKERS:
-        cleaned = re.sub(re.escape(marker), '', cleaned, flags=re.IGNORECASE)
-    return cleaned.strip()
+    return CORRECT_MARKER_PATTERN.sub('', text).strip()
 
 
 def _paragraph_has_underlined_letter(paragraph, letter: str) -> bool:
@@ -46,7 +46,8 @@ def _paragraph_has_underlined_letter(paragraph, letter: str) -> bool:
     return False
 
 
-def parse_docx_exam(file_path: str, allow_multiple_answers: bool = False) -> List[Dict]:
+def parse_docx_exam(file_path: str, allow_multiple_answers: bool = False,
+                    on_question: Optional[Callable[[int], None]] = None) -> List[Dict]:
     """
     Đọc file .docx và chuyển thành danh sách câu hỏi trắc nghiệm.
     Mỗi phần tử có dạng:
@@ -57,6 +58,7 @@ def parse_docx_exam(file_path: str, allow_multiple_answers: bool = False) -> Lis
         'correct_answer': 'A',
         'explanation': str
     }
+    on_question (không bắt buộc) được gọi với số câu đã đọc xong, dùng để báo tiến độ.
     """
     if not os.path.exists(file_path):
         raise ExamParseError('File đề thi không tồn tại.')
@@ -66,6 +68,128 @@ def parse_docx_exam(file_path: str, allow_multiple_answers: bool = False) -> Lis
     except Exception as exc:
         raise ExamParseError(f'Không thể mở file Word: {exc}') from exc
 
+    paragraphs = (
+        (paragraph.text, lambda letter, paragraph=paragraph: _paragraph_has_underlined_letter(paragraph, letter))
+        for paragraph in document.paragraphs
+    )
+    return _parse_paragraphs(paragraphs, allow_multiple_answers, on_question)
+
+
+def parse_docx_exam_streaming(file_path: str, allow_multiple_answers: bool = False,
+                              on_question: Optional[Callable[[int], None]] = None) -> List[Dict]:
+    """
+    Giống parse_docx_exam nhưng không dựng mô hình đối tượng của python-docx:
+    đọc word/document.xml trực tiếp từ file zip bằng parser XML tăng dần,
+    xử lý từng đoạn văn ngay khi đọc xong rồi giải phóng bộ nhớ.
+    Kết quả trả về giống hệt parse_docx_exam.
+    """
+    if not os.path.exists(file_path):
+        raise ExamParseError('File đề thi không tồn tại.')
+
+    try:
+        archive = zipfile.ZipFile(file_path)
+        document_xml = archive.open('word/document.xml')
+    except (zipfile.BadZipFile, KeyError, OSError) as exc:
+        raise ExamParseError(f'Không thể mở file Word: {exc}') from exc
+
+    with archive, document_xml:
+        try:
+            return _parse_paragraphs(_iter_body_paragraphs(document_xml), allow_multiple_answers,
+                                     on_question)
+        except ElementTree.ParseError as exc:
+            raise ExamParseError(f'Không thể mở file Word: {exc}') from exc
+
+
+_W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_W_BODY = f'{_W_NS}body'
+_W_P = f'{_W_NS}p'
+_W_R = f'{_W_NS}r'
+_W_HYPERLINK = f'{_W_NS}hyperlink'
+_W_RPR = f'{_W_NS}rPr'
+_W_U = f'{_W_NS}u'
+_W_VAL = f'{_W_NS}val'
+_W_TYPE = f'{_W_NS}type'
+_W_T = f'{_W_NS}t'
+_W_BR = f'{_W_NS}br'
+# Cách python-docx chuyển các phần tử trong run thành văn bản (Run.text)
+_RUN_CONTENT_TEXT = {
+    f'{_W_NS}tab': '\t',
+    f'{_W_NS}ptab': '\t',
+    f'{_W_NS}cr': '\n',
+    f'{_W_NS}noBreakHyphen': '-',
+}
+
+
+def _run_text(run) -> str:
+    parts = []
+    for child in run:
+        tag = child.tag
+        if tag == _W_T:
+            parts.append(child.text or '')
+        elif tag == _W_BR:
+            if child.get(_W_TYPE, 'textWrapping') == 'textWrapping':
+                parts.append('\n')
+        else:
+            text = _RUN_CONTENT_TEXT.get(tag)
+            if text:
+                parts.append(text)
+    return ''.join(parts)
+
+
+def _run_is_underlined(run) -> bool:
+    # Tương đương Run.underline của python-docx: có w:u với val khác "none"
+    rpr = run.find(_W_RPR)
+    if rpr is None:
+        return False
+    underline = rpr.find(_W_U)
+    if underline is None:
+        return False
+    value = underline.get(_W_VAL)
+    return value is not None and value != 'none'
+
+
+def _iter_body_paragraphs(xml_stream) -> Iterator[Tuple[str, Callable[[str], bool]]]:
+    """
+    Sinh (nội dung, hàm kiểm tra gạch chân) cho từng đoạn văn cấp body,
+    đúng như document.paragraphs của python-docx (bỏ qua đoạn trong bảng).
+    """
+    depth = 0
+    body = None
+    for event, element in ElementTree.iterparse(xml_stream, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 2 and element.tag == _W_BODY:
+                body = element
+            continue
+
+        depth -= 1
+        if depth != 2 or body is None:
+            continue
+
+        # Phần tử con trực tiếp của body đã đọc xong
+        if element.tag == _W_P:
+            texts = []
+            underlined_letters = set()
+            for child in element:
+                if child.tag == _W_R:
+                    run_text = _run_text(child)
+                    texts.append(run_text)
+                    stripped = run_text.strip()
+                    if stripped and _run_is_underlined(child):
+                        underlined_letters.add(stripped[0].upper())
+                elif child.tag == _W_HYPERLINK:
+                    texts.extend(_run_text(run) for run in child.findall(_W_R))
+            yield ''.join(texts), underlined_letters.__contains__
+        body.remove(element)
+
+
+def _parse_paragraphs(paragraphs: Iterable[Tuple[str, Callable[[str], bool]]],
+                      allow_multiple_answers: bool,
+                      on_question: Optional[Callable[[int], None]] = None) -> List[Dict]:
+    """
+    Máy trạng thái dùng chung cho các bộ đọc .docx.
+    paragraphs: các cặp (nội dung đoạn văn, hàm kiểm tra chữ cái lựa chọn có được gạch chân)
+    """
     questions: List[Dict] = []
     current_question: Dict = {}
 
@@ -99,9 +223,10 @@ def parse_docx_exam(file_path: str, allow_multiple_answers: bool = False) -> Lis
                 answers = answers[0]
             current_question['correct_answer'] = answers
         questions.append(current_question.copy())
+        if on_question:
+            on_question(len(questions))
 
-    for paragraph in document.paragraphs:
-        raw_text = paragraph.text
+    for raw_text, has_underlined_letter in paragraphs:
         normalized = _normalize_text(raw_text)
         if not normalized:
             continue
@@ -147,10 +272,9 @@ def parse_docx_exam(file_path: str, allow_multiple_answers: bool = False) -> Lis
         if option_match and current_question:
             letter = option_match.group(1).upper()
             option_text = option_match.group(2).strip()
-            option_text_lower = option_text.lower()
-            is_marked_correct = any(marker in option_text_lower for marker in CORRECT_MARKERS_LOWER)
+            is_marked_correct = CORRECT_MARKER_PATTERN.search(option_text) is not None
 
-            if _paragraph_has_underlined_letter(paragraph, letter):
+            if has_underlined_letter(letter):
                 is_marked_correct = True
 
             cleaned_text = _strip_correct_markers(option_text)
@@ -181,3 +305,48 @@ def parse_docx_exam(file_path: str, allow_multiple_answers: bool = False) -> Lis
         raise ExamParseError('Không tìm thấy câu hỏi trắc nghiệm hợp lệ trong file.')
 
     return questions
+
+
+def normalize_exam_questions(parsed_questions: List[Dict], allow_multiple_answers: bool) -> List[Dict]:
+    """
+    Kiểm tra lại kết quả parser và chuyển sang định dạng câu hỏi lưu trong lop{grade}.json.
+    Phát sinh ExamParseError với thông báo cho giáo viên nếu có câu không hợp lệ.
+    """
+    if not parsed_questions:
+        raise ExamParseError('Không tìm thấy câu hỏi trắc nghiệm nào trong file.')
+
+    questions = []
+    for idx, item in enumerate(parsed_questions, start=1):
+        options = item.get('options', {})
+        correct_answer = item.get('correct_answer')
+
+        if not options or len(options) < 2:
+            raise ExamParseError(f'Câu {item.get("number", idx)} không có đủ lựa chọn.')
+
+        if allow_multiple_answers:
+            if isinstance(correct_answer, list):
+                valid_answers = [ans for ans in correct_answer if ans in options]
+            else:
+                valid_answers = [correct_answer] if correct_answer in options else []
+            if not valid_answers:
+                raise ExamParseError(f'Không xác định được đáp án đúng cho câu {item.get("number", idx)}.')
+            normalized_correct = valid_answers if len(valid_answers) > 1 else valid_answers[0]
+        else:
+            if isinstance(correct_answer, list):
+                # Ưu tiên lấy đáp án đầu tiên nếu parser trả về list
+                correct_value = correct_answer[0] if correct_answer else None
+            else:
+                correct_value = correct_answer
+            if not correct_value or correct_value not in options:
+                raise ExamParseError(f'Không xác định được đáp án đúng cho câu {item.get("number", idx)}.')
+            normalized_correct = correct_value
+
+        questions.append({
+            'id': item.get('number', idx),
+            'number': item.get('number', idx),
+            'question': item.get('question', '').strip(),
+            'options': options,
+            'correct_answer': normalized_correct,
+            'explanation': item.get('explanation', '').strip()
+        })
+    return questions
@@ -0,0 +1,78 @@
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.search_index import file_signature
+
+# Trường của câu hỏi không được gửi xuống trang làm bài
+ANSWER_KEY_FIELDS = ('correct_answer',)
+
+
+def public_question(question: Dict) -> Dict:
+    return {key: value for key, value in question.items() if key not in ANSWER_KEY_FIELDS}
+
+
+def _course_exercises(course: Dict, lessons: List[Dict]) -> List[Dict]:
+    exercises = []
+    for lesson in lessons:
+        questions = lesson.get('questions', [])
+        if questions:
+            exercises.append({
+                'course_id': course['id'],
+                'course_title': course['title'],
+                'lesson_id': lesson['id'],
+                'lesson_title': lesson.get('title', ''),
+                'questions': [public_question(q) for q in questions]
+            })
+    return exercises
+
+
+class ExerciseCatalog:
+    """
+    Danh sách bài tập (bài học có câu hỏi) của mọi khóa học, dựng sẵn cho trang /exercises.
+    Khi courses.json đổi, chỉ đọc lại file bài học của các khóa học có bản ghi danh mục thay
+    đổi (create_course/update_course luôn ghi lại danh mục cùng với file bài học).
+    Câu hỏi được bỏ đáp án (ANSWER_KEY_FIELDS) vì danh sách này được gửi xuống trình duyệt.
+    """
+
+    def __init__(self, courses_file: str, load_courses: Callable[[], List[Dict]],
+                 load_lessons: Callable[[str], Optional[List[Dict]]]):
+        self.courses_file = courses_file
+        self.load_courses = load_courses
+        self.load_lessons = load_lessons
+        self._lock = threading.RLock()
+        # course_id -> (bản ghi danh mục lúc dựng, các bài tập của khóa học)
+        self._courses: Dict[str, Tuple[Dict, List[Dict]]] = {}
+        self._exercises: List[Dict] = []
+        self._by_lesson: Dict[Tuple[str, str], Dict] = {}
+        self._signature = None
+
+    def _sync(self):
+        signature = file_signature(self.courses_file)
+        courses = {}
+        for course in self.load_courses():
+            previous = self._courses.get(course['id'])
+            if previous is not None and previous[0] == course:
+                courses[course['id']] = previous
+            else:
+                lessons = self.load_lessons(course['id'])
+                if lessons is None:
+                    lessons = course.get('lessons', [])
+                courses[course['id']] = (dict(course), _course_exercises(course, lessons))
+        self._courses = courses
+        self._exercises = [exercise for _, exercises in courses.values() for exercise in exercises]
+        self._by_lesson = {(e['course_id'], e['lesson_id']): e for e in self._exercises}
+        self._signature = signature
+
+    def _ensure_fresh(self):
+        if self._signature is None or self._signature != file_signature(self.courses_file):
+            self._sync()
+
+    def exercises(self) -> List[Dict]:
+        with self._lock:
+            self._ensure_fresh()
+            return list(self._exercises)
+
+    def get(self, course_id: str, lesson_id: str) -> Optional[Dict]:
+        with self._lock:
+            self._ensure_fresh()
+            return self._by_lesson.get((course_id, lesson_id))
@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Dict
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khóa được giữa các luồng trong tiến trình
+    fcntl = None
+
+
+class FileLocks:
+    """
+    Khóa theo từng file dữ liệu để các lần đọc-sửa-ghi cùng một file chạy lần lượt:
+    - Giữa các luồng (request, tác vụ nền, job import): threading.RLock của file đó,
+      nên một luồng đang giữ khóa vẫn gọi được hàm khác cũng khóa file này
+    - Giữa các tiến trình (nhiều worker gunicorn): fcntl.flock trên file khóa trong lock_dir
+    hold(a, b) khóa nhiều file theo thứ tự tên để hai luồng khóa cùng các file không chờ nhau mãi.
+    """
+
+    def __init__(self, lock_dir: str):
+        self.lock_dir = lock_dir
+        self._guard = threading.Lock()
+        self._locks: Dict[str, threading.RLock] = {}
+        # path -> (số lần luồng đang giữ khóa đã vào, file khóa đang flock); chỉ luồng giữ RLock sửa
+        self._held: Dict[str, tuple] = {}
+
+    def _lock_for(self, path: str) -> threading.RLock:
+        with self._guard:
+            lock = self._locks.get(path)
+            if lock is None:
+                lock = self._locks[path] = threading.RLock()
+            return lock
+
+    def _lock_path(self, path: str) -> str:
+        name = os.path.normpath(path).replace(os.sep, '_').replace(':', '_')
+        return os.path.join(self.lock_dir, f'{name}.lock')
+
+    @contextmanager
+    def _hold_one(self, path: str):
+        with self._lock_for(path):
+            depth, handle = self._held.get(path, (0, None))
+            if depth == 0 and fcntl is not None:
+                os.makedirs(self.lock_dir, exist_ok=True)
+                handle = open(self._lock_path(path), 'a')
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            self._held[path] = (depth + 1, handle)
+            try:
+                yield
+            finally:
+                if depth == 0:
+                    del self._held[path]
+                    if handle is not None:
+                        fcntl.flock(handle, fcntl.LOCK_UN)
+                        handle.close()
+                else:
+                    self._held[path] = (depth, handle)
+
+    @contextmanager
+    def hold(self, *paths: str):
+        with ExitStack() as stack:
+            for path in sorted(set(os.path.normpath(path) for path in paths)):
+                stack.enter_context(self._hold_one(path))
+            yield
+
+
+# Dùng chung cho Database và utils.auth (cùng ghi vào data/)
+file_locks = FileLocks('data/cache/locks')
+
+
+def atomic_write_json(path: str, data, text: str = None):
+    """
+    Ghi file JSON qua file tạm rồi os.replace: người đọc chỉ thấy file cũ hoặc file mới
+    đầy đủ, không bao giờ thấy file ghi dở. text: nội dung đã tuần tự hóa sẵn (nếu có).
+    """
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            if text is None:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            else:
+                f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
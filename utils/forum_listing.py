@@ -0,0 +1,232 @@
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.search_index import file_signature
+
+# Độ dài đoạn trích nội dung hiển thị trong danh sách
+EXCERPT_LENGTH = 200
+
+
+def tag_key(tag) -> str:
+    """Khóa của thẻ: bỏ khoảng trắng thừa, không phân biệt hoa thường ('Python ' và 'python' là một)"""
+    return ' '.join(str(tag).split()).lower()
+
+
+def _post_key(post: Dict) -> Tuple[str, str]:
+    return post.get('created_at') or '', post['id']
+
+
+def encode_cursor(key: Tuple[str, str]) -> str:
+    return f'{key[0]}|{key[1]}'
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Con trỏ không hợp lệ coi như không có (về trang đầu)"""
+    if not cursor or '|' not in cursor:
+        return None
+    created_at, post_id = cursor.split('|', 1)
+    return created_at, post_id
+
+
+def project_post(post: Dict) -> Dict:
+    """Bản rút gọn của bài viết cho trang danh sách; nội dung đầy đủ chỉ đọc ở trang chi tiết"""
+    content = post.get('content') or ''
+    return {
+        'id': post['id'],
+        'title': post.get('title', ''),
+        'excerpt': content[:EXCERPT_LENGTH] + ('...' if len(content) > EXCERPT_LENGTH else ''),
+        'author_id': post.get('author_id'),
+        'author_name': post.get('author_name', ''),
+        'author_role': post.get('author_role', 'student'),
+        'created_at': post.get('created_at') or '',
+        'updated_at': post.get('updated_at'),
+        'tags': list(post.get('tags') or []),
+        'views': post.get('views', 0),
+        'comments_count': post.get('comments_count', 0),
+        'attachments_count': len(post.get('attachments') or [])
+    }
+
+
+def _post_tags(post: Dict) -> List[str]:
+    return list(dict.fromkeys(key for key in (tag_key(tag) for tag in post.get('tags') or []) if key))
+
+
+class ForumListingIndex:
+    """
+    Chỉ mục liệt kê bài viết diễn đàn, luôn giữ thứ tự theo (created_at, id):
+    - toàn bộ bài viết, thẻ -> bài viết, tác giả -> bài viết (danh sách đã sắp xếp)
+    - số bài viết của mỗi thẻ (đám mây thẻ) là độ dài danh sách của thẻ đó
+    - chỉ giữ bản rút gọn (project_post) của mỗi bài viết; phân trang bằng con trỏ
+      (created_at, id) nên mỗi trang chỉ tốn một lần tìm nhị phân và `limit` bài viết
+    Dựng từ forum_posts.json ở lần dùng đầu tiên; sau đó Database gọi on_post_saved /
+    on_post_deleted sau mỗi lần ghi với `since` là snapshot() chụp trước khi ghi,
+    giống ForumSearchIndex: nếu chỉ mục đã lệch với file thì dựng lại ở lần đọc sau.
+    """
+
+    def __init__(self, posts_file: str, load_posts: Callable[[], List[Dict]]):
+        self.posts_file = posts_file
+        self.load_posts = load_posts
+        self._lock = threading.RLock()
+        # post_id -> bản rút gọn
+        self._posts: Dict[str, Dict] = {}
+        self._all: List[Tuple[str, str]] = []
+        self._by_tag: Dict[str, List[Tuple[str, str]]] = {}
+        self._by_author: Dict[str, List[Tuple[str, str]]] = {}
+        # Cách viết thẻ hiển thị trên đám mây thẻ (lần đầu gặp)
+        self._tag_labels: Dict[str, str] = {}
+        self._signature = None
+
+    def snapshot(self):
+        return file_signature(self.posts_file)
+
+    def _rebuild(self):
+        signature = self.snapshot()
+        self._posts = {}
+        self._by_tag = {}
+        self._by_author = {}
+        self._tag_labels = {}
+        for post in self.load_posts():
+            key = _post_key(post)
+            self._posts[post['id']] = project_post(post)
+            self._by_author.setdefault(post.get('author_id'), []).append(key)
+            for tag in post.get('tags') or []:
+                self._tag_labels.setdefault(tag_key(tag), str(tag).strip())
+            for tag in _post_tags(post):
+                self._by_tag.setdefault(tag, []).append(key)
+        # Sắp xếp một lần khi dựng, sau đó chỉ chèn/xóa đúng vị trí
+        self._all = sorted(_post_key(post) for post in self._posts.values())
+        for keys in list(self._by_tag.values()) + list(self._by_author.values()):
+            keys.sort()
+        self._signature = signature
+
+    def _ensure_fresh(self):
+        if self._signature is None or self._signature != self.snapshot():
+            self._rebuild()
+
+    @staticmethod
+    def _insort(keys: List, key):
+        index = bisect.bisect_left(keys, key)
+        if index == len(keys) or keys[index] != key:
+            keys.insert(index, key)
+
+    @staticmethod
+    def _discard(group: Dict[str, List], name, key):
+        keys = group.get(name)
+        if keys is None:
+            return
+        index = bisect.bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            del keys[index]
+        if not keys:
+            del group[name]
+
+    def _insert(self, post: Dict):
+        key = _post_key(post)
+        self._posts[post['id']] = project_post(post)
+        self._insort(self._all, key)
+        self._insort(self._by_author.setdefault(post.get('author_id'), []), key)
+        for tag in post.get('tags') or []:
+            self._tag_labels.setdefault(tag_key(tag), str(tag).strip())
+        for tag in _post_tags(post):
+            self._insort(self._by_tag.setdefault(tag, []), key)
+
+    def _remove(self, post_id: str):
+        post = self._posts.pop(post_id, None)
+        if post is None:
+            return
+        key = _post_key(post)
+        index = bisect.bisect_left(self._all, key)
+        if index < len(self._all) and self._all[index] == key:
+            del self._all[index]
+        self._discard(self._by_author, post.get('author_id'), key)
+        for tag in _post_tags(post):
+            self._discard(self._by_tag, tag, key)
+            if tag not in self._by_tag:
+                self._tag_labels.pop(tag, None)
+
+    def _apply(self, since, change: Callable[[], None]):
+        with self._lock:
+            if self._signature is None:
+                return
+            if since != self._signature:
+                self._signature = None
+                return
+            change()
+            self._signature = self.snapshot()
+
+    def file_written(self, path: str, before, after):
+        """Ghi trễ cuối request, xem ForumSearchIndex.file_written"""
+        if path != self.posts_file:
+            return
+        with self._lock:
+            if self._signature is None:
+                return
+            self._signature = after if before is not None and self._signature == before else None
+
+    # ---- Cập nhật từ Database ----
+
+    def on_post_saved(self, post: Dict, since):
+        def change():
+            previous = self._posts.get(post['id'])
+            if (previous is not None and _post_key(previous) == _post_key(post)
+                    and previous.get('author_id') == post.get('author_id')
+                    and _post_tags(previous) == _post_tags(post)):
+                # Thứ tự và các nhóm không đổi (lượt xem, số bình luận, nội dung)
+                self._posts[post['id']] = project_post(post)
+                return
+            self._remove(post['id'])
+            self._insert(post)
+        self._apply(since, change)
+
+    def on_post_deleted(self, post_id: str, since):
+        self._apply(since, lambda: self._remove(post_id))
+
+    # ---- Đọc ----
+
+    def _keys(self, tag: Optional[str], author_id: Optional[str]) -> List[Tuple[str, str]]:
+        if tag is not None:
+            return self._by_tag.get(tag_key(tag), [])
+        if author_id is not None:
+            return self._by_author.get(author_id, [])
+        return self._all
+
+    def posts(self, tag: Optional[str] = None, author_id: Optional[str] = None) -> List[Dict]:
+        """Bản rút gọn của mọi bài viết, mới nhất trước, lọc theo thẻ hoặc tác giả nếu có"""
+        with self._lock:
+            self._ensure_fresh()
+            return [dict(self._posts[post_id]) for _, post_id in reversed(self._keys(tag, author_id))]
+
+    def page(self, tag: Optional[str] = None, author_id: Optional[str] = None,
+             before: Optional[str] = None, after: Optional[str] = None, limit: int = 20) -> Dict:
+        """
+        Một trang bài viết mới nhất trước, phân trang bằng con trỏ:
+        - before: các bài cũ hơn con trỏ (trang sau), after: các bài mới hơn (trang trước)
+        Trả về {'posts', 'older', 'newer'}; older/newer là con trỏ của trang kế, None nếu hết.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            keys = self._keys(tag, author_id)
+            before_key, after_key = decode_cursor(before), decode_cursor(after)
+            if after_key is not None:
+                start = bisect.bisect_right(keys, after_key)
+                end = min(len(keys), start + limit)
+            else:
+                end = bisect.bisect_left(keys, before_key) if before_key is not None else len(keys)
+                start = max(0, end - limit)
+            page_keys = keys[start:end]
+            posts = [dict(self._posts[post_id]) for _, post_id in reversed(page_keys)]
+            return {
+                'posts': posts,
+                'older': encode_cursor(page_keys[0]) if page_keys and start > 0 else None,
+                'newer': encode_cursor(page_keys[-1]) if page_keys and end < len(keys) else None
+            }
+
+    def tag_cloud(self, limit: int = 30) -> List[Dict]:
+        """Các thẻ nhiều bài viết nhất: [{'tag', 'key', 'count'}]"""
+        with self._lock:
+            self._ensure_fresh()
+            counts = sorted(((len(keys), tag) for tag, keys in self._by_tag.items()),
+                            key=lambda item: (-item[0], item[1]))
+            return [{'tag': self._tag_labels.get(tag, tag), 'key': tag, 'count': count}
+                    for count, tag in counts[:limit]]
@@ -0,0 +1,165 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+from utils.forum_listing import project_post
+from utils.search_index import InvertedIndex, file_signature, parse_query
+
+# Tiêu đề quan trọng hơn nội dung, bình luận ít quan trọng nhất
+FORUM_FIELD_WEIGHTS = {'title': 3.0, 'tags': 2.0, 'content': 1.0, 'comments': 0.5}
+
+
+class ForumSearchIndex:
+    """
+    Chỉ mục tìm kiếm bài viết diễn đàn (tiêu đề, thẻ, nội dung và bình luận).
+    - Dựng từ forum_posts.json/forum_comments.json ở lần tìm kiếm đầu tiên
+    - Database gọi các hàm on_* sau mỗi lần ghi để cập nhật từng bài viết;
+      `since` là snapshot() chụp trước khi ghi. Nếu lúc đó chỉ mục đã lệch với
+      file (tiến trình khác vừa ghi) thì đánh dấu cần dựng lại thay vì cập nhật
+    - Giữ kết quả đã xếp hạng của các truy vấn gần đây để chuyển trang và truy vấn
+      phổ biến không phải tính điểm lại; xóa khi nội dung được đánh chỉ mục thay đổi
+    """
+
+    def __init__(self, posts_file: str, comments_file: str,
+                 load_posts: Callable[[], List[Dict]], load_comments: Callable[[], List[Dict]],
+                 max_cached_queries: int = 128):
+        self.posts_file = posts_file
+        self.comments_file = comments_file
+        self.load_posts = load_posts
+        self.load_comments = load_comments
+        self.index = InvertedIndex(FORUM_FIELD_WEIGHTS)
+        self._lock = threading.RLock()
+        self._posts: Dict[str, Dict] = {}
+        self._created_at: Dict[str, str] = {}
+        self._comments: Dict[str, Dict[str, str]] = {}
+        self._signature = None
+        self._ranked_cache = OrderedDict()
+        self.max_cached_queries = max_cached_queries
+
+    def snapshot(self):
+        return file_signature(self.posts_file), file_signature(self.comments_file)
+
+    def _rebuild(self):
+        self.index.clear()
+        self._ranked_cache.clear()
+        self._posts = {}
+        self._created_at = {}
+        self._comments = {}
+        signature = self.snapshot()
+        for comment in self.load_comments():
+            self._comments.setdefault(comment['post_id'], {})[comment['id']] = comment.get('content', '')
+        for post in self.load_posts():
+            self._index_post(post)
+        self._signature = signature
+
+    def _ensure_fresh(self):
+        if self._signature is None or self._signature != self.snapshot():
+            self._rebuild()
+
+    def _index_post(self, post: Dict):
+        self._ranked_cache.clear()
+        self._posts[post['id']] = post
+        self._created_at[post['id']] = post.get('created_at', '')
+        self.index.add(post['id'], {
+            'title': post.get('title', ''),
+            'tags': post.get('tags') or [],
+            'content': post.get('content', ''),
+            'comments': list(self._comments.get(post['id'], {}).values())
+        })
+
+    def _apply(self, since, change: Callable[[], None]):
+        with self._lock:
+            if self._signature is None:
+                return
+            if since != self._signature:
+                self._signature = None
+                return
+            change()
+            self._signature = self.snapshot()
+
+    def file_written(self, path: str, before, after):
+        """
+        Database vừa ghi trễ `path` (cuối request) với dữ liệu mà các hàm on_* đã áp vào
+        chỉ mục: nhận chữ ký mới nếu file chưa bị ai khác đổi, ngược lại dựng lại.
+        before=None: các thay đổi đã bị bỏ, chỉ mục phải dựng lại.
+        """
+        files = (self.posts_file, self.comments_file)
+        if path not in files:
+            return
+        with self._lock:
+            if self._signature is None:
+                return
+            position = files.index(path)
+            signature = list(self._signature)
+            if before is None or signature[position] != before:
+                self._signature = None
+                return
+            signature[position] = after
+            self._signature = tuple(signature)
+
+    # ---- Cập nhật từ Database ----
+
+    def on_post_saved(self, post: Dict, since):
+        def change():
+            previous = self._posts.get(post['id'])
+            text_changed = previous is None or any(
+                previous.get(key) != post.get(key) for key in ('title', 'content', 'tags'))
+            if text_changed:
+                self._index_post(post)
+            else:
+                # Chỉ đổi lượt xem / số bình luận -> không cần tách từ lại
+                self._posts[post['id']] = post
+        self._apply(since, change)
+
+    def on_post_deleted(self, post_id: str, since):
+        def change():
+            self._posts.pop(post_id, None)
+            self._created_at.pop(post_id, None)
+            self._comments.pop(post_id, None)
+            self.index.remove(post_id)
+            self._ranked_cache.clear()
+        self._apply(since, change)
+
+    def on_comment_added(self, comment: Dict, since):
+        def change():
+            self._comments.setdefault(comment['post_id'], {})[comment['id']] = comment.get('content', '')
+            if comment['post_id'] in self._posts:
+                self._index_post(self._posts[comment['post_id']])
+        self._apply(since, change)
+
+    def on_comment_deleted(self, comment: Dict, since):
+        def change():
+            self._comments.get(comment['post_id'], {}).pop(comment['id'], None)
+            if comment['post_id'] in self._posts:
+                self._index_post(self._posts[comment['post_id']])
+        self._apply(since, change)
+
+    # ---- Tìm kiếm ----
+
+    def search(self, query: str, page: int = 1, per_page: int = 20) -> Dict:
+        """
+        Trả về {'posts', 'total', 'page', 'pages'}; bài viết (bản rút gọn như trang danh sách)
+        xếp theo BM25, cùng điểm thì mới hơn trước
+        """
+        page = max(1, page)
+        with self._lock:
+            self._ensure_fresh()
+            terms, phrases = parse_query(query)
+            cache_key = (tuple(terms), tuple(tuple(phrase) for phrase in phrases))
+            ranked = self._ranked_cache.get(cache_key)
+            if ranked is None:
+                ranked = [post_id for post_id, _ in self.index.rank(query, tie_breaker=self._created_at.get)]
+                self._ranked_cache[cache_key] = ranked
+                if len(self._ranked_cache) > self.max_cached_queries:
+                    self._ranked_cache.popitem(last=False)
+            else:
+                self._ranked_cache.move_to_end(cache_key)
+            total = len(ranked)
+            start = (page - 1) * per_page
+            posts = [project_post(self._posts[post_id]) for post_id in ranked[start:start + per_page]]
+        return {
+            'posts': posts,
+            'total': total,
+            'page': page,
+            'pages': max(1, -(-total // per_page))
+        }
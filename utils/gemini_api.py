@@ -1,46 +1,48 @@
 import os
-import re
 
-import google.generativeai as genai
+from utils.chat_cache import ChatResponseCache
+from utils.concurrency import BusyError, ConcurrencyLimiter, KeyedFileLock, SingleFlight
+from utils.markdown_stripper import strip_markdown
+from utils.model_backends import create_backend_from_env
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Backend sinh câu trả lời: Gemini thật hoặc server giả lập (GEMINI_BACKEND=http)
+backend = create_backend_from_env()
 
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+NOT_CONFIGURED_MESSAGE = "Xin lỗi, dịch vụ AI chưa được cấu hình. Vui lòng liên hệ quản trị viên để bổ sung GEMINI_API_KEY."
 
-def remove_markdown_formatting(text):
-    """
-    Loại bỏ các ký tự định dạng Markdown
-    """
-
-    text = re.sub(r'#+\s*', '', text)
-    
-
-    text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)
-    text = re.sub(r'\*(.+?)\*', r'\1', text)
+def set_backend(new_backend):
+    """Thay backend đang dùng (phục vụ kiểm thử và benchmark)"""
+    global backend
+    backend = new_backend
 
-    text = re.sub(r'__(.+?)__', r'\1', text)
-    text = re.sub(r'_(.+?)_', r'\1', text)
-    
+# Cache câu trả lời cho các câu hỏi lặp lại (khóa theo câu hỏi đã chuẩn hóa)
+response_cache = ChatResponseCache(
+    os.getenv("CHAT_CACHE_FILE", "data/cache/chat_responses.json"),
+    max_entries=int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1000")),
+    ttl_seconds=int(os.getenv("CHAT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+)
 
-    text = re.sub(r'```[\w]*\n?', '', text)
-    text = re.sub(r'```', '', text)
-    
-   
-    text = re.sub(r'`(.+?)`', r'\1', text)
-    
-    return text.strip()
+# Giới hạn số lời gọi Gemini đồng thời của mọi worker trên máy (slot khóa file trong
+# GEMINI_SLOT_DIR), để các worker còn lại rảnh phục vụ phần còn lại của website khi
+# chatbot bị dồn yêu cầu
+GEMINI_WAIT_TIMEOUT = float(os.getenv("GEMINI_WAIT_TIMEOUT", "30"))
+gemini_limiter = ConcurrencyLimiter(
+    int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")),
+    wait_timeout=float(os.getenv("GEMINI_QUEUE_TIMEOUT", "5")),
+    slot_dir=os.getenv("GEMINI_SLOT_DIR", "data/cache/gemini_slots")
+)
+# Gộp các câu hỏi trùng đang chờ Gemini: SingleFlight trong một tiến trình, khóa file theo câu
+# hỏi đã chuẩn hóa giữa các worker gunicorn (mỗi worker đồng bộ chỉ chạy một request)
+inflight_calls = SingleFlight()
+inflight_locks = KeyedFileLock(os.path.join(os.getenv("GEMINI_SLOT_DIR", "data/cache/gemini_slots"), "inflight"))
 
-def chat_with_gemini(user_message):
+def remove_markdown_formatting(text):
     """
-    Gửi tin nhắn đến Gemini AI và nhận phản hồi
+    Loại bỏ các ký tự định dạng Markdown
     """
-    if not GEMINI_API_KEY:
-        return "Xin lỗi, dịch vụ AI chưa được cấu hình. Vui lòng liên hệ quản trị viên để bổ sung GEMINI_API_KEY."
-    try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        system_prompt = """
+    return strip_markdown(text)
+
+SYSTEM_PROMPT = """
         Bạn là trợ lý AI cho học sinh THPT ôn thi môn Tin học.
         Nhiệm vụ của bạn là:
         - Giải đáp thắc mắc về lập trình, thuật toán, cấu trúc dữ liệu
@@ -55,15 +57,61 @@ def chat_with_gemini(user_message):
         - Dấu ` cho inline code
         Chỉ viết văn bản bình thường, dễ đọc.
         """
-        
-        full_prompt = f"{system_prompt}\n\nCâu hỏi của học sinh: {user_message}"
-        
-        response = model.generate_content(full_prompt)
-        
-        clean_text = remove_markdown_formatting(response.text)
-        
-        return clean_text
+
+CONTEXT_SYSTEM_INSTRUCTION = """
+            Bạn là trợ lý AI cho học sinh THPT ôn thi môn Tin học.
+            Trả lời bằng văn bản thuần túy, KHÔNG sử dụng ký tự định dạng Markdown như #, **, *, ```.
+            Chỉ viết văn bản bình thường, dễ đọc.
+            """
+
+BUSY_MESSAGE = "Xin lỗi, trợ lý AI đang quá tải. Vui lòng thử lại sau ít phút."
+
+def _generate_answer(user_message):
+    """
+    Gọi backend trong giới hạn số lời gọi đồng thời, làm sạch và lưu cache
+    """
+    full_prompt = f"{SYSTEM_PROMPT}\n\nCâu hỏi của học sinh: {user_message}"
+    with gemini_limiter:
+        response_text = backend.generate(full_prompt)
+
+    clean_text = remove_markdown_formatting(response_text)
     
+    # Chỉ cache câu trả lời thành công, không cache thông báo lỗi
+    response_cache.set(user_message, clean_text)
+    
+    return clean_text
+
+def _generate_once(user_message, key):
+    """
+    Chỉ một worker gọi Gemini cho mỗi câu hỏi: worker đến sau chờ khóa của câu hỏi rồi đọc
+    lại cache (response_cache nạp các mục worker khác vừa lưu)
+    """
+    handle = inflight_locks.acquire(key, GEMINI_WAIT_TIMEOUT)
+    try:
+        cached = response_cache.get(user_message)
+        if cached is not None:
+            return cached
+        return _generate_answer(user_message)
+    finally:
+        inflight_locks.release(handle)
+
+def chat_with_gemini(user_message):
+    """
+    Gửi tin nhắn đến Gemini AI và nhận phản hồi
+    """
+    if not backend.is_configured():
+        return NOT_CONFIGURED_MESSAGE
+
+    cached = response_cache.get(user_message)
+    if cached is not None:
+        return cached
+
+    # Các câu hỏi giống nhau gửi cùng lúc chỉ tạo một lời gọi lên Gemini
+    key = response_cache.make_key(user_message) or user_message
+    try:
+        return inflight_calls.do(key, lambda: _generate_once(user_message, key), timeout=GEMINI_WAIT_TIMEOUT)
+    except BusyError:
+        return BUSY_MESSAGE
     except Exception as e:
         return f"Xin lỗi, có lỗi xảy ra: {str(e)}"
 
@@ -72,41 +120,30 @@ def chat_with_context(user_message, chat_history=[]):
     Chat với context (lịch sử hội thoại)
     chat_history: [{'role': 'user', 'content': '...'}, {'role': 'assistant', 'content': '...'}]
     """
-    if not GEMINI_API_KEY:
-        return "Xin lỗi, dịch vụ AI chưa được cấu hình. Vui lòng liên hệ quản trị viên để bổ sung GEMINI_API_KEY."
+    if not backend.is_configured():
+        return NOT_CONFIGURED_MESSAGE
     try:
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash-exp',
-            generation_config={
-                'temperature': 0.7,
-            },
-            system_instruction="""
-            Bạn là trợ lý AI cho học sinh THPT ôn thi môn Tin học.
-            Trả lời bằng văn bản thuần túy, KHÔNG sử dụng ký tự định dạng Markdown như #, **, *, ```.
-            Chỉ viết văn bản bình thường, dễ đọc.
-            """
-        )
+        with gemini_limiter:
+            response_text = backend.chat(
+                user_message,
+                chat_history,
+                system_instruction=CONTEXT_SYSTEM_INSTRUCTION,
+                temperature=0.7
+            )
         
-
-        chat = model.start_chat(history=[])
-        
-
-        for msg in chat_history:
-            if msg['role'] == 'user':
-                chat.send_message(msg['content'])
-        
-
-        response = chat.send_message(user_message)
-        
-
-        clean_text = remove_markdown_formatting(response.text)
+        clean_text = remove_markdown_formatting(response_text)
         
         return clean_text
     
+    except BusyError:
+        return BUSY_MESSAGE
     except Exception as e:
         return f"Xin lỗi, có lỗi xảy ra: {str(e)}"
 
 # Test
+# Chạy offline với server giả lập:
+#   python scripts/fake_gemini_server.py &
+#   GEMINI_BACKEND=http python -m utils.gemini_api
 if __name__ == "__main__":
     print("=== Test chat_with_gemini ===")
     response1 = chat_with_gemini("Giải thích thuật toán sắp xếp nổi bọt")
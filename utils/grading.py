@@ -0,0 +1,48 @@
+import hashlib
+import json
+from typing import Dict, List
+
+
+def normalize_answer_token(value):
+    if value is None:
+        return ''
+    token = str(value).strip()
+    if not token:
+        return ''
+    token = token.split('.')[0]
+    return token.strip().upper()
+
+
+def normalize_correct_answers(value):
+    if isinstance(value, list):
+        tokens = {normalize_answer_token(v) for v in value}
+        return {t for t in tokens if t}
+    token = normalize_answer_token(value)
+    return {token} if token else set()
+
+
+def answer_key_version(questions: List[Dict]) -> str:
+    """
+    Phiên bản đáp án của một bài học: đổi khi số câu hỏi hoặc đáp án đúng của câu nào đó đổi,
+    không đổi khi chỉ sửa lời câu hỏi. Bài nộp chấm theo phiên bản khác là cần chấm lại.
+    """
+    key = [sorted(normalize_correct_answers(q.get('correct_answer'))) for q in questions]
+    return hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()[:12]
+
+
+def grade_exercise(questions: List[Dict], answers: Dict) -> Dict:
+    """Chấm bài tập của bài học: answers là {'0': 'A. ...', '1': ...} theo thứ tự câu hỏi"""
+    correct = 0
+    total = len(questions)
+    
+    for i, q in enumerate(questions):
+        user_choice = normalize_answer_token(answers.get(str(i), ''))
+        if user_choice and user_choice in normalize_correct_answers(q.get('correct_answer')):
+            correct += 1
+    
+    return {
+        'score': round((correct / total * 100) if total > 0 else 0, 1),
+        'correct': correct,
+        'total': total,
+        'answer_key_version': answer_key_version(questions)
+    }
@@ -0,0 +1,39 @@
+import os
+from typing import Callable, Iterable
+
+from utils.file_lock import atomic_write_json, file_locks
+
+SEQUENCE_DIR = 'data/cache/sequences'
+
+
+def max_id_number(ids: Iterable, prefix: str = '') -> int:
+    """Số lớn nhất trong các id dạng <prefix><số> ('post_0012' -> 12); 0 nếu không có"""
+    largest = 0
+    for value in ids:
+        value = str(value)
+        suffix = value[len(prefix):]
+        if value.startswith(prefix) and suffix.isdigit():
+            largest = max(largest, int(suffix))
+    return largest
+
+
+def next_id_number(name: str, current_max: Callable[[], int]) -> int:
+    """
+    Cấp số thứ tự tiếp theo cho id của tập `name` (ví dụ 'forum_posts.json').
+    Trước đây id là len(danh sách) + 1 tính trên dữ liệu request đã đọc, nên hai request
+    chạy chồng nhau (hoặc tạo sau khi xóa) nhận cùng một id. Bộ đếm nằm trong SEQUENCE_DIR,
+    tăng dưới khóa file dùng chung cho mọi luồng và tiến trình, nên không cấp trùng.
+    current_max(): số lớn nhất đang có trong file dữ liệu (đọc lại từ đĩa), chỉ gọi khi
+    chưa có bộ đếm (lần đầu, hoặc data/cache bị xóa).
+    """
+    path = os.path.join(SEQUENCE_DIR, f'{name}.seq')
+    with file_locks.hold(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                current = int(f.read().strip())
+        except (OSError, ValueError):
+            current = current_max()
+        current += 1
+        os.makedirs(SEQUENCE_DIR, exist_ok=True)
+        atomic_write_json(path, None, text=str(current))
+    return current
@@ -0,0 +1,398 @@
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from utils.exam_parser import ExamParseError, normalize_exam_questions, parse_docx_exam_streaming
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+FINISHED_STATUSES = {JOB_DONE, JOB_FAILED}
+
+JOB_KIND_SINGLE = 'single'
+JOB_KIND_BULK = 'bulk'
+
+INTERRUPTED_MESSAGE = 'Máy chủ đã khởi động lại khi đang import, vui lòng tải file lên lại.'
+
+# Giới hạn cho file zip import hàng loạt (tránh zip bomb)
+MAX_BULK_FILES = 200
+MAX_BULK_MEMBER_SIZE = 20 * 1024 * 1024
+
+
+def build_exam_record(grade: str, title: str, description: str, time_limit: int,
+                      questions: List[Dict], allow_multiple: bool) -> Dict:
+    """Tạo bản ghi đề thi để lưu vào lop{grade}.json"""
+    return {
+        'id': f"exam_{grade}_{uuid.uuid4().hex[:6]}",
+        'title': title,
+        'description': description,
+        'time_limit': time_limit,
+        'questions': questions,
+        'allow_multiple_answers': allow_multiple,
+        'created_at': datetime.now().isoformat()
+    }
+
+
+def parse_exam_file(file_path: str, allow_multiple: bool):
+    """
+    Đọc và kiểm tra một file đề, trả về (danh sách câu hỏi, None) hoặc (None, thông báo lỗi).
+    Hàm ở cấp module để chạy được trong ProcessPoolExecutor.
+    """
+    try:
+        parsed = parse_docx_exam_streaming(file_path, allow_multiple_answers=allow_multiple)
+        return normalize_exam_questions(parsed, allow_multiple), None
+    except ExamParseError as exc:
+        return None, f'Lỗi khi đọc file đề: {exc}'
+    except Exception as exc:
+        return None, f'Lỗi không xác định khi xử lý file: {exc}'
+
+
+def _title_from_file_name(file_name: str) -> str:
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    return ' '.join(stem.replace('_', ' ').split()) or file_name
+
+
+class ImportJobManager:
+    """
+    Hàng đợi import đề thi chạy nền.
+    - Mỗi job lưu thành một file JSON riêng trong jobs_dir, nên mọi worker gunicorn
+      đều đọc được trạng thái (queued/running/done/failed), tiến độ và lỗi
+    - File .docx được parse trong thread pool, request upload trả về ngay
+    - Import hàng loạt từ file zip: các file .docx được parse song song trên
+      process pool và lưu vào lop{grade}.json với một lần ghi
+    - Nhịp sống (heartbeat): mỗi heartbeat_interval giây, tiến trình đang giữ job chạm vào
+      file job (mtime). Job chưa xong mà file không đổi quá heartbeat_timeout giây (tiến
+      trình đã chết, kể cả khi pid đã được hệ điều hành cấp lại cho tiến trình khác hoặc job
+      do máy khác chạy) được đánh dấu thất bại khi khởi động và khi đọc trạng thái
+    """
+
+    def __init__(self, db, jobs_dir: str, max_workers: int = 2, retention_days: int = 7,
+                 progress_interval: float = 0.5, process_workers: Optional[int] = None,
+                 heartbeat_interval: float = 10.0, heartbeat_timeout: float = 60.0):
+        self.db = db
+        self.jobs_dir = jobs_dir
+        self.process_workers = process_workers or os.cpu_count() or 1
+        self.retention = timedelta(days=retention_days)
+        self.progress_interval = progress_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = max(heartbeat_timeout, heartbeat_interval * 3)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='exam-import')
+        self._lock = threading.Lock()
+        # Id các job đang chờ/chạy trong tiến trình này, được heartbeat
+        self._active = set()
+        self._active_lock = threading.Lock()
+        self._stopped = threading.Event()
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._recover_jobs()
+        threading.Thread(target=self._heartbeat, name='exam-import-heartbeat', daemon=True).start()
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f'{job_id}.json')
+
+    def _read_job(self, path: str) -> Optional[Dict]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _write_job(self, job: Dict):
+        job['updated_at'] = datetime.now().isoformat()
+        path = self._job_path(job['id'])
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def _heartbeat(self):
+        while not self._stopped.wait(self.heartbeat_interval):
+            with self._active_lock:
+                job_ids = list(self._active)
+            for job_id in job_ids:
+                try:
+                    os.utime(self._job_path(job_id))
+                except OSError:
+                    pass
+
+    def _expire_if_stale(self, path: str, job: Dict, now: Optional[datetime] = None) -> Dict:
+        """Job chưa xong mà quá heartbeat_timeout không có nhịp sống -> đánh dấu thất bại"""
+        if job.get('status') in FINISHED_STATUSES:
+            return job
+        with self._active_lock:
+            if job.get('id') in self._active:
+                return job
+        try:
+            idle = time.time() - os.path.getmtime(path)
+        except OSError:
+            return job
+        if idle <= self.heartbeat_timeout:
+            return job
+        self._remove_upload(job.get('file_path'))
+        job.update({
+            'status': JOB_FAILED,
+            'errors': job.get('errors', []) + [INTERRUPTED_MESSAGE],
+            'finished_at': (now or datetime.now()).isoformat()
+        })
+        self._write_job(job)
+        return job
+
+    def _recover_jobs(self):
+        """Dọn job cũ và đánh dấu thất bại các job không còn nhịp sống"""
+        now = datetime.now()
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.jobs_dir, name)
+            job = self._read_job(path)
+            if job is None:
+                continue
+            if job.get('status') in FINISHED_STATUSES:
+                try:
+                    finished_at = datetime.fromisoformat(job.get('finished_at') or job.get('created_at'))
+                except (TypeError, ValueError):
+                    finished_at = now
+                if now - finished_at > self.retention:
+                    os.remove(path)
+                continue
+            self._expire_if_stale(path, job, now)
+
+    @staticmethod
+    def _remove_upload(file_path: Optional[str]):
+        if not file_path:
+            return
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+    def _new_job(self, kind: str, file_path: str, params: Dict, created_by: Optional[str]) -> Dict:
+        return {
+            'id': uuid.uuid4().hex[:12],
+            'kind': kind,
+            'status': JOB_QUEUED,
+            'file_path': file_path,
+            'file_name': params.get('file_name', os.path.basename(file_path)),
+            'grade': params['grade'],
+            'title': params.get('title', ''),
+            'description': params.get('description', ''),
+            'time_limit': params['time_limit'],
+            'allow_multiple': bool(params.get('allow_multiple')),
+            'created_by': created_by,
+            'questions_parsed': 0,
+            'question_count': None,
+            'exam_id': None,
+            'duplicates': [],
+            'errors': [],
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None
+        }
+
+    def submit(self, file_path: str, params: Dict, created_by: Optional[str] = None) -> Dict:
+        """
+        Đưa file đã lưu vào hàng đợi. params gồm: file_name, grade, title,
+        description, time_limit, allow_multiple.
+        """
+        job = self._new_job(JOB_KIND_SINGLE, file_path, params, created_by)
+        self._write_job(job)
+        self._track(job)
+        self._executor.submit(self._run, job)
+        return self.public_view(job)
+
+    def submit_bulk(self, zip_path: str, params: Dict, created_by: Optional[str] = None) -> Dict:
+        """
+        Đưa file zip chứa nhiều đề .docx vào hàng đợi. Tên đề lấy theo tên file,
+        params['title'] (nếu có) được dùng làm tiền tố.
+        """
+        job = self._new_job(JOB_KIND_BULK, zip_path, params, created_by)
+        job.update({'files_total': 0, 'files_done': 0, 'results': [], 'exam_ids': []})
+        self._write_job(job)
+        self._track(job)
+        self._executor.submit(self._run_bulk, job)
+        return self.public_view(job)
+
+    def _track(self, job: Dict):
+        with self._active_lock:
+            self._active.add(job['id'])
+
+    def _untrack(self, job: Dict):
+        with self._active_lock:
+            self._active.discard(job['id'])
+
+    def get(self, job_id: str, created_by: Optional[str] = None) -> Optional[Dict]:
+        """created_by: chỉ trả về job của người này (None nếu job của người khác)"""
+        if not job_id or not job_id.isalnum():
+            return None
+        path = self._job_path(job_id)
+        job = self._read_job(path)
+        if not job or (created_by is not None and job.get('created_by') != created_by):
+            return None
+        return self.public_view(self._expire_if_stale(path, job))
+
+    def list_jobs(self, created_by: Optional[str] = None, limit: int = 10) -> List[Dict]:
+        jobs = []
+        for name in os.listdir(self.jobs_dir):
+            if name.endswith('.json'):
+                path = os.path.join(self.jobs_dir, name)
+                job = self._read_job(path)
+                if job and (created_by is None or job.get('created_by') == created_by):
+                    jobs.append(self.public_view(self._expire_if_stale(path, job)))
+        jobs.sort(key=lambda j: j.get('created_at', ''), reverse=True)
+        return jobs[:limit]
+
+    @staticmethod
+    def public_view(job: Dict) -> Dict:
+        """Bỏ các trường nội bộ (đường dẫn file tạm, pid của job cũ) trước khi trả về client"""
+        return {k: v for k, v in job.items() if k not in ('file_path', 'pid')}
+
+    def _run(self, job: Dict):
+        job.update({'status': JOB_RUNNING, 'started_at': datetime.now().isoformat()})
+        self._write_job(job)
+        last_write = time.monotonic()
+
+        def on_question(count):
+            nonlocal last_write
+            job['questions_parsed'] = count
+            # Giới hạn số lần ghi file tiến độ với đề dài
+            if time.monotonic() - last_write >= self.progress_interval:
+                self._write_job(job)
+                last_write = time.monotonic()
+
+        try:
+            parsed = parse_docx_exam_streaming(job['file_path'], allow_multiple_answers=job['allow_multiple'],
+                                               on_question=on_question)
+            questions = normalize_exam_questions(parsed, job['allow_multiple'])
+            exam_record = build_exam_record(job['grade'], job['title'], job['description'],
+                                            job['time_limit'], questions, job['allow_multiple'])
+            with self._lock:
+                job['duplicates'] = self.db.question_index.find_duplicates(questions)
+                self.db.add_exam(job['grade'], exam_record)
+            job.update({
+                'status': JOB_DONE,
+                'questions_parsed': len(parsed),
+                'question_count': len(questions),
+                'exam_id': exam_record['id']
+            })
+        except ExamParseError as exc:
+            job['status'] = JOB_FAILED
+            job['errors'].append(f'Lỗi khi đọc file đề: {exc}')
+        except Exception as exc:
+            job['status'] = JOB_FAILED
+            job['errors'].append(f'Lỗi không xác định khi xử lý file: {exc}')
+        finally:
+            self._remove_upload(job['file_path'])
+            job['finished_at'] = datetime.now().isoformat()
+            self._write_job(job)
+            self._untrack(job)
+
+    def _extract_docx_members(self, zip_path: str, target_dir: str, job: Dict) -> List[Dict]:
+        """Giải nén các file .docx trong zip ra thư mục tạm, ghi lỗi cho các file bị bỏ qua"""
+        entries = []
+        try:
+            with zipfile.ZipFile(zip_path) as archive:
+                members = [info for info in archive.infolist()
+                           if not info.is_dir() and not info.filename.startswith('__MACOSX/')
+                           and not os.path.basename(info.filename).startswith(('~$', '.'))]
+                for info in members:
+                    file_name = os.path.basename(info.filename)
+                    if not file_name.lower().endswith('.docx'):
+                        continue
+                    if len(entries) >= MAX_BULK_FILES:
+                        job['errors'].append(f'File zip có quá nhiều đề, chỉ xử lý {MAX_BULK_FILES} file đầu tiên.')
+                        break
+                    if info.file_size > MAX_BULK_MEMBER_SIZE:
+                        job['results'].append({'file_name': info.filename, 'status': JOB_FAILED,
+                                               'error': 'File quá lớn (tối đa 20MB).'})
+                        continue
+                    path = os.path.join(target_dir, f'{len(entries):04d}.docx')
+                    with archive.open(info) as source, open(path, 'wb') as target:
+                        shutil.copyfileobj(source, target)
+                    entries.append({'file_name': info.filename, 'path': path})
+        except (zipfile.BadZipFile, OSError) as exc:
+            raise ExamParseError(f'Không thể mở file zip: {exc}') from exc
+        return entries
+
+    def _run_bulk(self, job: Dict):
+        job.update({'status': JOB_RUNNING, 'started_at': datetime.now().isoformat()})
+        self._write_job(job)
+        work_dir = tempfile.mkdtemp(prefix='exam_bulk_')
+        try:
+            entries = self._extract_docx_members(job['file_path'], work_dir, job)
+            job['files_total'] = len(entries)
+            self._write_job(job)
+            if not entries:
+                raise ExamParseError('File zip không chứa file .docx nào.')
+
+            parsed = {}
+            last_write = time.monotonic()
+            # spawn thay vì fork: tiến trình web đang có nhiều luồng (request, tác vụ nền), fork có
+            # thể chép sang tiến trình con một khóa đang bị luồng khác giữ và treo mãi
+            with ProcessPoolExecutor(max_workers=min(self.process_workers, len(entries)),
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = {pool.submit(parse_exam_file, entry['path'], job['allow_multiple']): index
+                           for index, entry in enumerate(entries)}
+                for future in as_completed(futures):
+                    index = futures[future]
+                    parsed[index] = future.result()
+                    questions = parsed[index][0]
+                    job['files_done'] += 1
+                    job['questions_parsed'] += len(questions) if questions else 0
+                    if time.monotonic() - last_write >= self.progress_interval:
+                        self._write_job(job)
+                        last_write = time.monotonic()
+
+            # Giữ thứ tự đề theo thứ tự file trong zip
+            records = []
+            for index, entry in enumerate(entries):
+                questions, error = parsed[index]
+                if error:
+                    job['results'].append({'file_name': entry['file_name'], 'status': JOB_FAILED, 'error': error})
+                    continue
+                title = _title_from_file_name(entry['file_name'])
+                if job['title']:
+                    title = f"{job['title']} - {title}"
+                record = build_exam_record(job['grade'], title, job['description'],
+                                           job['time_limit'], questions, job['allow_multiple'])
+                records.append(record)
+                job['results'].append({'file_name': entry['file_name'], 'status': JOB_DONE, 'title': title,
+                                       'exam_id': record['id'], 'question_count': len(questions)})
+
+            if records:
+                with self._lock:
+                    # So với ngân hàng hiện có trước khi ghi, để các đề trong cùng file zip không tự báo trùng nhau
+                    for result, record in zip([r for r in job['results'] if r['status'] == JOB_DONE], records):
+                        result['duplicates'] = self.db.question_index.find_duplicates(record['questions'])
+                    self.db.add_exams(job['grade'], records)
+            job.update({
+                'status': JOB_DONE if records else JOB_FAILED,
+                'exam_ids': [record['id'] for record in records],
+                'question_count': sum(len(record['questions']) for record in records)
+            })
+            if not records:
+                job['errors'].append('Không có đề thi hợp lệ nào trong file zip.')
+        except ExamParseError as exc:
+            job['status'] = JOB_FAILED
+            job['errors'].append(str(exc))
+        except Exception as exc:
+            job['status'] = JOB_FAILED
+            job['errors'].append(f'Lỗi không xác định khi xử lý file: {exc}')
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            self._remove_upload(job['file_path'])
+            job['finished_at'] = datetime.now().isoformat()
+            self._write_job(job)
+            self._untrack(job)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+        self._stopped.set()
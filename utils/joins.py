@@ -0,0 +1,25 @@
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# fetch(ids) -> {id: bản ghi}, ví dụ auth.get_users_by_ids, Database.get_courses_by_ids
+Fetch = Callable[[Iterable], Dict]
+
+
+def join_related(rows: Iterable[Dict], relations: Dict[str, Tuple[str, Fetch]]) -> List[Tuple[Dict, Dict]]:
+    """
+    Gắn các bản ghi liên quan (khóa ngoại) cho các dòng của một trang trong một lượt:
+    gom mọi id của từng quan hệ rồi gọi fetch một lần cho mỗi quan hệ, thay vì tra từng dòng.
+
+        join_related(submissions, {
+            'student': ('user_id', get_users_by_ids),
+            'course': ('course_id', db.get_courses_by_ids)
+        })
+
+    Trả về [(dòng, {'student': user hoặc None, 'course': course hoặc None})] theo thứ tự của rows.
+    """
+    rows = list(rows)
+    found = {}
+    for name, (field, fetch) in relations.items():
+        ids = {row.get(field) for row in rows if row.get(field) is not None}
+        found[name] = fetch(ids) if ids else {}
+    return [(row, {name: found[name].get(row.get(field)) for name, (field, _) in relations.items()})
+            for row in rows]
@@ -0,0 +1,60 @@
+import json
+from typing import Dict, Iterator
+
+_decoder = json.JSONDecoder()
+
+
+def iter_json_array(path: str, chunk_size: int = 64 * 1024) -> Iterator[Dict]:
+    """
+    Đọc lần lượt từng phần tử của file JSON dạng mảng ([{...}, {...}]) mà không nạp cả file:
+    chỉ giữ trong bộ nhớ một đoạn chunk_size ký tự và phần tử đang đọc dở.
+    File không tồn tại thì không có phần tử nào; file sai định dạng thì báo ValueError.
+    """
+    try:
+        f = open(path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return
+    with f:
+        buffer = ''
+        position = 0
+        started = False
+        eof = False
+        while True:
+            # Bỏ khoảng trắng và dấu phân cách giữa các phần tử
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) and not started:
+                if buffer[position] != '[':
+                    raise ValueError(f'{path} không phải mảng JSON')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            if position < len(buffer):
+                try:
+                    item, end = _decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # Phần tử chưa đọc hết: đọc thêm rồi thử lại
+                    if eof:
+                        raise ValueError(f'{path} bị lỗi định dạng')
+                else:
+                    # Chỉ nhận phần tử khi đã thấy dấu phân cách sau nó: số ở cuối đoạn
+                    # đệm ('2.' của '2.5') có thể chưa đọc hết
+                    after = end
+                    while after < len(buffer) and buffer[after] in ' \t\r\n':
+                        after += 1
+                    if after < len(buffer) and buffer[after] in ',]':
+                        yield item
+                        position = end
+                        continue
+                    if eof:
+                        raise ValueError(f'{path} bị lỗi định dạng')
+            if eof:
+                if started:
+                    raise ValueError(f'{path} bị lỗi định dạng')
+                return
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
@@ -0,0 +1,80 @@
+import re
+
+# Một biểu thức duy nhất, quét văn bản một lần. Mỗi token bắt đầu bằng một ký tự
+# trong [\n`*_] (đặt ở đầu mẫu để re dùng được tìm kiếm nhanh theo tập ký tự),
+# nhánh cụ thể được chọn bằng lookbehind. Tiêu đề và code fence nhận diện qua
+# ký tự xuống dòng đứng trước, vì vậy văn bản được xử lý với một '\n' thêm ở đầu.
+_MARKDOWN_TOKEN = re.compile(r'''
+    [\n`*_]
+    (?:
+        (?<=\n)(?P<fence>[ \t]*```[^\n`]*)
+      | (?<=\n)(?P<heading>[ \t]{0,3}\#{1,6}(?:[ \t]+|(?=\n)|\Z))
+      | (?<=`)(?<!``)(?P<ticks>`{0,2})(?!`)(?P<code>[^\n]+?)(?<!`)`(?P=ticks)(?!`)
+      | (?<=\*)\*\*(?P<bold_em>\S(?:[^\n]*?\S)?)\*\*\*
+      | (?<=\*)\*(?P<bold>\S(?:[^\n]*?\S)?)\*\*
+      | (?<=_)(?<!\w_)_(?P<ubold>\S(?:[^\n]*?\S)?)__(?!\w)
+      | (?<=\*)(?<![*\w]\*)(?P<em>[^\s*](?:[^\n*]*?[^\s*])?)\*(?![*\w])
+      | (?<=_)(?<!\w_)(?P<uem>[^\s_](?:[^\n_]*?[^\s_])?)_(?!\w)
+    )
+''', re.VERBOSE)
+
+_MARKDOWN_CHARS = re.compile(r'[`*_#]')
+
+
+class MarkdownStripper:
+    """
+    Bỏ định dạng Markdown (tiêu đề, in đậm/nghiêng, code block, inline code)
+    trong một lần quét. Dùng được cho văn bản stream: gọi feed() với từng
+    chunk và flush() khi kết thúc. Nội dung trong code block được giữ nguyên,
+    dấu gạch dưới giữa từ (snake_case) không bị coi là in nghiêng.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._in_code_block = False
+
+    def feed(self, chunk: str) -> str:
+        """Nhận thêm một chunk, trả về phần văn bản đã xử lý xong (tới hết dòng cuối)."""
+        self._buffer += chunk
+        cut = self._buffer.rfind('\n')
+        if cut == -1:
+            return ''
+        ready, self._buffer = self._buffer[:cut + 1], self._buffer[cut + 1:]
+        return self._process(ready)
+
+    def flush(self) -> str:
+        ready, self._buffer = self._buffer, ''
+        return self._process(ready)
+
+    def _process(self, text: str) -> str:
+        # Đoạn không có ký tự Markdown thì không cần chạy regex
+        if not text or (not self._in_code_block and not _MARKDOWN_CHARS.search(text)):
+            return text
+        # text luôn bắt đầu ở đầu dòng; thêm '\n' để dòng đầu cũng khớp được tiêu đề/fence
+        result = _MARKDOWN_TOKEN.sub(self._replace, '\n' + text)
+        return result[1:] if result.startswith('\n') else result
+
+    def _replace(self, match) -> str:
+        kind = match.lastgroup
+        if kind == 'fence':
+            # Bỏ cả dòng ```lang (cùng ký tự xuống dòng phía trước)
+            self._in_code_block = not self._in_code_block
+            return ''
+        if self._in_code_block:
+            return match.group(0)
+        if kind == 'heading':
+            return '\n'
+        inner = match.group(kind)
+        if kind == 'code':
+            return inner
+        # Nhấn mạnh có thể lồng nhau (**đậm _nghiêng_**) -> xử lý tiếp phần bên trong
+        if _MARKDOWN_CHARS.search(inner):
+            return _MARKDOWN_TOKEN.sub(self._replace, inner)
+        return inner
+
+
+def strip_markdown(text: str) -> str:
+    """Bỏ định dạng Markdown của cả đoạn văn bản (không stream)."""
+    if not text:
+        return ''
+    return MarkdownStripper()._process(text).strip()
@@ -0,0 +1,131 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional
+
+import requests
+
+
+class ModelBackendError(Exception):
+    """Ngoại lệ khi backend mô hình trả về lỗi."""
+
+
+class ModelBackend(ABC):
+    """
+    Giao diện chung cho các backend sinh văn bản mà utils.gemini_api sử dụng.
+    """
+    name = 'base'
+
+    def is_configured(self) -> bool:
+        return True
+
+    @abstractmethod
+    def generate(self, prompt: str) -> str:
+        """Sinh câu trả lời cho một prompt"""
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        yield self.generate(prompt)
+
+    @abstractmethod
+    def chat(self, message: str, history: List[Dict], system_instruction: str = '',
+             temperature: Optional[float] = None) -> str:
+        """Trả lời tin nhắn kèm lịch sử hội thoại [{'role', 'content'}]"""
+
+
+class GeminiBackend(ModelBackend):
+    """Backend gọi Google Gemini qua thư viện google-generativeai."""
+    name = 'gemini'
+
+    def __init__(self, api_key: Optional[str], model_name: str = 'gemini-2.0-flash-exp'):
+        import google.generativeai as genai
+
+        self._genai = genai
+        self.api_key = api_key
+        self.model_name = model_name
+        if api_key:
+            genai.configure(api_key=api_key)
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def generate(self, prompt: str) -> str:
+        model = self._genai.GenerativeModel(self.model_name)
+        return model.generate_content(prompt).text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        model = self._genai.GenerativeModel(self.model_name)
+        for chunk in model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+    def chat(self, message, history, system_instruction='', temperature=None):
+        generation_config = {'temperature': temperature} if temperature is not None else None
+        model = self._genai.GenerativeModel(
+            self.model_name,
+            generation_config=generation_config,
+            system_instruction=system_instruction or None
+        )
+        chat = model.start_chat(history=[])
+        for msg in history:
+            if msg['role'] == 'user':
+                chat.send_message(msg['content'])
+        return chat.send_message(message).text
+
+
+class HttpModelBackend(ModelBackend):
+    """
+    Backend gọi một server HTTP tương thích (ví dụ scripts/fake_gemini_server.py)
+    - POST {base_url}/generate  {"prompt": "..."} -> {"text": "..."}
+    - POST {base_url}/stream    {"prompt": "..."} -> văn bản trả về theo từng chunk
+    - POST {base_url}/chat      {"message", "history", "system_instruction", "temperature"} -> {"text": "..."}
+    """
+    name = 'http'
+
+    def __init__(self, base_url: str, timeout: float = 30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def _post(self, path: str, payload: Dict, stream: bool = False):
+        try:
+            response = self._session.post(f'{self.base_url}{path}', json=payload,
+                                          timeout=self.timeout, stream=stream)
+        except requests.RequestException as exc:
+            raise ModelBackendError(f'Không kết nối được tới model server: {exc}') from exc
+        if response.status_code != 200:
+            raise ModelBackendError(f'Model server trả về lỗi {response.status_code}: {response.text[:200]}')
+        return response
+
+    def generate(self, prompt):
+        return self._post('/generate', {'prompt': prompt}).json().get('text', '')
+
+    def stream(self, prompt):
+        response = self._post('/stream', {'prompt': prompt}, stream=True)
+        response.encoding = 'utf-8'
+        for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+            if chunk:
+                yield chunk
+
+    def chat(self, message, history, system_instruction='', temperature=None):
+        payload = {
+            'message': message,
+            'history': [{'role': msg['role'], 'content': msg['content']} for msg in history],
+            'system_instruction': system_instruction or '',
+            'temperature': temperature
+        }
+        return self._post('/chat', payload).json().get('text', '')
+
+
+def create_backend_from_env() -> ModelBackend:
+    """
+    Chọn backend theo biến môi trường GEMINI_BACKEND:
+    - "gemini" (mặc định): gọi Google Gemini, cần GEMINI_API_KEY
+    - "http": gọi server tại GEMINI_BACKEND_URL (dùng cho kiểm thử tải offline)
+    """
+    backend_name = os.getenv('GEMINI_BACKEND', 'gemini').strip().lower()
+    if backend_name == 'http':
+        return HttpModelBackend(
+            os.getenv('GEMINI_BACKEND_URL', 'http://127.0.0.1:8765'),
+            timeout=float(os.getenv('GEMINI_BACKEND_TIMEOUT', '30'))
+        )
+    return GeminiBackend(os.getenv('GEMINI_API_KEY'))
+
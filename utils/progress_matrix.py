@@ -0,0 +1,218 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from utils.search_index import file_signature
+
+# Học sinh chưa xong khóa học và không cập nhật tiến độ quá số ngày này thì coi là bỏ dở
+STALLED_DAYS = 7
+
+# Số bit 1 của mỗi giá trị byte, để đếm bài đã hoàn thành trên các hàng bit đã nén
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint16)
+
+
+def _parse_time(value) -> np.datetime64:
+    try:
+        return np.datetime64(datetime.fromisoformat(value), 's')
+    except (TypeError, ValueError):
+        return np.datetime64('NaT', 's')
+
+
+def _parse_times(values: List[str]) -> np.ndarray:
+    try:
+        return np.array([value or 'NaT' for value in values], dtype='datetime64[s]')
+    except ValueError:
+        # Có giá trị không đúng định dạng ISO: đọc từng giá trị
+        return np.array([_parse_time(value) for value in values], dtype='datetime64[s]')
+
+
+class CourseProgress:
+    """
+    Tiến độ của một khóa học dạng ma trận học sinh x bài học, mỗi bài một bit
+    (np.packbits, 8 bài mỗi byte), theo thứ tự bài học trong khóa học.
+    Bài đã bị xóa khỏi khóa học không được tính.
+    """
+
+    def __init__(self, course: Dict):
+        self.course_id = course['id']
+        self.lesson_ids: List[str] = [lesson['id'] for lesson in course.get('lessons', [])]
+        self.lesson_index: Dict[str, int] = {lesson_id: i for i, lesson_id in enumerate(self.lesson_ids)}
+        self.student_ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.bits = np.zeros((0, self._row_bytes()), dtype=np.uint8)
+        self.last_updated = np.zeros(0, dtype='datetime64[s]')
+        self.last_updated_text: List[str] = []
+
+    def _row_bytes(self) -> int:
+        return (len(self.lesson_ids) + 7) // 8
+
+    def _pack(self, completed_lessons) -> np.ndarray:
+        row = np.zeros(len(self.lesson_ids), dtype=bool)
+        positions = [self.lesson_index[lesson_id] for lesson_id in completed_lessons
+                     if lesson_id in self.lesson_index]
+        row[positions] = True
+        return np.packbits(row)
+
+    def load(self, records: List[Dict]):
+        """Dựng cả ma trận một lần từ các bản ghi tiến độ của khóa học"""
+        self.student_ids = [record['user_id'] for record in records]
+        self.rows = {user_id: i for i, user_id in enumerate(self.student_ids)}
+        done = np.zeros((len(records), len(self.lesson_ids)), dtype=bool)
+        rows, columns = [], []
+        for i, record in enumerate(records):
+            for lesson_id in record.get('completed_lessons', []):
+                column = self.lesson_index.get(lesson_id)
+                if column is not None:
+                    rows.append(i)
+                    columns.append(column)
+        done[rows, columns] = True
+        self.bits = np.packbits(done, axis=1)
+        self.last_updated_text = [record.get('last_updated') or '' for record in records]
+        self.last_updated = _parse_times(self.last_updated_text)
+
+    def set_row(self, record: Dict):
+        user_id = record['user_id']
+        row = self.rows.get(user_id)
+        if row is None:
+            row = self.rows[user_id] = len(self.student_ids)
+            self.student_ids.append(user_id)
+            self.bits = np.vstack([self.bits, np.zeros((1, self._row_bytes()), dtype=np.uint8)])
+            self.last_updated = np.append(self.last_updated, np.datetime64('NaT', 's'))
+            self.last_updated_text.append('')
+        if self.lesson_ids:
+            self.bits[row] = self._pack(record.get('completed_lessons', []))
+        self.last_updated_text[row] = record.get('last_updated') or ''
+        self.last_updated[row] = _parse_time(self.last_updated_text[row])
+
+    # ---- Thống kê (tính trên cả ma trận) ----
+
+    def completed_counts(self) -> np.ndarray:
+        return _POPCOUNT[self.bits].sum(axis=1) if self.bits.size else np.zeros(len(self.student_ids), dtype=np.uint16)
+
+    def matrix(self) -> np.ndarray:
+        """Ma trận bool học sinh x bài học"""
+        return np.unpackbits(self.bits, axis=1, count=len(self.lesson_ids)).astype(bool)
+
+    def report(self, now: Optional[datetime] = None, stalled_days: int = STALLED_DAYS) -> Dict:
+        """
+        Báo cáo của khóa học:
+        - enrolled/completed/in_progress/not_started: số học sinh theo trạng thái
+        - average_percentage: phần trăm hoàn thành trung bình
+        - lesson_completions: số học sinh đã xong từng bài
+        - funnel: số học sinh đã xong liên tiếp từ bài đầu tới hết từng bài (phễu rơi rớt)
+        - stalled: chỉ số hàng của học sinh chưa xong và không học quá stalled_days ngày
+        - counts/percentages: số bài đã xong và phần trăm của từng học sinh (theo hàng)
+        """
+        total = len(self.lesson_ids)
+        counts = self.completed_counts()
+        percentages = np.round(counts / total * 100, 1) if total else np.zeros(len(counts))
+        if total:
+            done = self.matrix()
+            lesson_completions = done.sum(axis=0)
+            funnel = np.logical_and.accumulate(done, axis=1).sum(axis=0)
+        else:
+            lesson_completions = funnel = np.zeros(0, dtype=np.int64)
+
+        cutoff = np.datetime64(now or datetime.now(), 's') - np.timedelta64(timedelta(days=stalled_days))
+        idle = np.isnat(self.last_updated) | (self.last_updated < cutoff)
+        stalled = np.flatnonzero((counts < total) & idle) if total else np.zeros(0, dtype=np.int64)
+
+        return {
+            'enrolled': len(self.student_ids),
+            'total_lessons': total,
+            'completed': int(np.count_nonzero(counts == total)) if total else 0,
+            'in_progress': int(np.count_nonzero((counts > 0) & (counts < total))),
+            'not_started': int(np.count_nonzero(counts == 0)) if total else 0,
+            'average_percentage': round(float(percentages.mean()), 1) if len(percentages) else 0.0,
+            'lesson_completions': lesson_completions.tolist(),
+            'funnel': funnel.tolist(),
+            'stalled': stalled.tolist(),
+            'counts': counts.tolist(),
+            'percentages': percentages.tolist()
+        }
+
+
+class ProgressMatrixIndex:
+    """
+    Ma trận tiến độ của mọi khóa học (CourseProgress), dựng từ progress.json và courses.json
+    ở lần dùng đầu tiên. Database gọi on_progress_saved sau mỗi lần ghi tiến độ với `since`
+    là snapshot() chụp trước khi ghi (giống ForumSearchIndex); khóa học thay đổi thì dựng lại.
+    """
+
+    def __init__(self, progress_file: str, courses_file: str,
+                 load_progress: Callable[[], List[Dict]], load_courses: Callable[[], List[Dict]]):
+        self.progress_file = progress_file
+        self.courses_file = courses_file
+        self.load_progress = load_progress
+        self.load_courses = load_courses
+        self._lock = threading.RLock()
+        self._courses: Dict[str, CourseProgress] = {}
+        self._signature = None
+
+    def snapshot(self):
+        return file_signature(self.progress_file), file_signature(self.courses_file)
+
+    def _rebuild(self):
+        signature = self.snapshot()
+        courses = {course['id']: CourseProgress(course) for course in self.load_courses()}
+        records: Dict[str, List[Dict]] = {course_id: [] for course_id in courses}
+        for record in self.load_progress():
+            if record.get('course_id') in records:
+                records[record['course_id']].append(record)
+        for course_id, course in courses.items():
+            course.load(records[course_id])
+        self._courses = courses
+        self._signature = signature
+
+    def _ensure_fresh(self):
+        if self._signature is None or self._signature != self.snapshot():
+            self._rebuild()
+
+    def on_progress_saved(self, records: List[Dict], since):
+        """records: các bản ghi tiến độ vừa được ghi"""
+        with self._lock:
+            if self._signature is None:
+                return
+            if since != self._signature:
+                self._signature = None
+                return
+            for record in records:
+                course = self._courses.get(record.get('course_id'))
+                if course is not None:
+                    course.set_row(record)
+            self._signature = self.snapshot()
+
+    def file_written(self, path: str, before, after):
+        """Ghi trễ cuối request, xem ForumSearchIndex.file_written"""
+        if path not in (self.progress_file, self.courses_file):
+            return
+        with self._lock:
+            if self._signature is None:
+                return
+            progress_signature, courses_signature = self._signature
+            if path == self.progress_file and before is not None and progress_signature == before:
+                self._signature = after, courses_signature
+            else:
+                self._signature = None
+
+    def enrollment_counts(self, course_ids: List[str]) -> Dict[str, int]:
+        with self._lock:
+            self._ensure_fresh()
+            return {course_id: len(self._courses[course_id].student_ids) if course_id in self._courses else 0
+                    for course_id in course_ids}
+
+    def course_report(self, course_id: str, now: Optional[datetime] = None) -> Optional[Dict]:
+        """Báo cáo của CourseProgress.report kèm student_ids, last_updated theo cùng thứ tự hàng"""
+        with self._lock:
+            self._ensure_fresh()
+            course = self._courses.get(course_id)
+            if course is None:
+                return None
+            report = course.report(now=now)
+            report['course_id'] = course_id
+            report['lesson_ids'] = list(course.lesson_ids)
+            report['student_ids'] = list(course.student_ids)
+            report['last_updated'] = list(course.last_updated_text)
+            return report
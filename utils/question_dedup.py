@@ -0,0 +1,453 @@
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import zlib
+from array import array
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.concurrency import SingleFlight
+from utils.file_lock import file_locks
+from utils.text_utils import tokenize
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = 0xFFFFFFFF
+
+
+def question_text(question: Dict) -> str:
+    """Câu hỏi và các lựa chọn (xếp theo chữ cái) ghép thành một chuỗi, là phần dùng để so trùng"""
+    options = question.get('options') or {}
+    parts = [question.get('question', '')]
+    parts.extend(str(options[key]) for key in sorted(options))
+    return ' '.join(parts)
+
+
+def text_shingles(text: str) -> set:
+    tokens = tokenize(text)
+    if len(tokens) < 2:
+        return set(tokens)
+    return {f'{tokens[i]} {tokens[i + 1]}' for i in range(len(tokens) - 1)}
+
+
+def question_shingles(question: Dict) -> set:
+    """
+    Tập shingle (cặp từ liên tiếp) của câu hỏi và các lựa chọn, đã bỏ dấu.
+    Các lựa chọn được xếp theo chữ cái nên đảo thứ tự lời văn trong lựa chọn
+    vẫn được xem là khác, còn thêm/bớt dấu hay viết hoa thì không.
+    """
+    return text_shingles(question_text(question))
+
+
+class MinHasher:
+    """MinHash với num_perm hàm băm dạng (a*x + b) mod p, hệ số sinh từ seed cố định"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.permutations = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                             for _ in range(num_perm)]
+
+    def signature(self, shingles: Iterable[str]) -> array:
+        hashes = [zlib.crc32(s.encode('utf-8')) for s in shingles]
+        if not hashes:
+            return array('I', [_MAX_HASH] * self.num_perm)
+        prime = _MERSENNE_PRIME
+        return array('I', [min((a * h + b) % prime for h in hashes) & _MAX_HASH
+                           for a, b in self.permutations])
+
+
+def estimate_similarity(sig_a: array, sig_b: array) -> float:
+    """Ước lượng hệ số Jaccard từ tỉ lệ vị trí trùng nhau của hai chữ ký"""
+    same = sum(1 for x, y in zip(sig_a, sig_b) if x == y)
+    return same / len(sig_a)
+
+
+
+
+class QuestionDedupIndex:
+    """
+    Chỉ mục MinHash/LSH phát hiện câu hỏi gần trùng trong ngân hàng đề lop{grade}.json.
+    - Mỗi câu hỏi có chữ ký num_perm giá trị, chia thành `bands` dải; hai câu có
+      chung một dải mới được so sánh, nên tra cứu không phải quét toàn bộ ngân hàng
+    - Mỗi câu có khóa (đề, số câu, tên đề, băm nội dung câu hỏi + lựa chọn). Lưu ra index_file
+      dạng JSON lines: dòng đầu là tham số, mỗi dòng sau là một thay đổi của một khối
+      (khóa bị bỏ + câu mới kèm chữ ký, cùng chữ ký file ngân hàng); add_exams và mỗi lần cập
+      nhật chỉ nối thêm một dòng, chỉ khi dựng lại hoặc dồn chỗ trống mới ghi lại cả file
+    - Ghi lại kích thước/mtime của từng file ngân hàng; nếu file bị sửa ngoài add_exam thì
+      đọc lại file, so khóa với chỉ mục và chỉ tính MinHash cho câu mới (câu có nội dung đã
+      biết dùng lại chữ ký), không dựng lại cả khối. Phần đọc file và tính MinHash chạy ngoài
+      self._lock, các luồng cùng cần cập nhật thì chờ chung một lần (SingleFlight)
+    """
+
+    def __init__(self, index_file: str, load_bank: Callable[[str], Dict], bank_file: Callable[[str], str],
+                 grades: Iterable[str] = ('10', '11', '12'), num_perm: int = 64, bands: int = 16,
+                 threshold: float = 0.7):
+        if num_perm % bands:
+            raise ValueError('num_perm phải chia hết cho bands')
+        self.index_file = index_file
+        self.load_bank = load_bank
+        self.bank_file = bank_file
+        self.grades = [str(g) for g in grades]
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._index_signature = None
+        # File chỉ mục có dòng tham số đúng định dạng hiện tại (nối thêm được)
+        self._header_ok = False
+        # Vị trí của câu đã bỏ được đặt None (bucket không còn trỏ tới), dồn lại khi quá nhiều
+        self._entries: List[Optional[Dict]] = []
+        self._holes = 0
+        self._buckets: Dict[int, object] = {}
+        # grade -> khóa câu -> các vị trí trong self._entries
+        self._positions: Dict[str, Dict[str, List[int]]] = {}
+        self._bank_signatures: Dict[str, List[int]] = {}
+        self._builds = SingleFlight()
+
+    # ---- Lưu / nạp ----
+
+    @staticmethod
+    def _file_signature(path: str) -> Optional[List[int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _params(self) -> Dict:
+        return {'num_perm': self.hasher.num_perm, 'bands': self.bands, 'format': 'diff-lines'}
+
+    def _reset(self):
+        self._entries = []
+        self._holes = 0
+        self._buckets = {}
+        self._positions = {}
+        self._bank_signatures = {}
+
+    def _load(self):
+        self._reset()
+        self._header_ok = False
+        signature = self._file_signature(self.index_file)
+        if signature:
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                lines = []
+            header = self._parse_line(lines[0]) if lines else None
+            if header is not None and header.get('params') == self._params():
+                self._header_ok = True
+                for line in lines[1:]:
+                    record = self._parse_line(line)
+                    # Dòng ghi dở (tiến trình chết giữa chừng) thì bỏ qua
+                    if record is None or 'grade' not in record:
+                        continue
+                    entries = record.get('entries', [])
+                    for entry in entries:
+                        entry['sig'] = array('I', base64.b64decode(entry['sig']))
+                    self._apply_record(record['grade'], record.get('removed') or [], entries)
+                    self._bank_signatures[record['grade']] = record.get('bank')
+        self._index_signature = signature
+        self._loaded = True
+
+    @staticmethod
+    def _parse_line(line: str) -> Optional[Dict]:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            return None
+        return record if isinstance(record, dict) else None
+
+    @staticmethod
+    def _record_line(grade: str, bank_signature, entries: Iterable[Dict], removed: Iterable[str] = ()) -> str:
+        record = {'grade': grade, 'bank': bank_signature,
+                  'entries': [dict(entry, sig=base64.b64encode(entry['sig'].tobytes()).decode('ascii'))
+                              for entry in entries]}
+        removed = list(removed)
+        if removed:
+            record['removed'] = removed
+        return json.dumps(record, ensure_ascii=False) + '\n'
+
+    def _save(self, only_if_current: bool = False) -> bool:
+        """
+        Ghi lại cả file: dòng tham số + một dòng cho mỗi khối.
+        only_if_current: không ghi (trả về False) nếu tiến trình khác đã ghi file từ lần nạp trước.
+        """
+        lines = [json.dumps({'params': self._params()}) + '\n']
+        for grade, bank_signature in self._bank_signatures.items():
+            lines.append(self._record_line(grade, bank_signature,
+                                           (entry for entry in self._entries
+                                            if entry is not None and entry['grade'] == grade)))
+        os.makedirs(os.path.dirname(self.index_file) or '.', exist_ok=True)
+        tmp_path = f'{self.index_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with file_locks.hold(self.index_file):
+            if only_if_current and self._file_signature(self.index_file) != self._index_signature:
+                return False
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            os.replace(tmp_path, self.index_file)
+            self._index_signature = self._file_signature(self.index_file)
+            self._header_ok = True
+        return True
+
+    def _append(self, line: str) -> bool:
+        """Nối một dòng vào cuối file; False nếu file đã bị tiến trình khác ghi (không nối)"""
+        with file_locks.hold(self.index_file):
+            if self._file_signature(self.index_file) != self._index_signature or self._index_signature is None:
+                return False
+            with open(self.index_file, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self._index_signature = self._file_signature(self.index_file)
+        return True
+
+    def _persist(self, line: str) -> bool:
+        """Nối dòng thay đổi; file chưa có hoặc khác định dạng (bản cũ) thì ghi lại cả file"""
+        if self._index_signature is None or not self._header_ok:
+            return self._save(only_if_current=True)
+        return self._append(line)
+
+    def _stale_grades(self) -> List[str]:
+        return [grade for grade in self.grades
+                if self._file_signature(self.bank_file(grade)) != self._bank_signatures.get(grade)]
+
+    def _ensure_fresh(self):
+        """
+        Nạp lại chỉ mục nếu tiến trình khác đã ghi, cập nhật khối có file ngân hàng bị sửa.
+        Gọi khi KHÔNG giữ self._lock: phần đọc file và tính MinHash chạy ngoài khóa.
+        """
+        with self._lock:
+            if not self._loaded or self._file_signature(self.index_file) != self._index_signature:
+                self._load()
+            if not self._stale_grades():
+                return
+        self._builds.do('refresh', self._refresh_stale)
+
+    def _refresh_stale(self):
+        with self._lock:
+            stale = self._stale_grades()
+            known = {grade: self._grade_signatures(grade) for grade in stale}
+        if not stale:
+            return
+        # Đọc ngân hàng và tính MinHash cho các câu chưa biết ngoài khóa;
+        # chữ ký file ngân hàng chụp trước khi đọc
+        prepared = []
+        for grade in stale:
+            bank_signature = self._file_signature(self.bank_file(grade))
+            items = self._bank_items(grade)
+            self._signed(items, known[grade])
+            prepared.append((grade, bank_signature, items))
+        with self._lock:
+            for grade, bank_signature, items in prepared:
+                self._apply_bank(grade, bank_signature, items, known[grade])
+            if self._holes > max(1000, len(self._entries) // 2):
+                self._compact()
+                self._save(only_if_current=True)
+
+    def _apply_bank(self, grade: str, bank_signature, items: List[Tuple[Dict, str]], known: Dict[str, array]):
+        """Đưa khối `grade` về đúng nội dung `items` (đọc từ file ngân hàng) và nối dòng thay đổi"""
+        for _ in range(3):
+            removed, added = self._diff(grade, items)
+            if not removed and not added and self._bank_signatures.get(grade) == bank_signature:
+                return
+            entries = self._signed(added, known)
+            self._apply_record(grade, removed, entries)
+            self._bank_signatures[grade] = bank_signature
+            if self._persist(self._record_line(grade, bank_signature, entries, removed)):
+                return
+            # Tiến trình khác vừa ghi file chỉ mục: nạp lại rồi so lại trên bản mới
+            self._load()
+
+    # ---- Bucket LSH ----
+
+    def _band_keys(self, sig: array) -> List[int]:
+        raw = sig.tobytes()
+        width = self.rows * sig.itemsize
+        return [hash((band, raw[band * width:(band + 1) * width])) for band in range(self.bands)]
+
+    def _insert(self, entry: Dict):
+        position = len(self._entries)
+        self._entries.append(entry)
+        self._positions.setdefault(entry['grade'], {}).setdefault(entry['key'], []).append(position)
+        for key in self._band_keys(entry['sig']):
+            bucket = self._buckets.get(key)
+            # Phần lớn bucket chỉ có một câu -> lưu số nguyên thay vì list để tiết kiệm bộ nhớ
+            if bucket is None:
+                self._buckets[key] = position
+            elif isinstance(bucket, int):
+                self._buckets[key] = [bucket, position]
+            else:
+                bucket.append(position)
+
+    def _remove_key(self, grade: str, key: str):
+        positions = self._positions.get(grade, {}).get(key)
+        if not positions:
+            return
+        position = positions.pop()
+        if not positions:
+            del self._positions[grade][key]
+        entry = self._entries[position]
+        self._entries[position] = None
+        self._holes += 1
+        for band_key in self._band_keys(entry['sig']):
+            bucket = self._buckets.get(band_key)
+            if isinstance(bucket, int):
+                if bucket == position:
+                    del self._buckets[band_key]
+            elif bucket is not None and position in bucket:
+                bucket.remove(position)
+                if len(bucket) == 1:
+                    self._buckets[band_key] = bucket[0]
+
+    def _apply_record(self, grade: str, removed: Iterable[str], entries: Iterable[Dict]):
+        for key in removed:
+            self._remove_key(grade, key)
+        for entry in entries:
+            self._insert(entry)
+
+    def _compact(self):
+        """Bỏ các vị trí trống: xếp lại bucket, không tính lại chữ ký"""
+        live = [entry for entry in self._entries if entry is not None]
+        self._entries = []
+        self._holes = 0
+        self._buckets = {}
+        self._positions = {}
+        for entry in live:
+            self._insert(entry)
+
+    # ---- Câu hỏi từ ngân hàng đề ----
+
+    def _exam_items(self, grade: str, exam: Dict) -> List[Tuple[Dict, str]]:
+        """(mục chỉ mục chưa có chữ ký, nội dung để tính shingle) của từng câu trong đề"""
+        items = []
+        for idx, question in enumerate(exam.get('questions') or [], start=1):
+            if not isinstance(question, dict):
+                continue
+            text = question_text(question)
+            digest = hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+            entry = {
+                'grade': grade,
+                'exam_id': exam.get('id'),
+                'exam_title': exam.get('title', ''),
+                'question_number': question.get('number', question.get('id', idx)),
+                'question': (question.get('question') or '')[:160],
+                'hash': digest
+            }
+            entry['key'] = f"{entry['exam_id']}\x1f{entry['question_number']}\x1f{entry['exam_title']}\x1f{digest}"
+            items.append((entry, text))
+        return items
+
+    def _bank_items(self, grade: str) -> List[Tuple[Dict, str]]:
+        items = []
+        for exam in self.load_bank(grade).get('exams', []):
+            if isinstance(exam, dict):
+                items.extend(self._exam_items(grade, exam))
+        return items
+
+    def _grade_signatures(self, grade: str) -> Dict[str, array]:
+        """băm nội dung -> chữ ký của các câu đang có trong khối"""
+        return {self._entries[position]['hash']: self._entries[position]['sig']
+                for positions in self._positions.get(grade, {}).values() for position in positions}
+
+    def _signed(self, items: List[Tuple[Dict, str]], known: Dict[str, array]) -> List[Dict]:
+        """Gắn chữ ký cho các câu; câu có nội dung đã có trong `known` không phải tính MinHash"""
+        entries = []
+        for entry, text in items:
+            sig = known.get(entry['hash'])
+            if sig is None:
+                sig = known[entry['hash']] = self.hasher.signature(text_shingles(text))
+            entries.append(dict(entry, sig=sig))
+        return entries
+
+    def _diff(self, grade: str, items: List[Tuple[Dict, str]]):
+        """(khóa cần bỏ, các câu cần thêm) để khối `grade` khớp `items`"""
+        remaining = Counter({key: len(positions) for key, positions in self._positions.get(grade, {}).items()})
+        added = []
+        for entry, text in items:
+            if remaining[entry['key']] > 0:
+                remaining[entry['key']] -= 1
+            else:
+                added.append((entry, text))
+        removed = [key for key, count in remaining.items() for _ in range(count)]
+        return removed, added
+
+    # ---- API ----
+
+    def add_exams(self, grade, exams: List[Dict]):
+        """Gọi sau khi đã ghi các đề vào lop{grade}.json"""
+        grade = str(grade)
+        entries = self._signed([item for exam in exams for item in self._exam_items(grade, exam)], {})
+        with self._lock:
+            if not self._loaded or self._file_signature(self.index_file) != self._index_signature:
+                self._load()
+            # Chưa có chỉ mục cho khối này: lần tra cứu sau sẽ dựng từ file (đã gồm các đề mới)
+            if grade not in self._bank_signatures:
+                return
+            for entry in entries:
+                self._insert(entry)
+            self._bank_signatures[grade] = self._file_signature(self.bank_file(grade))
+            if not self._persist(self._record_line(grade, self._bank_signatures[grade], entries)):
+                # Tiến trình khác vừa ghi file: nạp lại, khối này lệch chữ ký ngân hàng nên
+                # lần tra cứu sau so lại với file và thêm các đề vừa thêm
+                self._load()
+
+    def find_duplicates(self, questions: List[Dict], limit: int = 3) -> List[Dict]:
+        """
+        Tìm các câu trong ngân hàng gần trùng với từng câu hỏi mới.
+        Trả về [{'number', 'question', 'matches': [{grade, exam_id, exam_title,
+        question_number, question, similarity}]}] cho những câu có ít nhất một kết quả.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            flagged = []
+            for idx, question in enumerate(questions, start=1):
+                sig = self.hasher.signature(question_shingles(question))
+                candidates = set()
+                for key in self._band_keys(sig):
+                    bucket = self._buckets.get(key)
+                    if bucket is None:
+                        continue
+                    if isinstance(bucket, int):
+                        candidates.add(bucket)
+                    else:
+                        candidates.update(bucket)
+
+                matches = []
+                for position in candidates:
+                    entry = self._entries[position]
+                    similarity = estimate_similarity(sig, entry['sig'])
+                    if similarity >= self.threshold:
+                        matches.append((similarity, entry))
+                if not matches:
+                    continue
+                matches.sort(key=lambda item: item[0], reverse=True)
+                flagged.append({
+                    'number': question.get('number', idx),
+                    'question': (question.get('question') or '')[:160],
+                    'matches': [dict({k: v for k, v in entry.items() if k not in ('sig', 'hash', 'key')},
+                                     similarity=round(sim, 2))
+                                for sim, entry in matches[:limit]]
+                })
+            return flagged
+
+    def rebuild(self):
+        """Dựng lại toàn bộ chỉ mục từ các file ngân hàng đề"""
+        built = {grade: (self._file_signature(self.bank_file(grade)), self._signed(self._bank_items(grade), {}))
+                 for grade in self.grades}
+        with self._lock:
+            self._reset()
+            for grade, (bank_signature, entries) in built.items():
+                self._apply_record(grade, (), entries)
+                self._bank_signatures[grade] = bank_signature
+            self._save()
+            self._loaded = True
+
+    def stats(self) -> Dict:
+        self._ensure_fresh()
+        with self._lock:
+            return {'questions': len(self._entries) - self._holes, 'buckets': len(self._buckets),
+                    'bands': self.bands, 'rows': self.rows, 'threshold': self.threshold}
@@ -0,0 +1,125 @@
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterable, Tuple
+
+from utils.data_versions import DataVersions
+
+
+class RenderCache:
+    """
+    Cache HTML đã render (cả trang hoặc từng đoạn/block của template) theo khóa do nơi gọi
+    tạo (route, tham số query, vai trò).
+    - Mỗi mục khai báo dữ liệu nó phụ thuộc ('courses', 'documents', 'exams'), là tên các
+      tập trong data_versions
+    - Database gọi invalidate(...) với các tập vừa được ghi: mọi mục phụ thuộc chúng bị xóa ngay
+    - Mỗi mục còn giữ phiên bản (DataVersions.version) của các phụ thuộc chụp TRƯỚC khi render;
+      lúc đọc mà khác (file bị tiến trình khác ghi, hoặc bị ghi trong lúc đang render) thì bỏ
+    - Giới hạn tổng dung lượng max_bytes (byte UTF-8), vượt thì loại theo LRU
+    """
+
+    def __init__(self, data_versions: DataVersions, max_bytes: int = 8 * 1024 * 1024):
+        self.data_versions = data_versions
+        self.max_bytes = max(0, max_bytes)
+        self._lock = threading.Lock()
+        # key -> {'value', 'size', 'depends_on', 'versions'}
+        self._entries: 'OrderedDict[object, Dict]' = OrderedDict()
+        # Phụ thuộc -> các khóa đang dùng nó
+        self._dependents: Dict[str, set] = {}
+        self._bytes = 0
+        self._counters = Counter()
+        self._invalidations = Counter()
+
+    # ---- Phụ thuộc ----
+
+    def invalidate(self, *dependencies: str):
+        """Gọi sau khi data_versions đã tăng phiên bản của các tập này"""
+        with self._lock:
+            for name in dependencies:
+                self._invalidations[name] += 1
+                for key in list(self._dependents.get(name, ())):
+                    self._drop(key)
+                    self._counters['invalidated'] += 1
+
+    # ---- Đọc / ghi ----
+
+    def _drop(self, key):
+        # Gọi khi đang giữ self._lock
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry['size']
+        for name in entry['depends_on']:
+            keys = self._dependents.get(name)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._dependents[name]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry['versions'] != self.data_versions.version(entry['depends_on']):
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._drop(key)
+                    self._counters['stale'] += 1
+            entry = None
+        with self._lock:
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry['value']
+
+    def set(self, key, value, depends_on: Iterable[str], versions: Tuple, size: int):
+        """versions: data_versions.version(depends_on) chụp trước khi render value"""
+        depends_on = tuple(depends_on)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # Có lần ghi xen vào giữa lúc chụp versions và lúc lưu: value có thể đã cũ
+            if versions[0] != self.data_versions.generations(depends_on):
+                return
+            self._drop(key)
+            self._entries[key] = {'value': value, 'size': size, 'depends_on': depends_on, 'versions': versions}
+            self._bytes += size
+            for name in depends_on:
+                self._dependents.setdefault(name, set()).add(key)
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+
+    def get_or_render(self, key, depends_on: Iterable[str], render: Callable[[], Dict[str, str]]) -> Dict[str, str]:
+        """Các đoạn HTML {tên: html} của khóa; chưa có thì gọi render() và lưu lại"""
+        value = self.get(key)
+        if value is not None:
+            return value
+        depends_on = tuple(depends_on)
+        versions = self.data_versions.version(depends_on)
+        value = render()
+        self.set(key, value, depends_on, versions, sum(len(html.encode('utf-8')) for html in value.values()))
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dependents.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._counters['hits'],
+                'misses': self._counters['misses'],
+                'hit_rate': round(self._counters['hits'] / lookups, 4) if lookups else 0.0,
+                'invalidated': self._counters['invalidated'],
+                'stale': self._counters['stale'],
+                'evictions': self._counters['evictions'],
+                'invalidations_by_dependency': dict(self._invalidations)
+            }
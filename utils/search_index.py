@@ -0,0 +1,289 @@
+import heapq
+import math
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.text_utils import tokenize
+
+# Khoảng cách vị trí chèn giữa các trường/đoạn để cụm từ không khớp vắt qua hai trường
+FIELD_GAP = 100
+
+_PHRASE_PATTERN = re.compile(r'"([^"]+)"')
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, kích thước) của file, dùng để phát hiện file bị ghi bởi tiến trình khác"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def parse_query(query: str) -> Tuple[List[str], List[List[str]]]:
+    """
+    Tách truy vấn thành (các từ, các cụm từ trong ngoặc kép).
+    Ví dụ: 'python "vòng lặp for"' -> (['python', 'vong', 'lap', 'for'], [['vong', 'lap', 'for']])
+    Mọi từ (kể cả trong cụm từ) đều bắt buộc phải có trong kết quả.
+    """
+    phrases = []
+    for match in _PHRASE_PATTERN.finditer(query or ''):
+        tokens = tokenize(match.group(1))
+        if len(tokens) > 1:
+            phrases.append(tokens)
+    terms = tokenize(_PHRASE_PATTERN.sub(' ', query or ''))
+    for phrase in phrases:
+        terms.extend(phrase)
+    # Giữ thứ tự, bỏ trùng
+    return list(dict.fromkeys(terms)), phrases
+
+
+class InvertedIndex:
+    """
+    Chỉ mục ngược có vị trí (positional) trong bộ nhớ, xếp hạng BM25.
+    - Văn bản được bỏ dấu tiếng Việt và tách từ bằng utils.text_utils.tokenize
+    - Mỗi tài liệu gồm nhiều trường với trọng số riêng (BM25F đơn giản:
+      tần suất và độ dài được nhân trọng số của trường)
+    - Thêm/sửa/xóa từng tài liệu, không cần dựng lại cả chỉ mục
+    - Truy vấn: tất cả các từ phải xuất hiện, cụm từ trong ngoặc kép phải liền nhau
+    """
+
+    def __init__(self, field_weights: Dict[str, float], k1: float = 1.2, b: float = 0.75):
+        self.field_weights = field_weights
+        self.k1 = k1
+        self.b = b
+        # term -> {doc_id: (tần suất có trọng số, (vị trí...))}; dùng tuple thay list cho gọn bộ nhớ
+        self._postings: Dict[str, Dict[str, list]] = {}
+        self._doc_lengths: Dict[str, float] = {}
+        self._doc_terms: Dict[str, List[str]] = {}
+        self._total_length = 0.0
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._doc_lengths
+
+    def clear(self):
+        self._postings = {}
+        self._doc_lengths = {}
+        self._doc_terms = {}
+        self._total_length = 0.0
+
+    def add(self, doc_id: str, fields: Dict[str, object]):
+        """
+        Thêm hoặc thay thế tài liệu. Giá trị của trường là chuỗi hoặc danh sách
+        chuỗi (ví dụ danh sách bình luận, thẻ).
+        """
+        if doc_id in self._doc_lengths:
+            self.remove(doc_id)
+
+        position = 0
+        length = 0.0
+        entries: Dict[str, list] = {}
+        for field, weight in self.field_weights.items():
+            value = fields.get(field)
+            if not value:
+                continue
+            parts = value if isinstance(value, (list, tuple)) else [value]
+            for part in parts:
+                tokens = tokenize(str(part))
+                for offset, token in enumerate(tokens):
+                    entry = entries.get(token)
+                    if entry is None:
+                        entry = entries[token] = [0.0, []]
+                    entry[0] += weight
+                    entry[1].append(position + offset)
+                length += weight * len(tokens)
+                position += len(tokens) + FIELD_GAP
+
+        for token, entry in entries.items():
+            self._postings.setdefault(token, {})[doc_id] = (entry[0], tuple(entry[1]))
+        self._doc_terms[doc_id] = list(entries)
+        self._doc_lengths[doc_id] = length
+        self._total_length += length
+
+    def remove(self, doc_id: str) -> bool:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return False
+        for token in terms:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        return True
+
+    def terms(self, doc_id: str) -> List[str]:
+        """Các từ (đã bỏ dấu, không trùng) của tài liệu"""
+        return self._doc_terms.get(doc_id, [])
+
+    def vocabulary(self):
+        """[(từ, số tài liệu chứa từ)]"""
+        return [(term, len(postings)) for term, postings in self._postings.items()]
+
+    def document_frequency(self, term: str) -> int:
+        return len(self._postings.get(term, ()))
+
+    def _idf(self, df: int) -> float:
+        n = len(self._doc_lengths)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    @staticmethod
+    def _has_phrase(doc_id: str, phrase: List[str], postings: List[Dict[str, list]]) -> bool:
+        starts = set(postings[0][doc_id][1])
+        for offset in range(1, len(phrase)):
+            positions = postings[offset][doc_id][1]
+            starts &= {p - offset for p in positions}
+            if not starts:
+                return False
+        return True
+
+    def match(self, terms: List[str], phrases: Optional[List[List[str]]] = None,
+              allowed: Optional[Callable[[str], bool]] = None) -> List[str]:
+        """Các tài liệu chứa đủ mọi từ (và mọi cụm từ), chưa xếp hạng"""
+        if not terms:
+            return []
+        postings = []
+        for term in terms:
+            term_postings = self._postings.get(term)
+            if not term_postings:
+                return []
+            postings.append(term_postings)
+
+        # Giao từ danh sách ngắn nhất để số phép kiểm tra phụ thuộc vào kết quả, không phải cỡ chỉ mục
+        postings.sort(key=len)
+        candidates = [doc_id for doc_id in postings[0] if all(doc_id in p for p in postings[1:])]
+
+        if phrases:
+            for phrase in phrases:
+                phrase_postings = [self._postings[term] for term in phrase]
+                candidates = [doc_id for doc_id in candidates if self._has_phrase(doc_id, phrase, phrase_postings)]
+        if allowed is not None:
+            candidates = [doc_id for doc_id in candidates if allowed(doc_id)]
+        return candidates
+
+    def rank(self, query: str, allowed: Optional[Callable[[str], bool]] = None,
+             tie_breaker: Optional[Callable[[str], object]] = None) -> List[Tuple[str, float]]:
+        """
+        Toàn bộ kết quả đã xếp hạng BM25 [(doc_id, điểm)], điểm cao trước;
+        tie_breaker xếp các tài liệu cùng điểm (ví dụ ngày tạo, mới trước).
+        """
+        terms, phrases = parse_query(query)
+        if not terms:
+            return []
+        postings = [self._postings.get(term) for term in terms]
+        if not all(postings):
+            return []
+
+        candidates = None
+        if phrases or allowed is not None:
+            candidates = set(self.match(terms, phrases, allowed))
+            if not candidates:
+                return []
+
+        n = len(self._doc_lengths)
+        base = self.k1 * (1 - self.b)
+        scale = self.k1 * self.b * n / self._total_length if self._total_length else 0.0
+        k1_plus_1 = self.k1 + 1
+        lengths = self._doc_lengths
+        postings.sort(key=len)
+        weighted = [(term_postings, self._idf(len(term_postings)) * k1_plus_1) for term_postings in postings]
+        (first, first_weight), rest = weighted[0], weighted[1:]
+
+        # Duyệt danh sách ngắn nhất, tính điểm ngay trong vòng lặp (không gọi hàm cho từng tài liệu)
+        scored = []
+        append = scored.append
+        docs = first.items() if candidates is None else ((doc_id, first[doc_id]) for doc_id in candidates)
+        for doc_id, entry in docs:
+            norm = base + scale * lengths[doc_id]
+            tf = entry[0]
+            total = first_weight * tf / (tf + norm)
+            for term_postings, weight in rest:
+                other = term_postings.get(doc_id)
+                if other is None:
+                    break
+                tf = other[0]
+                total += weight * tf / (tf + norm)
+            else:
+                append((total, tie_breaker(doc_id) if tie_breaker else '', doc_id))
+
+        scored.sort(reverse=True)
+        return [(doc_id, total) for total, _, doc_id in scored]
+
+    def search(self, query: str, offset: int = 0, limit: int = 20,
+               allowed: Optional[Callable[[str], bool]] = None,
+               tie_breaker: Optional[Callable[[str], object]] = None) -> Tuple[int, List[Tuple[str, float]]]:
+        """Tìm kiếm và phân trang: trả về (tổng số kết quả, kết quả của trang [offset, offset + limit))"""
+        ranked = self.rank(query, allowed, tie_breaker)
+        return len(ranked), ranked[offset:offset + limit]
+
+
+class _TrieNode:
+    __slots__ = ('children', 'count', 'top')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.count = 0
+        self.top = None
+
+
+class PrefixTrie:
+    """
+    Cây tiền tố của các từ đã bỏ dấu kèm số tài liệu chứa từ, dùng cho gợi ý tự động.
+    Mỗi nút nhớ danh sách gợi ý tốt nhất của nó; danh sách này bị xóa trên đường đi
+    mỗi khi một từ được thêm/bớt nên gợi ý lặp lại không phải duyệt lại cây con.
+    """
+
+    def __init__(self, suggestions_per_node: int = 10):
+        self.root = _TrieNode()
+        self.suggestions_per_node = suggestions_per_node
+        self.size = 0
+
+    def add(self, term: str, delta: int = 1):
+        node = self.root
+        path = [node]
+        for char in term:
+            child = node.children.get(char)
+            if child is None:
+                if delta <= 0:
+                    return
+                child = node.children[char] = _TrieNode()
+            node = child
+            path.append(node)
+
+        was_present = node.count > 0
+        node.count = max(0, node.count + delta)
+        if node.count and not was_present:
+            self.size += 1
+        elif was_present and not node.count:
+            self.size -= 1
+            # Bỏ các nút lá không còn từ nào
+            for depth in range(len(term), 0, -1):
+                current = path[depth]
+                if current.count or current.children:
+                    break
+                del path[depth - 1].children[term[depth - 1]]
+        for visited in path:
+            visited.top = None
+
+    def _top(self, node: _TrieNode, prefix: str) -> List[Tuple[int, str]]:
+        if node.top is None:
+            candidates = [(node.count, prefix)] if node.count else []
+            for char, child in node.children.items():
+                candidates.extend(self._top(child, prefix + char))
+            node.top = heapq.nlargest(self.suggestions_per_node, candidates, key=lambda item: (item[0], -len(item[1])))
+        return node.top
+
+    def complete(self, prefix: str, limit: int = 8) -> List[Tuple[str, int]]:
+        """Các từ bắt đầu bằng prefix, nhiều tài liệu nhất trước"""
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [(term, count) for count, term in self._top(node, prefix)[:limit]]
@@ -0,0 +1,433 @@
+import atexit
+import gc
+import os
+import pickle
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.search_index import InvertedIndex, PrefixTrie, file_signature, parse_query
+from utils.text_utils import tokenize
+
+SITE_FIELD_WEIGHTS = {'title': 3.0, 'tags': 2.0, 'body': 1.0}
+# Các nhóm lọc (facet) hiển thị bên cạnh kết quả
+FACETS = ('type', 'grade', 'doc_type', 'tags')
+SNIPPET_LENGTH = 160
+INDEX_VERSION = 2
+
+
+@contextmanager
+def _gc_paused():
+    """
+    Tạm tắt bộ gom rác khi nạp/dựng chỉ mục: tạo hàng triệu list nhỏ của chỉ mục ngược
+    kích hoạt gom rác liên tục, làm việc nạp file chậm đi nhiều lần. Không dùng gc.freeze:
+    mỗi lần dựng lại sẽ giữ vĩnh viễn cả chỉ mục cũ đã bỏ trong thế hệ cố định
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _snippet(*parts) -> str:
+    text = ' '.join(str(part) for part in parts if part).strip()
+    if len(text) <= SNIPPET_LENGTH:
+        return text
+    return text[:SNIPPET_LENGTH].rsplit(' ', 1)[0] + '…'
+
+
+def course_entries(course: Dict) -> List[Tuple]:
+    """Khóa học và từng bài học của nó: [(doc_id, các trường, thông tin hiển thị)]"""
+    entries = [(
+        f"course:{course['id']}",
+        {'title': course.get('title', ''), 'body': course.get('description', '')},
+        {
+            'type': 'course',
+            'title': course.get('title', ''),
+            'snippet': _snippet(course.get('description')),
+            'endpoint': 'course_detail',
+            'params': {'course_id': course['id']},
+            'created_at': course.get('created_at', '')
+        }
+    )]
+    for lesson in course.get('lessons') or []:
+        questions = [q.get('question', '') for q in lesson.get('questions') or []]
+        entries.append((
+            f"lesson:{course['id']}:{lesson.get('id')}",
+            {'title': lesson.get('title', ''), 'body': [lesson.get('content', '')] + questions},
+            {
+                'type': 'lesson',
+                'title': lesson.get('title', ''),
+                'snippet': _snippet(course.get('title'), *questions[:2]),
+                'endpoint': 'course_detail',
+                'params': {'course_id': course['id']},
+                'created_at': course.get('created_at', '')
+            }
+        ))
+    return entries
+
+
+def document_entries(doc: Dict) -> List[Tuple]:
+    grade = doc.get('grade')
+    return [(
+        f"document:{doc['id']}",
+        {'title': doc.get('title', ''), 'body': doc.get('description', '')},
+        {
+            'type': 'document',
+            'title': doc.get('title', ''),
+            'snippet': _snippet(doc.get('description')),
+            'url': doc.get('url', ''),
+            'grade': str(grade) if grade else None,
+            # Tài liệu cũ chỉ có 'type' (document/video/pdf)
+            'doc_type': doc.get('doc_type') or doc.get('type'),
+            'created_at': doc.get('created_at', '')
+        }
+    )]
+
+
+def exam_entries(grade: str) -> Callable[[Dict], List[Tuple]]:
+    def entries(exam: Dict) -> List[Tuple]:
+        questions = [q.get('question', '') for q in exam.get('questions') or []]
+        return [(
+            f"exam:{grade}:{exam['id']}",
+            {'title': exam.get('title', ''), 'body': [exam.get('description', '')] + questions},
+            {
+                'type': 'exam',
+                'title': exam.get('title', ''),
+                'snippet': _snippet(exam.get('description'), f'{len(questions)} câu hỏi'),
+                'endpoint': 'tracnghiem',
+                'params': {},
+                'grade': grade,
+                'created_at': exam.get('created_at', '')
+            }
+        )]
+    return entries
+
+
+def post_entries(post: Dict) -> List[Tuple]:
+    tags = list(post.get('tags') or [])
+    return [(
+        f"post:{post['id']}",
+        {'title': post.get('title', ''), 'tags': tags, 'body': post.get('content', '')},
+        {
+            'type': 'post',
+            'title': post.get('title', ''),
+            'snippet': _snippet(post.get('content')),
+            'endpoint': 'forum_post_detail',
+            'params': {'post_id': post['id']},
+            'tags': tags,
+            'created_at': post.get('created_at', '')
+        }
+    )]
+
+
+class SearchSource:
+    """
+    Một file dữ liệu được đánh chỉ mục.
+    - load(): đọc dữ liệu từ file
+    - records(data): danh sách bản ghi trong dữ liệu đã đọc
+    - entries(record): các tài liệu tìm kiếm sinh ra từ một bản ghi
+    """
+
+    def __init__(self, path: str, load: Callable[[], object],
+                 entries: Callable[[Dict], List[Tuple]],
+                 records: Optional[Callable[[object], Iterable[Dict]]] = None):
+        self.path = path
+        self.load = load
+        self.entries = entries
+        self.records = records or (lambda data: data if isinstance(data, list) else [])
+
+
+def _facet_values(meta: Dict, name: str):
+    value = meta.get(name)
+    if value is None or value == '':
+        return ()
+    return value if isinstance(value, list) else (value,)
+
+
+class SiteSearchIndex:
+    """
+    Chỉ mục tìm kiếm chung cho khóa học, bài học, tài liệu, đề thi và bài viết diễn đàn.
+    - Lưu vào index_file (pickle) để khởi động lại không phải dựng lại; lúc nạp chỉ
+      đồng bộ lại các file dữ liệu đã đổi kể từ lần lưu
+    - Database gọi file_saved() sau mỗi lần ghi; lần tìm kiếm kế tiếp so từng bản ghi
+      với bản đã đánh chỉ mục và chỉ tách từ lại các bản ghi thay đổi
+    - Gợi ý tự động từ cây tiền tố các từ trong chỉ mục
+    """
+
+    def __init__(self, index_file: str, sources: List[SearchSource],
+                 save_delay: float = 5.0, max_cached_queries: int = 128):
+        self.index_file = index_file
+        self.sources = {source.path: source for source in sources}
+        self.save_delay = save_delay
+        self.max_cached_queries = max_cached_queries
+        self._lock = threading.RLock()
+        self._loaded = False
+        self.index = InvertedIndex(SITE_FIELD_WEIGHTS)
+        self.trie = PrefixTrie()
+        self._meta: Dict[str, Dict] = {}
+        # path -> {khóa bản ghi: (bản ghi, [(doc_id, các trường, thông tin)])}, dùng để so sánh khi đồng bộ
+        self._records: Dict[str, Dict[str, Tuple[Dict, List[Tuple]]]] = {}
+        self._signatures: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._pending: Dict[str, Tuple[object, Optional[Tuple[int, int]]]] = {}
+        self._ranked_cache = OrderedDict()
+        # (truy vấn, bộ lọc) -> (kết quả sau lọc, số đếm facet), để chuyển trang không phải lọc lại
+        self._results_cache = OrderedDict()
+        self._save_timer = None
+        self._dirty = False
+        atexit.register(self.flush)
+
+    # ---- Nạp, lưu, dựng lại ----
+
+    def _load(self):
+        self._loaded = True
+        if not os.path.exists(self.index_file):
+            return
+        with _gc_paused():
+            try:
+                with open(self.index_file, 'rb') as f:
+                    state = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+                return
+            if not self._valid_state(state):
+                # Bố cục cũ/hỏng: bỏ qua, lần đồng bộ đầu tiên dựng lại từ các file dữ liệu
+                return
+            trie = PrefixTrie()
+            try:
+                for term, count in state['index'].vocabulary():
+                    trie.add(term, count)
+            except (AttributeError, TypeError, ValueError):
+                return
+            self.index = state['index']
+            self.trie = trie
+            self._meta = state['meta']
+            self._records = state['records']
+            self._signatures = state['signatures']
+
+    def _valid_state(self, state) -> bool:
+        """
+        File pickle đúng bố cục mà _sync dùng. Chỉ so 'version' thì file bố cục cũ còn ghi
+        cùng số phiên bản vẫn được nạp rồi làm /search lỗi khi giải nén bản ghi.
+        """
+        if not isinstance(state, dict) or state.get('version') != INDEX_VERSION:
+            return False
+        signatures, records = state.get('signatures'), state.get('records')
+        if (not isinstance(state.get('index'), InvertedIndex) or not isinstance(state.get('meta'), dict)
+                or not isinstance(signatures, dict) or set(signatures) != set(self.sources)
+                or not isinstance(records, dict)):
+            return False
+        for path_records in records.values():
+            if not isinstance(path_records, dict):
+                return False
+            for value in path_records.values():
+                if not (isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], dict)
+                        and isinstance(value[1], list)):
+                    return False
+                if not all(isinstance(entry, tuple) and len(entry) == 3 for entry in value[1]):
+                    return False
+        return True
+
+    def _ensure_fresh(self):
+        if not self._loaded:
+            self._load()
+        for path, source in self.sources.items():
+            current = file_signature(path)
+            pending = self._pending.pop(path, None)
+            if pending is not None and pending[1] == current:
+                self._sync(source, pending[0])
+            elif current != self._signatures.get(path):
+                self._sync(source, source.load())
+            self._signatures[path] = current
+
+    def _sync(self, source: SearchSource, data):
+        old_records = self._records.get(source.path, {})
+        new_records = {}
+        changed = False
+        for record in source.records(data):
+            if not isinstance(record, dict) or 'id' not in record:
+                continue
+            previous = old_records.get(record['id'])
+            if previous is not None and previous[0] == record:
+                new_records[record['id']] = previous
+                continue
+            entries = source.entries(record)
+            new_records[record['id']] = (record, entries)
+            if previous is not None and previous[1] == entries:
+                # Chỉ đổi các trường không được đánh chỉ mục (lượt xem, số bình luận...)
+                continue
+            changed = True
+            current_ids = {doc_id for doc_id, _, _ in entries}
+            for doc_id, _, _ in previous[1] if previous else ():
+                if doc_id not in current_ids:
+                    self._remove_doc(doc_id)
+            for doc_id, fields, meta in entries:
+                self._add_doc(doc_id, fields, meta)
+        for key, (_, entries) in old_records.items():
+            if key not in new_records:
+                changed = True
+                for doc_id, _, _ in entries:
+                    self._remove_doc(doc_id)
+        self._records[source.path] = new_records
+        if changed:
+            self._ranked_cache.clear()
+            self._results_cache.clear()
+            self._schedule_save()
+
+    def _add_doc(self, doc_id: str, fields: Dict, meta: Dict):
+        self._remove_doc(doc_id)
+        self.index.add(doc_id, fields)
+        self._meta[doc_id] = meta
+        for term in self.index.terms(doc_id):
+            self.trie.add(term)
+
+    def _remove_doc(self, doc_id: str):
+        for term in self.index.terms(doc_id):
+            self.trie.add(term, -1)
+        self.index.remove(doc_id)
+        self._meta.pop(doc_id, None)
+
+    def _schedule_save(self):
+        self._dirty = True
+        if self._save_timer is None:
+            # Gộp nhiều lần thay đổi liên tiếp thành một lần ghi file
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Ghi chỉ mục ra file nếu có thay đổi chưa lưu"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return
+            state = {
+                'version': INDEX_VERSION,
+                'index': self.index,
+                'meta': self._meta,
+                'records': self._records,
+                'signatures': self._signatures
+            }
+            os.makedirs(os.path.dirname(self.index_file) or '.', exist_ok=True)
+            tmp_path = f'{self.index_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.index_file)
+            self._dirty = False
+
+    def rebuild(self) -> Dict:
+        """Dựng lại toàn bộ chỉ mục từ các file dữ liệu và lưu ngay"""
+        with self._lock:
+            self._loaded = True
+            self.index = InvertedIndex(SITE_FIELD_WEIGHTS)
+            self.trie = PrefixTrie()
+            self._meta = {}
+            self._records = {}
+            self._signatures = {}
+            self._pending.clear()
+            self._ranked_cache.clear()
+            self._results_cache.clear()
+            with _gc_paused():
+                self._ensure_fresh()
+            self._dirty = True
+            self.flush()
+            return self.stats()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            return {
+                'documents': len(self.index),
+                'terms': self.trie.size,
+                'by_type': dict(Counter(meta['type'] for meta in self._meta.values()))
+            }
+
+    # ---- Cập nhật từ Database ----
+
+    def file_saved(self, path: str, data):
+        """Database vừa ghi `data` vào `path`; việc đánh chỉ mục để tới lần tìm kiếm kế tiếp"""
+        if path not in self.sources:
+            return
+        with self._lock:
+            if self._loaded:
+                self._pending[path] = (data, file_signature(path))
+
+    # ---- Tìm kiếm ----
+
+    @staticmethod
+    def _cache_key(query: str):
+        terms, phrases = parse_query(query)
+        return tuple(terms), tuple(tuple(phrase) for phrase in phrases)
+
+    def _cached(self, cache: OrderedDict, key, compute):
+        value = cache.get(key)
+        if value is None:
+            value = cache[key] = compute()
+            if len(cache) > self.max_cached_queries:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        return value
+
+    def _ranked(self, query: str) -> List[str]:
+        return self._cached(self._ranked_cache, self._cache_key(query), lambda: [
+            doc_id for doc_id, _ in self.index.rank(query, tie_breaker=self._created_at)])
+
+    def _filter(self, ranked: List[str], filters: Dict[str, str]):
+        counts = {name: Counter() for name in FACETS}
+        matched = []
+        for doc_id in ranked:
+            meta = self._meta[doc_id]
+            failed = [name for name, value in filters.items() if value not in _facet_values(meta, name)]
+            if len(failed) > 1:
+                continue
+            for name in (failed or FACETS):
+                counts[name].update(_facet_values(meta, name))
+            if not failed:
+                matched.append(doc_id)
+        return matched, {name: counts[name].most_common() for name in FACETS}
+
+    def _created_at(self, doc_id: str) -> str:
+        return self._meta[doc_id].get('created_at') or ''
+
+    def search(self, query: str, filters: Optional[Dict[str, str]] = None,
+               page: int = 1, per_page: int = 20) -> Dict:
+        """
+        Trả về {'results', 'total', 'page', 'pages', 'facets'}.
+        Số đếm của mỗi nhóm lọc tính trên kết quả đã áp các bộ lọc của những nhóm khác,
+        để người dùng thấy chọn giá trị khác trong cùng nhóm sẽ được bao nhiêu kết quả.
+        """
+        filters = {name: value for name, value in (filters or {}).items() if name in FACETS and value}
+        page = max(1, page)
+        with self._lock:
+            self._ensure_fresh()
+            ranked = self._ranked(query)
+            key = (self._cache_key(query), tuple(sorted(filters.items())))
+            matched, facets = self._cached(self._results_cache, key, lambda: self._filter(ranked, filters))
+            start = (page - 1) * per_page
+            results = [dict(self._meta[doc_id], id=doc_id) for doc_id in matched[start:start + per_page]]
+        total = len(matched)
+        return {
+            'results': results,
+            'total': total,
+            'page': page,
+            'pages': max(1, -(-total // per_page)),
+            'facets': facets
+        }
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[Dict]:
+        """Gợi ý cho ô tìm kiếm: hoàn thiện từ cuối cùng đang gõ, giữ nguyên các từ trước"""
+        tokens = tokenize(prefix)
+        if not tokens or prefix[-1:].isspace():
+            return []
+        head = ' '.join(tokens[:-1])
+        with self._lock:
+            self._ensure_fresh()
+            completions = self.trie.complete(tokens[-1], limit)
+        return [{'text': f'{head} {term}'.strip(), 'count': count} for term, count in completions]
@@ -0,0 +1,132 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from typing import Dict, Optional
+
+from werkzeug.security import safe_join
+
+from utils.compression import COMPRESSIBLE_MIMETYPES
+from utils.search_index import file_signature
+
+# Tên file có mã băm nội dung: css/style.0123456789ab.css
+FINGERPRINT_PATTERN = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<ext>\.[^./]+)$')
+
+
+def _digest(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()[:12]
+
+
+class StaticAssets:
+    """
+    Gắn mã băm nội dung vào URL file tĩnh (css/style.css -> css/style.<mã băm>.css) để trình
+    duyệt được lưu lâu dài: nội dung đổi thì URL đổi. Không cần bước build:
+    - Lúc khởi động đọc mọi file trong static_dir (trừ các thư mục excluded, ví dụ uploads do
+      người dùng tải lên), tính mã băm và ghi sẵn bản nén gzip vào gzip_dir (tên theo mã băm,
+      nên các lần khởi động sau dùng lại)
+    - url() kiểm tra chữ ký file mỗi lần gọi: sửa file khi đang chạy (lúc phát triển) thì tính lại
+    - resolve() đổi tên có mã băm về file thật, kèm bản gzip nếu có
+    """
+
+    def __init__(self, static_dir: str, gzip_dir: str, excluded=('uploads',), min_gzip_size: int = 512):
+        self.static_dir = static_dir
+        self.gzip_dir = gzip_dir
+        self.excluded = set(excluded)
+        self.min_gzip_size = min_gzip_size
+        self._lock = threading.Lock()
+        # 'css/style.css' -> {'signature', 'digest', 'url', 'gzip'}
+        self._assets: Dict[str, Dict] = {}
+
+    def build(self):
+        """Tính mã băm và tạo bản gzip cho mọi file tĩnh; gọi một lần lúc khởi động"""
+        for root, dirs, names in os.walk(self.static_dir):
+            if root == self.static_dir:
+                dirs[:] = [name for name in dirs if name not in self.excluded]
+            for name in names:
+                path = os.path.join(root, name)
+                self._refresh(os.path.relpath(path, self.static_dir).replace(os.sep, '/'))
+        return self
+
+    def _refresh(self, filename: str) -> Optional[Dict]:
+        # filename có thể lấy từ URL: không cho ra ngoài static_dir
+        path = safe_join(self.static_dir, filename)
+        if path is None:
+            return None
+        signature = file_signature(path)
+        with self._lock:
+            asset = self._assets.get(filename)
+            if asset is not None and asset['signature'] == signature:
+                return asset
+            if asset is not None:
+                del self._assets[filename]
+        if signature is None or not os.path.isfile(path):
+            return None
+
+        digest = _digest(path)
+        stem, ext = os.path.splitext(filename)
+        asset = {
+            'signature': signature,
+            'digest': digest,
+            'url': f'{stem}.{digest}{ext}',
+            'mimetype': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+            'gzip': None
+        }
+        if asset['mimetype'] in COMPRESSIBLE_MIMETYPES and signature[1] >= self.min_gzip_size:
+            asset['gzip'] = self._precompress(path, asset['url'])
+        with self._lock:
+            self._assets[filename] = asset
+        return asset
+
+    def _precompress(self, path: str, url: str) -> Optional[str]:
+        gzip_path = os.path.join(self.gzip_dir, url + '.gz')
+        if os.path.exists(gzip_path):
+            return gzip_path
+        with open(path, 'rb') as f:
+            data = f.read()
+        compressed = gzip.compress(data, compresslevel=9)
+        if len(compressed) >= len(data):
+            return None
+        os.makedirs(os.path.dirname(gzip_path), exist_ok=True)
+        tmp_path = f'{gzip_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, gzip_path)
+        return gzip_path
+
+    def _is_excluded(self, filename: str) -> bool:
+        return filename.split('/', 1)[0] in self.excluded
+
+    def url(self, filename: str) -> str:
+        """Tên file có mã băm để dùng trong URL; file không có trong danh sách thì giữ nguyên"""
+        if self._is_excluded(filename):
+            return filename
+        asset = self._refresh(filename)
+        return asset['url'] if asset is not None else filename
+
+    def resolve(self, url: str) -> Optional[Dict]:
+        """
+        Tên có mã băm -> {'filename', 'mimetype', 'gzip', 'current'}; None nếu không phải tên
+        có mã băm. 'current' False: mã băm cũ (trang lưu từ bản trước), vẫn trả file hiện tại
+        nhưng không được lưu lâu dài.
+        """
+        match = FINGERPRINT_PATTERN.match(url)
+        if match is None:
+            return None
+        filename = match.group('stem') + match.group('ext')
+        if self._is_excluded(filename):
+            return None
+        asset = self._refresh(filename)
+        if asset is None:
+            return None
+        return {
+            'filename': filename,
+            'mimetype': asset['mimetype'],
+            'gzip': asset['gzip'],
+            'current': asset['digest'] == match.group('digest')
+        }
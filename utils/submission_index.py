@@ -0,0 +1,96 @@
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.search_index import file_signature
+
+
+def _lesson_key(submission: Dict) -> Tuple[str, str]:
+    # exercise_id của bài nộp là id bài học (xem submit_exercise)
+    return submission.get('course_id'), submission.get('exercise_id')
+
+
+def _newer(submission: Dict, other: Optional[Dict]) -> bool:
+    return other is None or (submission.get('submitted_at') or '') >= (other.get('submitted_at') or '')
+
+
+class SubmissionIndex:
+    """
+    Bài nộp theo học sinh: user_id -> {(course_id, lesson_id): lần nộp mới nhất} và số lần nộp.
+    Dựng từ submissions.json ở lần dùng đầu tiên; Database gọi on_submission_saved sau mỗi
+    lần ghi với `since` là snapshot() chụp trước khi ghi, giống ForumSearchIndex.
+    """
+
+    def __init__(self, submissions_file: str, load_submissions: Callable[[], List[Dict]]):
+        self.submissions_file = submissions_file
+        self.load_submissions = load_submissions
+        self._lock = threading.RLock()
+        self._latest: Dict[str, Dict[Tuple[str, str], Dict]] = {}
+        self._attempts: Dict[str, Dict[Tuple[str, str], int]] = {}
+        self._signature = None
+
+    def snapshot(self):
+        return file_signature(self.submissions_file)
+
+    def _add(self, submission: Dict):
+        user_id = submission.get('user_id')
+        key = _lesson_key(submission)
+        latest = self._latest.setdefault(user_id, {})
+        attempts = self._attempts.setdefault(user_id, {})
+        attempts[key] = attempts.get(key, 0) + 1
+        if _newer(submission, latest.get(key)):
+            latest[key] = submission
+
+    def _rebuild(self):
+        signature = self.snapshot()
+        self._latest = {}
+        self._attempts = {}
+        for submission in self.load_submissions():
+            self._add(submission)
+        self._signature = signature
+
+    def _ensure_fresh(self):
+        if self._signature is None or self._signature != self.snapshot():
+            self._rebuild()
+
+    def _apply(self, since, change: Callable[[], None]):
+        with self._lock:
+            if self._signature is None:
+                return
+            if since != self._signature:
+                self._signature = None
+                return
+            change()
+            self._signature = self.snapshot()
+
+    def file_written(self, path: str, before, after):
+        """Ghi trễ cuối request, xem ForumSearchIndex.file_written"""
+        if path != self.submissions_file:
+            return
+        with self._lock:
+            if self._signature is None:
+                return
+            self._signature = after if before is not None and self._signature == before else None
+
+    def on_submission_saved(self, submission: Dict, since):
+        self._apply(since, lambda: self._add(submission))
+
+    def on_submissions_regraded(self, submissions: List[Dict], since):
+        """Các bài nộp đã có (cùng id) vừa được chấm lại: số lần nộp không đổi"""
+        def change():
+            for submission in submissions:
+                latest = self._latest.get(submission.get('user_id'), {})
+                key = _lesson_key(submission)
+                current = latest.get(key)
+                if current is not None and current.get('id') == submission.get('id'):
+                    latest[key] = submission
+        self._apply(since, change)
+
+    def latest_by_user(self, user_id: str) -> List[Dict]:
+        """Lần nộp mới nhất của từng bài học, mới nhất trước; mỗi mục kèm 'attempts'"""
+        with self._lock:
+            self._ensure_fresh()
+            latest = self._latest.get(user_id, {})
+            attempts = self._attempts.get(user_id, {})
+            items = [dict(submission, attempts=attempts[key]) for key, submission in latest.items()]
+        items.sort(key=lambda s: s.get('submitted_at') or '', reverse=True)
+        return items
@@ -0,0 +1,54 @@
+import re
+import unicodedata
+from typing import List
+
+# Từ dừng tiếng Việt (đã bỏ dấu) thường gặp trong câu hỏi của học sinh, chỉ gồm những từ mà
+# khi bỏ dấu KHÔNG trùng với từ mang nội dung: không có "co" (cơ số), "ban" (bản), "minh"
+# (chứng minh), "hoi" (hồi quy), "roi" (rời rạc), "la" (nút lá), "nhi" (nhị phân), "toi"
+# (tối ưu), "thay" (thay thế), "biet" (phân biệt), "nhung" (nhúng), "anh" (ảnh), tên biến
+# một chữ ("a", "j") và từ phủ định ("không", "ko", "k").
+VIETNAMESE_STOPWORDS = frozenset({
+    'ah', 'cac', 'cho', 'cua', 'duoc', 'em', 'gi', 'giup', 'nao', 'nay',
+    'nhe', 'oi', 'vay', 'voi', 'xin'
+})
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+_TOKEN_PATTERN = re.compile(r'[0-9a-z]+(?:[+#][0-9a-z+#]*)?')
+# Token của khóa cache: ngoài từ còn giữ số (cả số thập phân) và toán tử, để "2 > 3" khác
+# "2 < 3", "x % 2" khác "x / 2", "1.5 + 2" khác "1 5 2"; dấu câu (. , ? : ; ") bị bỏ
+_KEY_TOKEN_PATTERN = re.compile(
+    r'\d+(?:[.,]\d+)*(?![0-9a-z])'
+    r'|[0-9a-z]+(?:\+\+|#)?'
+    r'|<<=?|>>=?|\*\*|//|[<>=!]=|&&|\|\||->'
+    r'|!(?=\s*[0-9a-z(])'
+    r'|[-+*/%=<>&|^~()\[\]{}]'
+)
+
+
+def fold_diacritics(text: str) -> str:
+    """Chuyển về chữ thường và bỏ dấu tiếng Việt ("Thuật Toán" -> "thuat toan")."""
+    if not text:
+        return ''
+    text = text.lower().replace('đ', 'd')
+    decomposed = unicodedata.normalize('NFD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    """Tách từ trên văn bản đã bỏ dấu, giữ các token như "c++" hay "c#"."""
+    return _TOKEN_PATTERN.findall(fold_diacritics(text))
+
+
+def collapse_whitespace(text: str) -> str:
+    return _WHITESPACE_PATTERN.sub(' ', text).strip()
+
+
+def normalize_question(text: str) -> str:
+    """
+    Chuẩn hóa câu hỏi để làm khóa cache:
+    chữ thường, bỏ dấu, gộp khoảng trắng, bỏ dấu câu và từ dừng; giữ số và toán tử.
+    """
+    tokens = _KEY_TOKEN_PATTERN.findall(fold_diacritics(text))
+    meaningful = [t for t in tokens if t not in VIETNAMESE_STOPWORDS]
+    # Câu hỏi toàn từ dừng thì giữ nguyên để không gộp nhầm các câu khác nhau
+    return ' '.join(meaningful or tokens)
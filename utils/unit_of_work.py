@@ -0,0 +1,99 @@
+import json
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.search_index import file_signature
+
+
+class UnitOfWork:
+    """
+    Bộ nhớ tạm các file JSON trong phạm vi một request (identity map + unit of work).
+    - load(): mỗi file chỉ đọc và parse một lần; các lần sau trả về đúng đối tượng đã đọc
+    - save(): không ghi ngay mà đánh dấu file cần ghi; dữ liệu được tuần tự hóa ngay lúc
+      save để các chỉnh sửa chỉ dùng cho hiển thị sau đó (ví dụ thêm created_at_formatted)
+      không lọt vào file
+    - dirty(): các file cần ghi, mỗi file một lần, theo thứ tự save lần đầu
+    - load_with_base(): giữ thêm chữ ký file và nội dung gốc lúc đọc, để khi ghi biết file
+      đã bị luồng/tiến trình khác ghi trong lúc request chạy và gộp thay đổi (merge_records)
+    """
+
+    def __init__(self):
+        self._collections: Dict[str, object] = {}
+        self._dirty: Dict[str, Tuple[object, str]] = {}
+        # filename -> (chữ ký file chụp trước khi đọc, nội dung gốc)
+        self._bases: Dict[str, Tuple[object, Optional[str]]] = {}
+
+    def load(self, filename: str, read: Callable[[str], object]):
+        if filename not in self._collections:
+            self._collections[filename] = read(filename)
+        return self._collections[filename]
+
+    def load_with_base(self, filename: str, read_with_text: Callable[[str], Tuple[object, Optional[str]]]):
+        """read_with_text(filename) -> (dữ liệu, nội dung file); nội dung chỉ giữ lại, chưa parse lần nữa"""
+        if filename not in self._collections:
+            # Chụp chữ ký trước khi đọc: có lần ghi xen vào giữa thì chỉ gộp thừa, không bỏ sót
+            signature = file_signature(filename)
+            data, text = read_with_text(filename)
+            self._collections[filename] = data
+            self._bases[filename] = (signature, text)
+        return self._collections[filename]
+
+    def base(self, filename: str) -> Optional[Tuple[object, Optional[str]]]:
+        """(chữ ký file lúc đọc, nội dung gốc) nếu file được đọc bằng load_with_base"""
+        return self._bases.get(filename)
+
+    def save(self, filename: str, data):
+        self._collections[filename] = data
+        self._dirty[filename] = (data, json.dumps(data, ensure_ascii=False, indent=2))
+
+    def dirty(self) -> Iterator[Tuple[str, object, str]]:
+        for filename, (data, text) in list(self._dirty.items()):
+            yield filename, data, text
+
+    def dirty_files(self):
+        return list(self._dirty)
+
+    def clear(self):
+        self._collections.clear()
+        self._dirty.clear()
+        self._bases.clear()
+
+
+class MergeConflict(Exception):
+    """Request và nơi khác cùng thêm một bản ghi mới trùng khóa nhưng khác nội dung"""
+
+
+def merge_records(base: List, ours: List, theirs: List,
+                  key: Callable[[Dict], object] = lambda record: record['id']) -> Optional[List]:
+    """
+    Gộp ba chiều danh sách bản ghi theo khóa: base là nội dung lúc request đọc, ours là dữ
+    liệu request muốn ghi, theirs là file hiện tại (đã bị nơi khác ghi). Giữ theirs, thay các
+    bản ghi request đã sửa, bỏ các bản ghi request đã xóa, thêm các bản ghi mới của request
+    vào cuối. Cùng một bản ghi đã có bị sửa ở cả hai nơi thì bản của request thắng; còn hai
+    nơi cùng THÊM bản ghi mới trùng khóa (khác nội dung) thì là xung đột: raise MergeConflict
+    thay vì thay bản ghi của nơi kia. None nếu không gộp được (không phải danh sách bản ghi có khóa).
+    """
+    def by_key(records):
+        if not isinstance(records, list):
+            return None
+        keyed = {}
+        for record in records:
+            if not isinstance(record, dict):
+                return None
+            try:
+                keyed[key(record)] = record
+            except KeyError:
+                return None
+        return keyed
+
+    base_by_key, ours_by_key, theirs_by_key = by_key(base), by_key(ours), by_key(theirs)
+    if base_by_key is None or ours_by_key is None or theirs_by_key is None:
+        return None
+    changed = {record_key: record for record_key, record in ours_by_key.items()
+               if base_by_key.get(record_key) != record}
+    for record_key, record in changed.items():
+        if record_key not in base_by_key and record_key in theirs_by_key and theirs_by_key[record_key] != record:
+            raise MergeConflict(f'Bản ghi mới {record_key!r} đã được nơi khác thêm cùng lúc')
+    deleted = base_by_key.keys() - ours_by_key.keys()
+    merged = [changed.pop(key(record), record) for record in theirs if key(record) not in deleted]
+    merged.extend(record for record in ours if key(record) in changed)
+    return merged